@@ -0,0 +1,81 @@
+"""
+Compare the containment tests of the per-cell and quadtree grid methods on a shrid file.
+
+Run from the MOSAIKS_feature directory:
+
+    python -m benchmarks.quadtree_test_counts shrids.csv [--limit N]
+
+The CSV needs the 'polygon_coordinates', 'min_lat', 'max_lat', 'min_lon' and
+'max_lon' columns used by ``granular``.
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from src.MOSAIKS_feature import lattice
+from src.MOSAIKS_feature.geometry import load_polygon_arrays, polygons_from_arrays
+from src.MOSAIKS_feature.grid import cells_inside_polygon
+from src.MOSAIKS_feature.quadtree import quadtree_blocks, quadtree_cells
+
+# Bounding-box sizes (in lattice cells) the report is broken down by
+SIZE_BUCKETS = [0, 100, 1000, 10000, 100000, np.inf]
+
+
+def count_tests(data: pd.DataFrame, polygons) -> pd.DataFrame:
+    """Return, per shrid, its bounding-box cell count and the tests the quadtree performs."""
+    row_start, row_stop = lattice.cell_bounds(data["min_lat"], data["max_lat"])
+    col_start, col_stop = lattice.cell_bounds(data["min_lon"], data["max_lon"])
+    point_tests = np.maximum(row_stop - row_start, 0).astype(np.int64) * np.maximum(col_stop - col_start, 0)
+    quadtree_tests = np.array([
+        quadtree_blocks(polygon, *bounds)[3]
+        for polygon, bounds in zip(polygons, zip(row_start, row_stop, col_start, col_stop))
+    ], dtype=np.int64)
+    return pd.DataFrame({"point_tests": point_tests, "quadtree_tests": quadtree_tests})
+
+
+def time_method(polygon_cells, data: pd.DataFrame, polygons) -> float:
+    """Time one containment method over every shrid."""
+    row_start, row_stop = lattice.cell_bounds(data["min_lat"], data["max_lat"])
+    col_start, col_stop = lattice.cell_bounds(data["min_lon"], data["max_lon"])
+    start = time.perf_counter()
+    for polygon, bounds in zip(polygons, zip(row_start, row_stop, col_start, col_stop)):
+        polygon_cells(polygon, *bounds)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("csv_file", help="Shrid CSV with polygon coordinates and bounding boxes")
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N shrids")
+    args = parser.parse_args()
+
+    data = pd.read_csv(args.csv_file, nrows=args.limit)
+    coords, offsets = load_polygon_arrays(args.csv_file)
+    if args.limit is not None:
+        offsets = offsets[:len(data) + 1]
+        coords = coords[:offsets[-1]]
+    polygons = polygons_from_arrays(coords, offsets)
+
+    counts = count_tests(data, polygons)
+    counts["bucket"] = pd.cut(counts["point_tests"], SIZE_BUCKETS, right=False)
+    summary = counts.groupby("bucket", observed=True).agg(
+        shrids=("point_tests", "size"),
+        point_tests=("point_tests", "sum"),
+        quadtree_tests=("quadtree_tests", "sum"),
+    )
+    summary["reduction"] = summary["point_tests"] / summary["quadtree_tests"].clip(lower=1)
+    print(summary.to_string())
+
+    total_points = counts["point_tests"].sum()
+    total_quadtree = counts["quadtree_tests"].sum()
+    print(f"Total: {total_points} point tests, {total_quadtree} quadtree tests "
+          f"({total_points / max(total_quadtree, 1):.1f}x fewer)")
+
+    # Time on fresh polygons so neither method benefits from the other's prepared geometry
+    prepared_time = time_method(cells_inside_polygon, data, polygons_from_arrays(coords, offsets))
+    quadtree_time = time_method(quadtree_cells, data, polygons_from_arrays(coords, offsets))
+    print(f"Time: prepared {prepared_time:.2f}s, quadtree {quadtree_time:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,492 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from . import lattice
+from .geometry import load_polygon_arrays
+from .join import PointIndex
+from .loader import iter_csv, load_csv, read_header, result_files
+from .weights import AreaWeights, load_area_weights
+
+# Rough memory budget of one chunk of feature values; with ~4,000 feature
+# columns this is about 2,000 rows per chunk
+CHUNK_BYTES = 64 * 1024 * 1024
+
+
+def feature_columns(file_path: str, id_column: str = "shrid2", exclude=("Lat", "Lon")) -> list:
+    """Return the feature columns of a MOSAIKS result file: every column except the ID and ``exclude``."""
+    header = read_header(file_path)
+    return [col for col in header if col != id_column and col not in exclude]
+
+
+def _sorted_groups(codes: np.ndarray):
+    """Return the order sorting rows by group code, the start of each group in it, and the code and size of each group."""
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    return order, starts, sorted_codes[starts], np.diff(np.r_[starts, len(codes)])
+
+
+def chunk_rows(n_columns: int, chunk_bytes: int = CHUNK_BYTES) -> int:
+    """Number of rows of ``n_columns`` float64 values that fit in ``chunk_bytes``."""
+    return max(1, chunk_bytes // (8 * max(n_columns, 1)))
+
+
+class GroupMeans:
+    """
+    Running per-shrid feature sums and row counts.
+
+    Every shrid gets an integer code on first sight, and its sums live in row
+    ``code`` of a float64 array of shape (shrids, features). The arrays are
+    preallocated and doubled when full, so memory is bounded by the number of
+    shrids times features, however many rows are added.
+    """
+
+    # Per-shrid arrays and the value new rows start from
+    _fields = {"sums": 0.0, "counts": 0}
+
+    def __init__(self, n_features: int, capacity: int = 1024):
+        """Create empty sums for ``n_features`` feature columns."""
+        self.ids = pd.Index([])
+        self.sums = np.zeros((capacity, n_features), dtype=np.float64)
+        self.counts = np.zeros(capacity, dtype=np.int64)
+
+    def codes(self, ids) -> np.ndarray:
+        """Return the code of each ID, assigning new codes (and growing the arrays) for unseen ones."""
+        ids = np.asarray(ids)
+        codes = self.ids.get_indexer(ids)
+        unseen = codes < 0
+        if unseen.any():
+            new_ids = pd.Index(pd.unique(ids[unseen]))
+            self.ids = new_ids if len(self.ids) == 0 else self.ids.append(new_ids)
+            codes[unseen] = self.ids.get_indexer(ids[unseen])
+            if len(self.ids) > len(self.counts):
+                self._grow(max(len(self.ids), 2 * len(self.counts)))
+        return codes
+
+    def _grow(self, capacity: int):
+        for name, fill in self._fields.items():
+            old = getattr(self, name)
+            new = np.full((capacity, *old.shape[1:]), fill, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def add(self, ids, values: np.ndarray):
+        """
+        Add rows of feature values to the sums of their shrids.
+
+        Rows are sorted by shrid code so each shrid's rows are summed with one
+        ``np.add.reduceat`` call per chunk instead of one update per row.
+        """
+        codes = self.codes(ids)
+        if len(codes) == 0:
+            return
+        order, starts, group_codes, group_counts = _sorted_groups(codes)
+        self.sums[group_codes] += np.add.reduceat(values[order], starts, axis=0)
+        self.counts[group_codes] += group_counts
+
+    def merge(self, other: "GroupMeans"):
+        """Add the sums and counts of another :class:`GroupMeans` over the same features."""
+        n = len(other.ids)
+        if n == 0:
+            return
+        codes = self.codes(other.ids)
+        self.sums[codes] += other.sums[:n]
+        self.counts[codes] += other.counts[:n]
+
+    def _id_order(self):
+        """Return the codes in ID order, like ``DataFrame.groupby`` sorts, and the sorted IDs."""
+        rank, sorted_ids = pd.factorize(self.ids, sort=True)
+        order = np.empty(len(self.ids), dtype=np.int64)
+        order[rank] = np.arange(len(self.ids))
+        return order, np.asarray(sorted_ids)
+
+    def means(self, features: list, id_column: str = "shrid2") -> pd.DataFrame:
+        """Return the mean of every feature per shrid, sorted by ID like ``DataFrame.groupby``."""
+        order, sorted_ids = self._id_order()
+        means = self.sums[order] / np.maximum(self.counts[order], 1)[:, None]
+        result = pd.DataFrame(means, columns=features)
+        result.insert(0, id_column, sorted_ids)
+        return result
+
+
+class GroupStats(GroupMeans):
+    """
+    Running per-shrid count, mean, variance, minimum and maximum of every feature.
+
+    Extends :class:`GroupMeans` with the sum of squared deviations from the
+    mean (``m2``) and the running extremes. Each chunk is first reduced to
+    per-shrid statistics of its own and then merged into the running ones with
+    the pairwise update of Chan et al., the same update :meth:`merge` applies to
+    another :class:`GroupStats`. Partial states of chunks, files or workers
+    therefore combine exactly, and the variance avoids the cancellation of a
+    sum-of-squares formula.
+    """
+
+    _fields = {**GroupMeans._fields, "m2": 0.0, "mins": np.inf, "maxs": -np.inf}
+
+    # Statistics :meth:`statistics` reports by default, besides the row count
+    STATISTICS = ("mean", "var", "min", "max")
+
+    def __init__(self, n_features: int, capacity: int = 1024):
+        """Create empty statistics for ``n_features`` feature columns."""
+        super().__init__(n_features, capacity)
+        self.m2 = np.zeros((capacity, n_features), dtype=np.float64)
+        self.mins = np.full((capacity, n_features), np.inf)
+        self.maxs = np.full((capacity, n_features), -np.inf)
+
+    def _combine(self, codes, counts, sums, m2, mins, maxs):
+        """Merge per-shrid partial statistics into the running ones; ``codes`` must be unique."""
+        n_a = self.counts[codes][:, None].astype(np.float64)
+        n_b = np.asarray(counts, dtype=np.float64)[:, None]
+        delta = sums / np.maximum(n_b, 1) - self.sums[codes] / np.maximum(n_a, 1)
+        self.m2[codes] += m2 + delta ** 2 * (n_a * n_b / np.maximum(n_a + n_b, 1))
+        self.sums[codes] += sums
+        self.counts[codes] += counts
+        self.mins[codes] = np.minimum(self.mins[codes], mins)
+        self.maxs[codes] = np.maximum(self.maxs[codes], maxs)
+
+    def add(self, ids, values: np.ndarray):
+        """
+        Add rows of feature values to the statistics of their shrids.
+
+        All statistics come out of the same sorted chunk: sums, minima and maxima
+        with one ``reduceat`` each, and the squared deviations from each shrid's
+        chunk mean with one more.
+        """
+        codes = self.codes(ids)
+        if len(codes) == 0:
+            return
+        order, starts, group_codes, group_counts = _sorted_groups(codes)
+        values = values[order]
+        sums = np.add.reduceat(values, starts, axis=0)
+        deviations = values - np.repeat(sums / group_counts[:, None], group_counts, axis=0)
+        self._combine(
+            group_codes, group_counts, sums, np.add.reduceat(deviations ** 2, starts, axis=0),
+            np.minimum.reduceat(values, starts, axis=0), np.maximum.reduceat(values, starts, axis=0)
+        )
+
+    def merge(self, other: "GroupStats"):
+        """Merge the statistics of another :class:`GroupStats` over the same features."""
+        n = len(other.ids)
+        if n == 0:
+            return
+        self._combine(self.codes(other.ids), other.counts[:n], other.sums[:n], other.m2[:n],
+                      other.mins[:n], other.maxs[:n])
+
+    def statistics(self, features: list, id_column: str = "shrid2", statistics=STATISTICS,
+                   ddof: int = 1) -> pd.DataFrame:
+        """
+        Return the statistics of every feature per shrid, sorted by ID like ``DataFrame.groupby``.
+
+        Parameters
+        ----------
+        features : list of str
+            Names of the feature columns.
+        id_column : str, optional
+            Name of the ID column of the result.
+        statistics : iterable of str, optional
+            Any of 'mean', 'var', 'std', 'min' and 'max'.
+        ddof : int, optional
+            Delta degrees of freedom of the variance; 1, the pandas default,
+            gives the sample variance, which is NaN for shrids with one row.
+
+        Returns
+        -------
+        pd.DataFrame
+            ``id_column``, 'count', then ``{feature}_{statistic}`` for every
+            feature and statistic, feature by feature.
+        """
+        order, sorted_ids = self._id_order()
+        counts = self.counts[order]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            variance = np.where((counts > ddof)[:, None], self.m2[order] / (counts - ddof)[:, None], np.nan)
+        values = {
+            "mean": lambda: self.sums[order] / np.maximum(counts, 1)[:, None],
+            "var": lambda: variance,
+            "std": lambda: np.sqrt(variance),
+            "min": lambda: self.mins[order],
+            "max": lambda: self.maxs[order],
+        }
+        unknown = set(statistics) - set(values)
+        if unknown:
+            raise ValueError(f"Unknown statistics {sorted(unknown)}; choose from {list(values)}")
+
+        blocks = np.stack([values[name]() for name in statistics], axis=2)
+        columns = [f"{feature}_{name}" for feature in features for name in statistics]
+        result = pd.DataFrame(blocks.reshape(len(counts), -1), columns=columns)
+        result.insert(0, "count", counts)
+        result.insert(0, id_column, sorted_ids)
+        return result
+
+
+# Point index of the current pool worker, set once by _set_worker_index
+_worker_index = None
+
+
+def _set_worker_index(index: PointIndex):
+    global _worker_index
+    _worker_index = index
+
+
+def _file_groups(file_path: str, id_column: str, exclude, features: list, chunk_bytes: int,
+                 groups_class=GroupMeans, index: PointIndex = None) -> GroupMeans:
+    """Accumulate the per-shrid sums (or statistics) of one result file."""
+    index = _worker_index if index is None else index
+    if set(feature_columns(file_path, id_column, exclude)) != set(features):
+        raise ValueError(f"{file_path} does not have the same feature columns as the other result files")
+    groups = groups_class(len(features))
+    key_columns = ["Lat", "Lon"] if index is not None else [id_column]
+    reader = iter_csv(file_path, chunk_rows(len(features), chunk_bytes), columns=[*key_columns, *features],
+                      features=features, feature_dtype=np.float64, categorical=False)
+    for chunk in reader:
+        values = np.nan_to_num(chunk[features].to_numpy(dtype=np.float64), nan=0.0)
+        if index is None:
+            groups.add(chunk[id_column].fillna(0), values)
+        else:
+            # Rows of a point shared by several shrids count once for each of them
+            rows, shrid_ids = index.join(chunk["Lat"], chunk["Lon"])
+            groups.add(shrid_ids, values[rows])
+    return groups
+
+
+def stream_group_means(file_paths, id_column: str = "shrid2", exclude=("Lat", "Lon"),
+                       chunk_bytes: int = CHUNK_BYTES, workers: int = 1, index: PointIndex = None) -> pd.DataFrame:
+    """
+    Average the feature columns of MOSAIKS result CSVs per shrid without loading them whole.
+
+    Equivalent to concatenating the files and running
+    ``.fillna(0).groupby(id_column)[features].mean()``: missing values, IDs
+    included, count as 0. Each file is read in chunks of about ``chunk_bytes``
+    of feature values and accumulated in a :class:`GroupMeans`, so memory is
+    bounded by the number of shrids times features, not by the number of rows.
+    With ``workers > 1`` the files are parsed in a process pool and the partial
+    sums and counts of each file are merged, in file order, into the final means.
+
+    MOSAIKS returns features keyed only by 'Lat'/'Lon'. Given an ``index`` of
+    the generated grid points, rows are matched to their shrids through it
+    instead of through ``id_column``, which the files then need not have.
+
+    Parameters
+    ----------
+    file_paths : str or list of str
+        MOSAIKS result CSV(s) with an ``id_column`` column: files, directories
+        or glob patterns, see :func:`result_files`.
+    id_column : str, optional
+        Column identifying the shrid of each row.
+    exclude : iterable of str, optional
+        Non-feature columns besides ``id_column``.
+    chunk_bytes : int, optional
+        Approximate memory budget of one chunk of feature values, per worker.
+    workers : int, optional
+        Number of files parsed at once; None uses every CPU.
+    index : join.PointIndex, optional
+        Index of the grid points to join the rows to shrids by 'Lat'/'Lon'.
+        Points belonging to no shrid are dropped.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per shrid, sorted by ``id_column``, with the mean of each feature.
+
+    Raises
+    ------
+    ValueError
+        If the files do not all have the same feature columns.
+    """
+    groups, features = _stream_groups(file_paths, id_column, exclude, chunk_bytes, workers, GroupMeans, index)
+    return groups.means(features, id_column)
+
+
+def stream_group_stats(file_paths, id_column: str = "shrid2", exclude=("Lat", "Lon"),
+                       chunk_bytes: int = CHUNK_BYTES, workers: int = 1, statistics=GroupStats.STATISTICS,
+                       ddof: int = 1, index: PointIndex = None) -> pd.DataFrame:
+    """
+    Per-shrid count, mean, variance, minimum and maximum of every feature in one pass.
+
+    Reads the files exactly like :func:`stream_group_means`, chunk by chunk and
+    in parallel per file, but accumulates a :class:`GroupStats`, so every
+    statistic comes out of the same single pass. Missing values count as 0.
+
+    Parameters
+    ----------
+    file_paths, id_column, exclude, chunk_bytes, workers, index : optional
+        See :func:`stream_group_means`.
+    statistics, ddof : optional
+        See :meth:`GroupStats.statistics`.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per shrid, sorted by ``id_column``, as returned by :meth:`GroupStats.statistics`.
+    """
+    groups, features = _stream_groups(file_paths, id_column, exclude, chunk_bytes, workers, GroupStats, index)
+    return groups.statistics(features, id_column, statistics, ddof)
+
+
+def _stream_groups(file_paths, id_column: str, exclude, chunk_bytes: int, workers: int, groups_class,
+                   index: PointIndex = None):
+    """Accumulate every result file into one ``groups_class`` instance; return it and the feature columns."""
+    files = result_files(file_paths)
+    features = feature_columns(files[0], id_column, exclude)
+    groups = groups_class(len(features))
+    accumulate_files(groups, files, features, id_column, exclude, chunk_bytes, workers, index)
+    return groups, features
+
+
+def accumulate_files(groups: GroupMeans, files: list, features: list, id_column: str = "shrid2",
+                     exclude=("Lat", "Lon"), chunk_bytes: int = CHUNK_BYTES, workers: int = 1,
+                     index: PointIndex = None):
+    """
+    Merge the rows of result files into existing per-shrid sums (or statistics).
+
+    Parameters
+    ----------
+    groups : GroupMeans or GroupStats
+        Running state to update in place.
+    files : list of str
+        Result CSVs to read; every one must have exactly the columns ``features``.
+    features : list of str
+        Feature columns of ``groups``, in order.
+    id_column, exclude, chunk_bytes, workers, index : optional
+        See :func:`stream_group_means`.
+
+    Raises
+    ------
+    ValueError
+        If a file does not have the feature columns ``features``.
+    """
+    if not files:
+        return
+    groups_class = type(groups)
+    workers = os.cpu_count() if workers is None else max(1, int(workers))
+    workers = min(workers, len(files))
+    args = [(path, id_column, tuple(exclude), features, chunk_bytes, groups_class) for path in files]
+
+    if workers == 1:
+        for arg in args:
+            groups.merge(_file_groups(*arg, index))
+    else:
+        # Ship the point index to each worker once instead of with every file
+        with ProcessPoolExecutor(max_workers=workers, initializer=_set_worker_index, initargs=(index,)) as executor:
+            for partial in executor.map(_file_groups, *zip(*args)):
+                groups.merge(partial)
+
+
+# Area weights of the current pool worker, set once by _set_worker_weights
+_worker_weights = None
+
+
+def _set_worker_weights(indptr, cells, weights):
+    global _worker_weights
+    _worker_weights = AreaWeights(indptr, cells, weights)
+
+
+def _file_weighted_sums(file_path: str, features: list, chunk_bytes: int, weights: AreaWeights = None):
+    """Accumulate the area-weighted feature sums and total weights of one result file."""
+    weights = _worker_weights if weights is None else weights
+    if set(feature_columns(file_path, "shrid2", ("Lat", "Lon"))) != set(features):
+        raise ValueError(f"{file_path} does not have the same feature columns as the other result files")
+    sums = np.zeros((weights.n_shrids, len(features)), dtype=np.float64)
+    totals = np.zeros(weights.n_shrids, dtype=np.float64)
+    reader = iter_csv(file_path, chunk_rows(len(features), chunk_bytes), columns=["Lat", "Lon", *features],
+                      features=features, feature_dtype=np.float64)
+    for chunk in reader:
+        chunk = chunk.dropna(subset=["Lat", "Lon"])
+        keys = lattice.pack(lattice.to_index(chunk["Lat"]), lattice.to_index(chunk["Lon"]))
+        matrix = weights.matrix(keys)
+        sums += matrix @ np.nan_to_num(chunk[features].to_numpy(dtype=np.float64), nan=0.0)
+        totals += np.asarray(matrix.sum(axis=1)).ravel()
+    return sums, totals
+
+
+def stream_weighted_means(file_paths, weights: AreaWeights, shrid_ids, chunk_bytes: int = CHUNK_BYTES,
+                          workers: int = 1) -> pd.DataFrame:
+    """
+    Area-weighted mean of MOSAIKS features per shrid, streamed over result files.
+
+    Every result row is matched to its lattice cell through its 'Lat'/'Lon'
+    and weighted, for each shrid overlapping the cell, by the fraction of the
+    cell the shrid covers. Each chunk is aggregated with one sparse-times-dense
+    product, ``weights.matrix(keys) @ features``. Missing feature values count
+    as 0, as in :func:`stream_group_means`.
+
+    Parameters
+    ----------
+    file_paths : str or list of str
+        MOSAIKS result CSV(s) with 'Lat' and 'Lon' columns, see :func:`result_files`.
+        A 'shrid2' column, if present, is ignored.
+    weights : weights.AreaWeights
+        Shrid-by-cell weights, one row per entry of ``shrid_ids``.
+    shrid_ids : array-like
+        ID of each shrid of ``weights``.
+    chunk_bytes : int, optional
+        Approximate memory budget of one chunk of feature values, per worker.
+    workers : int, optional
+        Number of files parsed at once; None uses every CPU.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per shrid, in the order of ``shrid_ids``, with the weighted mean
+        of each feature; NaN for shrids no result row overlaps.
+    """
+    files = result_files(file_paths)
+    features = feature_columns(files[0], "shrid2", ("Lat", "Lon"))
+    workers = os.cpu_count() if workers is None else max(1, int(workers))
+    workers = min(workers, len(files))
+
+    sums = np.zeros((weights.n_shrids, len(features)), dtype=np.float64)
+    totals = np.zeros(weights.n_shrids, dtype=np.float64)
+    if workers == 1:
+        for path in files:
+            file_sums, file_totals = _file_weighted_sums(path, features, chunk_bytes, weights)
+            sums += file_sums
+            totals += file_totals
+    else:
+        # Ship the weights to each worker once instead of with every file
+        with ProcessPoolExecutor(max_workers=workers, initializer=_set_worker_weights,
+                                 initargs=(weights.indptr, weights.cells, weights.weights)) as executor:
+            n = len(files)
+            for file_sums, file_totals in executor.map(_file_weighted_sums, files, [features] * n, [chunk_bytes] * n):
+                sums += file_sums
+                totals += file_totals
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / totals[:, None]
+    result = pd.DataFrame(means, columns=features)
+    result.insert(0, "shrid2", np.asarray(shrid_ids))
+    return result
+
+
+def area_weighted_means(file_paths, shrid_file: str, geometry_cache: str = None, chunk_bytes: int = CHUNK_BYTES,
+                        workers: int = 1) -> pd.DataFrame:
+    """
+    Area-weighted mean of MOSAIKS features for the shrids of a shrid file.
+
+    The shrid-by-cell weights are built once, from the 'polygon_coordinates' of
+    ``shrid_file``. With ``geometry_cache`` they are cached next to its parsed
+    polygons, so aggregating further result files or feature versions
+    against the same shrids only reads them back.
+
+    Parameters
+    ----------
+    file_paths : str or list of str
+        MOSAIKS result CSV(s), see :func:`stream_weighted_means`.
+    shrid_file : str
+        Shrid CSV with 'shrid2' and 'polygon_coordinates' columns.
+    geometry_cache : str, optional
+        Sidecar directory caching the parsed polygons and weights across
+        runs; nothing is cached without it.
+    chunk_bytes, workers : optional
+        See :func:`stream_weighted_means`.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per shrid, in the order of ``shrid_file``.
+    """
+    coords, offsets = load_polygon_arrays(shrid_file, cache_dir=geometry_cache)
+    weights = AreaWeights(*load_area_weights(coords, offsets, cache_dir=geometry_cache))
+    shrid_ids = load_csv(shrid_file, columns=["shrid2"], categorical=False)["shrid2"]
+    return stream_weighted_means(file_paths, weights, shrid_ids, chunk_bytes, workers)
@@ -1,13 +1,18 @@
+import numpy as np
 import pandas as pd
 import os
 import matplotlib.pyplot as plt
 import geopandas as gpd
 import contextily as ctx
 import warnings
-import folium
-from folium.plugins import HeatMap
-from shapely.geometry import Point, Polygon
+import shapely
 from sklearn.decomposition import PCA
+from ..geometry import load_polygon_arrays, polygons_from_arrays
+from ..loader import load_csv
+from ..pca import StreamingPCA
+from ..prefilter import load_simplified_bounds, prefiltered_contains
+from ..render import write_heatmaps
+from ..tiles import CACHE_BYTES, TileCache, UrlTileSource, tiles_for_bounds, warp_to_lonlat
 
 warnings.filterwarnings('ignore')
 
@@ -15,6 +20,9 @@ def load_data(mosaik_file: str, polygon_file: str):
     """
     Load Mosaik and polygon data from CSV files.
 
+    Mosaik features are read as float32 and the shrid IDs as categoricals,
+    halving the memory of the float64 frame pandas would infer.
+
     Parameters
     ----------
     mosaik_file : str
@@ -28,8 +36,8 @@ def load_data(mosaik_file: str, polygon_file: str):
         Loaded dataframes: (mosaik_data, polygon_data)
     """
     try:
-        mosaik_data = pd.read_csv(mosaik_file)
-        polygon_data = pd.read_csv(polygon_file)
+        mosaik_data = load_csv(mosaik_file)
+        polygon_data = load_csv(polygon_file, features=(), categorical=False)
         return mosaik_data, polygon_data
     except Exception as e:
         raise IOError(f"Error loading files: {e}")
@@ -93,7 +101,11 @@ def save_shrid_images(data: pd.DataFrame,
                       output_dir: str, 
                       urban_threshold_lat: float = 10.0,
                       urban_threshold_lon: float = 75.0,
-                      zoom_level: int = 15):
+                      zoom_level: int = 15,
+                      geometry_cache: str = None,
+                      tile_cache: str = None,
+                      cache_bytes: int = CACHE_BYTES,
+                      tile_source=None):
     """
     Save images of shrids (polygons) that meet an 'urban' threshold criterion.
 
@@ -109,11 +121,27 @@ def save_shrid_images(data: pd.DataFrame,
         Longitude threshold for defining urban shrids.
     zoom_level : int, optional
         Zoom level for the basemap.
+    geometry_cache : str, optional
+        Directory of the binary polygon sidecar. If provided, parsed polygons
+        are cached there and reused on later runs.
+    tile_cache : str, optional
+        Directory of a persistent basemap tile cache (see :class:`tiles.TileCache`).
+        If provided, the tiles of all urban shrids are prefetched once into
+        it and every image is drawn from cached tiles, instead of fetching
+        them for each shrid with ``contextily.add_basemap``.
+    cache_bytes : int, optional
+        Size budget of ``tile_cache``; the least recently used tiles are evicted.
+    tile_source : callable, optional
+        Source of the cached tiles, ``tile_source(z, x, y) -> bytes``, e.g. a
+        :class:`tiles.DirectoryTileSource` of offline tiles. Esri World Imagery
+        by default.
     """
+    if tile_source is not None and tile_cache is None:
+        raise ValueError("tile_source needs a tile_cache directory")
     os.makedirs(output_dir, exist_ok=True)
 
-    # Ensure polygon_coordinates can be parsed into Polygon objects
-    data['geometry'] = data.apply(lambda row: Polygon(eval(row['polygon_coordinates'])), axis=1)
+    # Parse polygon_coordinates into Polygon objects
+    data['geometry'] = polygons_from_arrays(*load_polygon_arrays(data['polygon_coordinates'], cache_dir=geometry_cache))
     gdf = gpd.GeoDataFrame(data, geometry='geometry', crs="EPSG:4326")
 
     # Determine urban shrids based on centroid
@@ -122,10 +150,28 @@ def save_shrid_images(data: pd.DataFrame,
     )
     urban_gdf = gdf[gdf['is_urban']]
 
+    if tile_cache is not None:
+        # Fetch the union of the tiles every image needs once; overlapping shrids and later
+        # runs read them from the cache
+        cache = TileCache(tile_cache, tile_source or UrlTileSource(ctx.providers.Esri.WorldImagery), cache_bytes)
+        cache.prefetch(tiles_for_bounds(urban_gdf.geometry.bounds, zoom_level))
+
+    def add_cached_basemap(ax):
+        # Same steps as contextily.add_basemap, with the tiles read through the cache; gdf is in
+        # EPSG:4326, so the Web Mercator tiles are warped to lon/lat
+        xmin, xmax, ymin, ymax = ax.axis()
+        image, extent = cache.image(xmin, ymin, xmax, ymax, zoom_level)
+        image, extent = warp_to_lonlat(image, extent)
+        ax.imshow(image, extent=extent, interpolation='bilinear', aspect=ax.get_aspect())
+        ax.axis((xmin, xmax, ymin, ymax))
+
     def plot_shrid(shrid_row):
         fig, ax = plt.subplots(figsize=(10, 10))
         gdf[gdf['shrid2'] == shrid_row['shrid2']].plot(ax=ax, facecolor="none", edgecolor="blue", linewidth=2)
-        ctx.add_basemap(ax, crs=gdf.crs.to_string(), source=ctx.providers.Esri.WorldImagery, attribution=False, zoom=zoom_level)
+        if tile_cache is not None:
+            add_cached_basemap(ax)
+        else:
+            ctx.add_basemap(ax, crs=gdf.crs.to_string(), source=ctx.providers.Esri.WorldImagery, attribution=False, zoom=zoom_level)
         ax.axis("off")
         sanitized_shrid = str(shrid_row['shrid2']).replace('-', '_')
         plt.savefig(os.path.join(output_dir, f"shrid_{sanitized_shrid}.png"), dpi=300, bbox_inches='tight')
@@ -134,13 +180,27 @@ def save_shrid_images(data: pd.DataFrame,
     for _, row in urban_gdf.iterrows():
         plot_shrid(row)
 
+def _model_feature_positions(data: pd.DataFrame, model: StreamingPCA, feature_start_idx: int) -> np.ndarray:
+    """Return the positions of the columns of ``data`` holding the features of ``model``, in its order."""
+    if set(model.features) <= set(data.columns):
+        return data.columns.get_indexer(model.features)
+    positions = np.arange(feature_start_idx, len(data.columns))
+    if len(positions) != len(model.features):
+        raise ValueError(f"The PCA model has {len(model.features)} features but data has {len(positions)} columns "
+                         f"from index {feature_start_idx}, and not all of them by name")
+    return positions
+
 def generate_heatmaps(data: pd.DataFrame,
                       output_folder: str,
                       lat_col: str = 'Lat_x', 
                       lon_col: str = 'Lon_x',
                       polygon_col: str = 'polygon_coordinates', 
                       feature_start_idx: int = 4,
-                      zoom_start: int = 15):
+                      zoom_start: int = 15,
+                      geometry_cache: str = None,
+                      pca_model: str = None,
+                      backend: str = "template",
+                      workers: int = 1):
     """
     Generate interactive HTML heatmaps for each unique shrid in the data.
 
@@ -160,44 +220,74 @@ def generate_heatmaps(data: pd.DataFrame,
         Index from which Mosaik features start.
     zoom_start : int, optional
         Initial zoom level for the folium map.
+    geometry_cache : str, optional
+        Directory of the binary polygon sidecar. If provided, parsed polygons
+        and their simplified inner/outer prefilter are cached there and reused
+        on later runs.
+    pca_model : str, optional
+        Directory of a model saved by :func:`pca.fit_pca`. If provided, the
+        PCA is not refitted on ``data``: only the points inside each polygon
+        are projected onto the saved first component. Features are matched
+        by name, or else taken from ``feature_start_idx`` on.
+    backend : str, optional
+        'template' (default) writes every page from one precompiled folium
+        page, 'folium' builds and saves a folium map per shrid; see
+        :func:`render.write_heatmaps`.
+    workers : int, optional
+        Processes writing pages at once with the 'template' backend; None
+        uses every CPU.
     """
     os.makedirs(output_folder, exist_ok=True)
 
-    # Convert polygon coordinates to geometry
-    data['geometry'] = data[polygon_col].apply(lambda coords: Polygon(eval(coords)))
-    gdf = gpd.GeoDataFrame(data, geometry="geometry", crs="EPSG:4326")
-
-    # Extract Mosaik features for PCA
-    mosaik_features = data.iloc[:, feature_start_idx:]
-    pca = PCA(n_components=1)
-    data['PCA_1'] = pca.fit_transform(mosaik_features)
-
-    # Generate heatmaps for each shrid
-    for shrid_id in gdf["shrid2"].unique():
-        selected_data = gdf[gdf["shrid2"] == shrid_id]
-        if selected_data.empty:
-            continue
-
-        selected_polygon = selected_data["geometry"].iloc[0]
-        heatmap_data = [
-            [row[lat_col], row[lon_col], row['PCA_1']]
-            for _, row in selected_data.iterrows()
-            if selected_polygon.contains(Point(row[lon_col], row[lat_col]))
-        ]
-
-        # If no data points fall inside the polygon, skip
-        if not heatmap_data:
-            continue
-
-        x_min, y_min, x_max, y_max = selected_polygon.bounds
-        map_center = [(y_min + y_max) / 2, (x_min + x_max) / 2]
-
-        m = folium.Map(location=map_center, zoom_start=zoom_start)
-        folium.Polygon(
-            locations=[(p[1], p[0]) for p in selected_polygon.exterior.coords],
-            color='blue', weight=2, fill=True, fill_opacity=0.2
-        ).add_to(m)
-        HeatMap(heatmap_data).add_to(m)
-
-        html_file = os.path.join(output_folder, f"polygon_with_heatmap_{shrid_id}.html")
-        m.save(html_file)
\ No newline at end of file
+    # Parse and simplify each shrid's polygon once, rather than once per data point
+    shrid_codes, shrid_ids = pd.factorize(data["shrid2"])
+    first_rows = np.unique(shrid_codes, return_index=True)[1]
+    polygon_strings = data[polygon_col].iloc[first_rows].reset_index(drop=True)
+    coords, offsets = load_polygon_arrays(polygon_strings, polygon_col, geometry_cache)
+    polygons = polygons_from_arrays(coords, offsets)
+    inner, outer = load_simplified_bounds(coords, offsets, geometry_cache)
+
+    if pca_model is None:
+        # Extract Mosaik features for PCA
+        mosaik_features = data.iloc[:, feature_start_idx:]
+        pca = PCA(n_components=1)
+        data['PCA_1'] = pca.fit_transform(mosaik_features)
+    else:
+        # Project with the saved model instead of refitting, so maps of every region share one scale
+        model = StreamingPCA.load(pca_model)
+        feature_positions = _model_feature_positions(data, model, feature_start_idx)
+
+    # Sort the rows by shrid once so every shrid's points are one contiguous slice, instead of
+    # filtering the whole table per shrid; rows without a shrid (code -1) sort first and are skipped
+    order = np.argsort(shrid_codes, kind="stable")
+    bounds = np.searchsorted(shrid_codes[order], np.arange(len(shrid_ids) + 1))
+    lats = data[lat_col].to_numpy(dtype=float)
+    lons = data[lon_col].to_numpy(dtype=float)
+    pca_scores = data['PCA_1'].to_numpy(dtype=float) if pca_model is None else None
+
+    def pages():
+        # Test all of a shrid's points against its polygon at once, and yield the page of every
+        # shrid with points inside; the pages are written by render.write_heatmaps
+        for code, shrid_id in enumerate(shrid_ids):
+            rows = order[bounds[code]:bounds[code + 1]]
+            selected_polygon = polygons[code]
+            rows = rows[prefiltered_contains(selected_polygon, inner[code], outer[code], lons[rows], lats[rows])]
+
+            # If no data points fall inside the polygon, skip
+            if len(rows) == 0:
+                continue
+
+            if pca_model is None:
+                scores = pca_scores[rows]
+            else:
+                scores = model.transform(data.iloc[rows, feature_positions].to_numpy(dtype=np.float32))[:, 0]
+            heatmap_data = np.column_stack([lats[rows], lons[rows], scores])
+
+            x_min, y_min, x_max, y_max = selected_polygon.bounds
+            map_center = [(y_min + y_max) / 2, (x_min + x_max) / 2]
+            ring = shapely.get_coordinates(selected_polygon.exterior)[:, ::-1]
+
+            html_file = os.path.join(output_folder, f"polygon_with_heatmap_{shrid_id}.html")
+            yield html_file, map_center, ring, heatmap_data
+
+    write_heatmaps(pages(), zoom_start, backend, workers)
@@ -0,0 +1,61 @@
+import numpy as np
+import shapely
+from shapely.geometry import Polygon
+
+
+def contains_points(polygon: Polygon, lons, lats) -> np.ndarray:
+    """
+    Test many points against a single polygon in one vectorized call.
+
+    Equivalent to ``[polygon.contains(Point(x, y)) for x, y in zip(lons, lats)]``,
+    including the strict treatment of points lying on the boundary, but without
+    building a shapely ``Point`` per candidate.
+
+    Parameters
+    ----------
+    polygon : shapely.geometry.Polygon
+        Polygon to test against. It is prepared in place on first use.
+    lons : array-like
+        Longitudes (x) of the candidate points.
+    lats : array-like
+        Latitudes (y) of the candidate points.
+
+    Returns
+    -------
+    np.ndarray
+        Boolean mask, True where the point lies strictly inside the polygon.
+    """
+    shapely.prepare(polygon)
+    return shapely.contains_xy(polygon, np.asarray(lons, dtype=float), np.asarray(lats, dtype=float))
+
+
+def contains_points_many(polygons, polygon_index, lons, lats) -> np.ndarray:
+    """
+    Test points against many polygons at once.
+
+    Point ``i`` is tested against ``polygons[polygon_index[i]]``, so the
+    candidate cells of a whole batch of shrids can be checked in one call.
+
+    Parameters
+    ----------
+    polygons : array-like of shapely.geometry.Polygon
+        Polygons to test against. They are prepared in place on first use.
+    polygon_index : array-like of int
+        For each point, the position of its polygon in ``polygons``.
+    lons : array-like
+        Longitudes (x) of the candidate points.
+    lats : array-like
+        Latitudes (y) of the candidate points.
+
+    Returns
+    -------
+    np.ndarray
+        Boolean mask, True where the point lies strictly inside its polygon.
+    """
+    polygons = np.asarray(polygons, dtype=object)
+    shapely.prepare(polygons)
+    return shapely.contains_xy(
+        polygons[np.asarray(polygon_index, dtype=np.intp)],
+        np.asarray(lons, dtype=float),
+        np.asarray(lats, dtype=float),
+    )
@@ -1,20 +1,60 @@
-import pandas as pd
+import glob
+import os
+from ..aggregate import area_weighted_means, stream_group_means, stream_group_stats
+from ..join import PointIndex
+from ..state import AggregationState
 
-def aggregate(file_path):
-    # Load the dataset and rename duplicate columns
-    df = pd.read_csv(file_path)
+def default_output_file(file_path):
+    """Output path for results read from ``file_path``: 'results_averaged.csv' next to a 'results' directory
+    (or glob pattern such as 'results/*.csv'), and 'results_averaged.csv' next to a single 'results.csv'."""
+    if not isinstance(file_path, (str, os.PathLike)):
+        file_path = file_path[0]
+    path = os.path.abspath(os.fspath(file_path))
+    while glob.has_magic(path):
+        path = os.path.dirname(path)
+    if not os.path.isdir(path):
+        path = os.path.splitext(path)[0]
+    return f"{path}_averaged.csv"
 
-    # Fill NaN values with 0 for averaging
-    df = df.fillna(0)
+def aggregate(file_path, workers=1, output_file=None, shrid_file=None, statistics=False, point_file=None,
+              state_dir=None, geometry_cache=None):
+    # file_path can be one MOSAIKS result file, a directory of them or a glob pattern
+    # such as 'results/*.csv'; the files are parsed in parallel with workers > 1.
+    if shrid_file is not None:
+        # Weight every grid point by the fraction of its 0.01 degree cell inside each shrid
+        # polygon of shrid_file; with geometry_cache the weights are computed once and reused by later runs
+        if statistics or point_file is not None or state_dir is not None:
+            raise ValueError("statistics=True, point_file and state_dir are not supported with area weights "
+                             "(shrid_file)")
+        average_features_df = area_weighted_means(file_path, shrid_file, geometry_cache=geometry_cache, workers=workers)
+    else:
+        # MOSAIKS results only carry 'Lat' and 'Lon': pass point_file (the point_shrids.csv written
+        # with dedupe=True) to attach the shrids through a hash index of the grid points instead of
+        # a 'shrid2' column; points shared by several shrids count towards each of them
+        index = PointIndex.from_mapping(point_file) if point_file is not None else None
+        if state_dir is not None:
+            # Keep the per-shrid sums in state_dir and only read the result files that arrived
+            # since the last run; files already ingested are recognised by their content and skipped
+            state = AggregationState(state_dir, statistics=statistics)
+            state.ingest(file_path, workers=workers, index=index)
+            average_features_df = state.statistics() if statistics else state.means()
+        elif statistics:
+            # Count, mean, variance, min and max of each feature per 'shrid2', all in one pass;
+            # columns are named '{feature}_{statistic}'
+            average_features_df = stream_group_stats(file_path, id_column='shrid2', exclude=('Lat', 'Lon'),
+                                                     workers=workers, index=index)
+        else:
+            # Average each feature column per 'shrid2' (all columns except 'shrid2', 'Lat', and 'Lon'),
+            # reading the files in chunks so memory depends on the number of shrids, not rows.
+            # NaN values count as 0, as with fillna(0) before averaging
+            average_features_df = stream_group_means(file_path, id_column='shrid2', exclude=('Lat', 'Lon'),
+                                                     workers=workers, index=index)
 
-    # Identify feature columns (all columns except 'shrid2', 'Lat', and 'Lon')
-    feature_columns = [col for col in df.columns if col not in ['shrid2', 'Lat', 'Lon']]
-
-    # Group by 'shrid2' and calculate the mean for each feature column
-    average_features_df = df.groupby('shrid2')[feature_columns].mean().reset_index()
-
-    # Save the result to a new file (without Lat and Lon)
-    output_file = ''
+    # Save the result to a new file (without Lat and Lon); by default next to the input, never inside
+    # a directory of result files, so a later run over the same directory does not read it back
+    if output_file is None:
+        output_file = default_output_file(file_path)
     average_features_df.to_csv(output_file, index=False)
 
-    print(f"Averaged features saved to {output_file}")
\ No newline at end of file
+    print(f"Averaged features saved to {output_file}")
+    return output_file
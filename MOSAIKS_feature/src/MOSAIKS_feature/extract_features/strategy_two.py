@@ -15,6 +15,11 @@ from io import BytesIO
 import geopandas as gpd
 import matplotlib.patches as patches
 from shapely.geometry import Polygon, Point, box
+from ..geometry import load_polygon_arrays, polygon_bounds, polygon_centroids, polygons_from_arrays
+from ..loader import load_csv
+
+# Columns visualized alongside each polygon
+BOUNDING_BOX_COLUMNS = ['shrid2', 'min_lat', 'max_lat', 'min_lon', 'max_lon', 'centroid_x', 'centroid_y']
 
 
 def compute_bounding_box(polygon):
@@ -22,63 +27,40 @@ def compute_bounding_box(polygon):
     return miny, maxy, minx, maxx  # Returning (min lat, max lat, min lon, max lon)
     
     
-def process_shrid_bounding_boxes(csv_file):
+def process_shrid_bounding_boxes(csv_file, output_file="shrid_bounding_boxes_for_mosaiks.csv", polygon_arrays=None):
     # Load the CSV file
-    df = pd.read_csv(csv_file)
-    
-    # Initialize lists to store bounding box results
-    min_lats = []
-    max_lats = []
-    min_lons = []
-    max_lons = []
-    centroids = []
-    
-    
-    for index, row in df.iterrows():
-        polygon = Polygon(eval(row['polygon_coordinates']))
-        
-        # Compute the bounding box
-        min_lat, max_lat, min_lon, max_lon = compute_bounding_box(polygon)
-        
-        # Store the results
-        min_lats.append(min_lat)
-        max_lats.append(max_lat)
-        min_lons.append(min_lon)
-        max_lons.append(max_lon)
-         
-        # Calculate and Save centroid data
-        centroids.append((polygon.centroid.x, polygon.centroid.y)) 
-   
+    df = load_csv(csv_file, features=(), categorical=False)
 
-    
-    # Add results to the dataframe
-    df['min_lat'] = min_lats
-    df['max_lat'] = max_lats
-    df['min_lon'] = min_lons
-    df['max_lon'] = max_lons
-    df['centroid_x'] = [centroid[0] for centroid in centroids]
-    df['centroid_y'] = [centroid[1] for centroid in centroids]
+    # Flat coordinate and offset arrays of every polygon (reusing the binary sidecar on later
+    # runs); pass polygon_arrays=(coords, offsets) when they are already in memory
+    coords, offsets = polygon_arrays if polygon_arrays is not None else load_polygon_arrays(csv_file)
 
-    
-    # Save results to a new CSV file
-    output_file = "shrid_bounding_boxes_for_mosaiks.csv"
+    # Bounding boxes and centroids of all polygons at once, without building shapely objects
+    bounds = polygon_bounds(coords, offsets)
+    centroids = polygon_centroids(coords, offsets)
+
+    # Add results to the dataframe (x is longitude, y is latitude)
+    df['min_lat'] = bounds[:, 1]
+    df['max_lat'] = bounds[:, 3]
+    df['min_lon'] = bounds[:, 0]
+    df['max_lon'] = bounds[:, 2]
+    df['centroid_x'] = centroids[:, 0]
+    df['centroid_y'] = centroids[:, 1]
+
+    # Save results to the output CSV file
     df.to_csv(output_file, index=False)
-    
+
     return output_file
 
 
 ## Visualizing Boundary Boxes
 def vis_boundary_boxes(csv_file_path):
 
-    shrid_data = pd.read_csv(csv_file_path)
-
-    # Function to convert polygon coordinates to a shapely Polygon object
-    def parse_polygon(polygon_string):
-        coordinates = eval(polygon_string)
-        return Polygon(coordinates)
+    # The polygons come from the sidecar, so only the bounding box and centroid columns are parsed
+    shrid_data = load_csv(csv_file_path, columns=BOUNDING_BOX_COLUMNS, features=(), categorical=False)
 
-    # Convert polygon coordinates into shapely objects
-    shrid_data['geometry'] = shrid_data['polygon_coordinates'].apply(parse_polygon)
+    # Convert polygon coordinates into shapely objects (reusing the binary sidecar on later runs)
+    shrid_data['geometry'] = polygons_from_arrays(*load_polygon_arrays(csv_file_path))
 
     # Create a GeoDataFrame
     gdf = gpd.GeoDataFrame(shrid_data, geometry='geometry')
@@ -0,0 +1,19 @@
+import json
+import os
+import numpy as np
+
+
+def write_array(path: str, array: np.ndarray):
+    """Write an .npy file atomically, so a crashed run never leaves a partial file at ``path``."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def write_json(path: str, data):
+    """Write a JSON file atomically, e.g. a manifest naming the arrays written before it."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp_path, path)
@@ -0,0 +1,154 @@
+import numpy as np
+import pandas as pd
+from .loader import iter_csv, result_files
+
+# Rows read per chunk; only the subset columns are parsed, so chunks stay small
+CHUNK_ROWS = 1000000
+
+# Register index bits of HyperLogLog; 2**14 registers give about 0.8% standard error
+HLL_PRECISION = 14
+
+
+def row_fingerprints(data: pd.DataFrame) -> np.ndarray:
+    """
+    Hash every row of a frame into a 64-bit fingerprint.
+
+    Numeric columns are hashed as float64, so a value hashes the same in every
+    chunk whether pandas inferred it as int or float there (e.g. because
+    another row of the chunk is missing), just as ``DataFrame.duplicated``
+    treats ``1`` and ``1.0`` as equal.
+
+    Returns
+    -------
+    np.ndarray
+        uint64 fingerprint of each row.
+    """
+    data = data.reset_index(drop=True)
+    normalized = {column: (values.astype(np.float64) if pd.api.types.is_numeric_dtype(values) else values.astype(str))
+                  for column, values in data.items()}
+    return pd.util.hash_pandas_object(pd.DataFrame(normalized), index=False).to_numpy()
+
+
+def iter_fingerprints(file_paths, subset_columns, chunksize: int = CHUNK_ROWS):
+    """
+    Yield the row fingerprints of CSV files chunk by chunk, reading only ``subset_columns``.
+
+    Parameters
+    ----------
+    file_paths : str or list of str
+        Files, directories or glob patterns, see :func:`loader.result_files`.
+    subset_columns : list of str
+        Columns that identify a row.
+    chunksize : int, optional
+        Rows per chunk.
+
+    Yields
+    ------
+    np.ndarray
+        uint64 fingerprints of one chunk.
+    """
+    for file_path in result_files(file_paths):
+        for chunk in iter_csv(file_path, chunksize, columns=list(subset_columns), features=(), categorical=False):
+            yield row_fingerprints(chunk[list(subset_columns)])
+
+
+class FingerprintCounts:
+    """
+    Exact count of every distinct row fingerprint, in sorted arrays.
+
+    Fingerprints of new chunks are buffered and folded into the sorted
+    ``keys``/``counts`` arrays once the buffer is as large as the arrays,
+    so every fingerprint is re-sorted only a logarithmic number of times.
+    Memory is 16 bytes per distinct row, however many rows are added; two
+    different rows share a fingerprint with probability about ``n**2 / 2**65``.
+    """
+
+    def __init__(self):
+        """Create an empty set of counts."""
+        self.keys = np.empty(0, dtype=np.uint64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self._pending = []
+        self._pending_rows = 0
+
+    def add(self, fingerprints: np.ndarray):
+        """Count one more row for each fingerprint."""
+        self._pending.append(np.asarray(fingerprints, dtype=np.uint64))
+        self._pending_rows += len(fingerprints)
+        if self._pending_rows >= max(len(self.keys), CHUNK_ROWS):
+            self._consolidate()
+
+    def _consolidate(self):
+        if not self._pending:
+            return
+        keys = np.concatenate([self.keys, *self._pending])
+        counts = np.concatenate([self.counts, np.ones(self._pending_rows, dtype=np.int64)])
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.empty(0, dtype=np.int64)
+        self.keys = keys[starts]
+        self.counts = np.add.reduceat(counts[order], starts) if len(keys) else np.empty(0, dtype=np.int64)
+        self._pending = []
+        self._pending_rows = 0
+
+    def distinct(self) -> int:
+        """Number of distinct rows."""
+        self._consolidate()
+        return len(self.keys)
+
+    def duplicates(self) -> int:
+        """Number of rows that have a duplicate, every copy counted, like ``duplicated(keep=False).sum()``."""
+        self._consolidate()
+        return int(self.counts[self.counts > 1].sum())
+
+
+class HyperLogLog:
+    """
+    Approximate distinct count in constant memory.
+
+    Each fingerprint selects one of ``2**precision`` one-byte registers by its
+    top bits; the register keeps the largest position of the first set bit
+    among the remaining bits. The harmonic mean of the registers estimates the
+    number of distinct fingerprints with a relative standard error of about
+    ``1.04 / sqrt(2**precision)``, and small counts are corrected with linear
+    counting (Flajolet et al., 2007).
+    """
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        """
+        Create empty registers.
+
+        Raises
+        ------
+        ValueError
+            If ``precision`` is outside 11 to 18; the remaining bits must fit
+            exactly in a float64 to find their first set bit.
+        """
+        if not 11 <= precision <= 18:
+            raise ValueError(f"precision must be between 11 and 18, not {precision}")
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, fingerprints: np.ndarray):
+        """Add fingerprints to the registers."""
+        fingerprints = np.asarray(fingerprints, dtype=np.uint64)
+        width = 64 - self.precision
+        index = (fingerprints >> np.uint64(width)).astype(np.int64)
+        rest = fingerprints & np.uint64((1 << width) - 1)
+        # frexp gives the bit length of the remaining bits, which fit exactly in a float64
+        bit_length = np.frexp(rest.astype(np.float64))[1]
+        rank = (width - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: "HyperLogLog"):
+        """Add the registers of another :class:`HyperLogLog` of the same precision."""
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self) -> int:
+        """Estimated number of distinct fingerprints added."""
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5 * m and zeros > 0:
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
@@ -0,0 +1,253 @@
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import Polygon
+from .fileio import write_array, write_json
+
+# Bump when the parsed layout changes so stale sidecars are ignored
+SIDECAR_VERSION = 1
+
+# Index of the source file behind every key in a sidecar directory
+SOURCES = "source.json"
+
+_SEPARATORS = str.maketrans("()[],", "     ")
+
+
+def parse_coordinates(strings):
+    """
+    Parse polygon coordinate strings into flat coordinate and offset arrays.
+
+    Strings have the form ``"[(lon, lat), (lon, lat), ...]"``. They are
+    tokenized directly instead of being ``eval``-ed, and anything that is not a
+    list of numeric pairs is rejected.
+
+    Parameters
+    ----------
+    strings : iterable of str
+        One coordinate string per polygon.
+
+    Returns
+    -------
+    tuple (np.ndarray, np.ndarray)
+        ``coords`` of shape (n_vertices, 2) and int64 ``offsets`` of length
+        n_polygons + 1; polygon ``i`` is ``coords[offsets[i]:offsets[i + 1]]``.
+
+    Raises
+    ------
+    ValueError
+        If a string is not a list of ``(x, y)`` pairs.
+    """
+    strings = [str(s) for s in strings]
+    vertex_counts = np.fromiter((s.count("(") for s in strings), dtype=np.int64, count=len(strings))
+    comma_counts = np.fromiter((s.count(",") for s in strings), dtype=np.int64, count=len(strings))
+
+    # Each pair has one inner comma, and consecutive pairs are separated by one more
+    malformed = np.flatnonzero((vertex_counts == 0) | (comma_counts != 2 * vertex_counts - 1))
+    if len(malformed) > 0:
+        i = int(malformed[0])
+        raise ValueError(f"Malformed polygon coordinates in row {i}: {strings[i][:80]!r}")
+
+    try:
+        values = np.array(" ".join(strings).translate(_SEPARATORS).split(), dtype=np.float64)
+    except ValueError as e:
+        raise ValueError(f"Malformed polygon coordinates: {e}") from None
+    if len(values) != 2 * vertex_counts.sum() or not np.isfinite(values).all():
+        raise ValueError("Malformed polygon coordinates: expected two finite numbers per vertex")
+
+    offsets = np.zeros(len(strings) + 1, dtype=np.int64)
+    np.cumsum(vertex_counts, out=offsets[1:])
+    return values.reshape(-1, 2), offsets
+
+
+def parse_polygon(polygon_string: str) -> Polygon:
+    """Convert a single coordinate string into a shapely Polygon without ``eval``."""
+    coords, _ = parse_coordinates([polygon_string])
+    return Polygon(coords)
+
+
+def polygons_from_arrays(coords, offsets) -> np.ndarray:
+    """
+    Build shapely Polygons for every polygon in flat coordinate/offset arrays at once.
+
+    Returns
+    -------
+    np.ndarray
+        Object array of shapely Polygons, one per polygon.
+    """
+    offsets = np.asarray(offsets)
+    ring_index = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    rings = shapely.linearrings(np.asarray(coords), indices=ring_index)
+    return shapely.polygons(rings)
+
+
+def take_polygons(coords, offsets, indices):
+    """
+    Select polygons from flat coordinate/offset arrays.
+
+    Returns
+    -------
+    tuple (np.ndarray, np.ndarray)
+        ``(coords, offsets)`` of the polygons at ``indices``, in that order.
+    """
+    offsets = np.asarray(offsets)
+    indices = np.asarray(indices, dtype=np.int64)
+    starts = offsets[indices]
+    counts = offsets[indices + 1] - starts
+    new_offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+    np.cumsum(counts, out=new_offsets[1:])
+    vertex_index = np.repeat(starts - new_offsets[:-1], counts) + np.arange(new_offsets[-1])
+    return np.asarray(coords)[vertex_index], new_offsets
+
+
+def polygon_bounds(coords, offsets) -> np.ndarray:
+    """
+    Bounding box of every polygon in flat coordinate/offset arrays, with segmented min/max reductions.
+
+    Returns
+    -------
+    np.ndarray
+        Array of shape (n_polygons, 4) with ``(minx, miny, maxx, maxy)`` per
+        polygon, as ``shapely.bounds``.
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    starts = np.asarray(offsets)[:-1]
+    if len(starts) == 0:
+        return np.empty((0, 4))
+    return np.hstack([np.minimum.reduceat(coords, starts, axis=0), np.maximum.reduceat(coords, starts, axis=0)])
+
+
+def polygon_centroids(coords, offsets) -> np.ndarray:
+    """
+    Centroid of every polygon in flat coordinate/offset arrays, with a vectorized shoelace formula.
+
+    Rings are closed implicitly, and each polygon is shifted to its first
+    vertex before summing to keep the cross products precise. As in shapely,
+    a polygon with zero area gets the length-weighted centroid of its
+    boundary, and one with zero length the mean of its vertices.
+
+    Returns
+    -------
+    np.ndarray
+        Array of shape (n_polygons, 2) with ``(x, y)`` per polygon.
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    offsets = np.asarray(offsets)
+    n = len(offsets) - 1
+    counts = np.diff(offsets)
+    polygon = np.repeat(np.arange(n), counts)
+    # Each vertex is joined to the next one of its polygon, the last one back to the first
+    following = np.arange(1, len(coords) + 1)
+    following[offsets[1:][counts > 0] - 1] = offsets[:-1][counts > 0]
+    origin = coords[offsets[:-1][counts > 0]]
+    p = coords - np.repeat(origin, counts[counts > 0], axis=0)
+    q = p[following]
+
+    cross = p[:, 0] * q[:, 1] - q[:, 0] * p[:, 1]
+    area6 = 3 * np.bincount(polygon, cross, minlength=n)
+    lengths = np.hypot(*(q - p).T)
+    perimeter = np.bincount(polygon, lengths, minlength=n)
+    centroids = np.empty((n, 2))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for axis in range(2):
+            by_area = np.bincount(polygon, (p[:, axis] + q[:, axis]) * cross, minlength=n) / area6
+            by_length = np.bincount(polygon, (p[:, axis] + q[:, axis]) / 2 * lengths, minlength=n) / perimeter
+            by_vertex = np.bincount(polygon, p[:, axis], minlength=n) / counts
+            centroids[:, axis] = np.where(area6 != 0, by_area, np.where(perimeter > 0, by_length, by_vertex))
+    centroids[counts > 0] += origin
+    return centroids
+
+
+def _source_hash(source, column: str) -> str:
+    """Hash a CSV file's bytes, or the strings of a Series, into a cache key."""
+    digest = hashlib.sha256(f"v{SIDECAR_VERSION}:{column}:".encode())
+    if isinstance(source, pd.Series):
+        for value in source:
+            digest.update(str(value).encode())
+            digest.update(b"\n")
+    else:
+        with open(source, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()[:32]
+
+
+def _update_sources(cache_dir: str, source_id: str, key: str):
+    """
+    Record in ``source.json`` that ``key`` holds the polygons of ``source_id``.
+
+    Returns
+    -------
+    str or None
+        The key the source had before, if it changed and no other source
+        shares the old one.
+    """
+    path = os.path.join(cache_dir, SOURCES)
+    sources = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            sources = json.load(f)
+    old_key = sources.get(source_id)
+    if old_key == key:
+        return None
+    sources[source_id] = key
+    write_json(path, sources)
+    return None if old_key in sources.values() else old_key
+
+
+def load_polygon_arrays(source, column: str = "polygon_coordinates", cache_dir: str = None):
+    """
+    Load polygon coordinates, optionally through a binary sidecar cache.
+
+    Without ``cache_dir`` the coordinate strings are parsed with
+    :func:`parse_coordinates`. With it, the first load writes the result as
+    ``.npy`` files keyed by the hash of the source, and later loads of the same
+    content, from any stage, memory-map those files instead of parsing the
+    text again. Several sources can share one ``cache_dir``: ``source.json``
+    records the key of every CSV file, and when a file changes only its own
+    stale arrays are removed.
+
+    Parameters
+    ----------
+    source : str or pd.Series
+        Path to a CSV file with a ``column`` column, or the column itself.
+    column : str, optional
+        Name of the column holding the coordinate strings.
+    cache_dir : str, optional
+        Directory for the sidecar; nothing is cached without it.
+
+    Returns
+    -------
+    tuple (np.ndarray, np.ndarray)
+        ``(coords, offsets)`` as returned by :func:`parse_coordinates`, aligned
+        with the row order of the source.
+    """
+    if cache_dir is None:
+        strings = source if isinstance(source, pd.Series) else pd.read_csv(source, usecols=[column])[column]
+        return parse_coordinates(strings)
+
+    key = _source_hash(source, column)
+    coords_path = os.path.join(cache_dir, f"{key}.coords.npy")
+    offsets_path = os.path.join(cache_dir, f"{key}.offsets.npy")
+    if os.path.exists(coords_path) and os.path.exists(offsets_path):
+        coords, offsets = np.load(coords_path, mmap_mode="r"), np.load(offsets_path, mmap_mode="r")
+    else:
+        strings = source if isinstance(source, pd.Series) else pd.read_csv(source, usecols=[column])[column]
+        coords, offsets = parse_coordinates(strings)
+        os.makedirs(cache_dir, exist_ok=True)
+        write_array(coords_path, coords)
+        write_array(offsets_path, offsets)
+
+    # Drop the arrays of an earlier version of the same file; other files' arrays,
+    # and the prefilter and weight arrays stored alongside, are left alone
+    if not isinstance(source, pd.Series):
+        old_key = _update_sources(cache_dir, f"{os.path.abspath(source)}:{column}", key)
+        if old_key is not None:
+            for suffix in ("coords", "offsets"):
+                try:
+                    os.remove(os.path.join(cache_dir, f"{old_key}.{suffix}.npy"))
+                except FileNotFoundError:
+                    pass
+    return coords, offsets
@@ -0,0 +1,420 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from shapely.geometry import Polygon
+from . import lattice
+from .containment import contains_points
+from .geometry import parse_coordinates, polygons_from_arrays, take_polygons
+from .prefilter import load_simplified_bounds, prefiltered_cells
+from .quadtree import quadtree_cells
+from .rasterize import scanline_cells
+from .store import GridStore, shrid_hashes
+
+# Work units handed to the pool per worker; more units smooth out uneven shrids
+UNITS_PER_WORKER = 8
+
+# Upper bound on the estimated cost (roughly, candidate cells) of one work unit,
+# which bounds the memory held per batch regardless of the input size
+MAX_COST_PER_UNIT = 2000000
+
+# MOSAIKS accepts at most this many rows per uploaded file
+CHUNK_SIZE = 100000
+
+# Shrid table columns read when the polygons come from the binary sidecar
+SHRID_COLUMNS = ["Unnamed: 0", "shrid2", "min_lat", "max_lat", "min_lon", "max_lon"]
+
+
+def cells_inside_polygon(polygon: Polygon, row_start: int, row_stop: int, col_start: int, col_stop: int):
+    """
+    Return the lattice cells of a bounding box whose centers lie strictly inside a polygon.
+
+    Returns
+    -------
+    tuple (np.ndarray, np.ndarray)
+        int32 ``(rows, cols)`` of the contained cells, latitude-major.
+    """
+    rows, cols = lattice.bbox_cells(row_start, row_stop, col_start, col_stop)
+    inside = contains_points(polygon, lattice.to_degrees(cols), lattice.to_degrees(rows))
+    return rows[inside], cols[inside]
+
+
+# Ways of finding the cells inside a polygon; all give identical results.
+# 'prefilter' also takes the polygon's inner and outer simplification.
+CONTAINMENT_METHODS = {
+    "prepared": cells_inside_polygon,
+    "scanline": scanline_cells,
+    "prefilter": prefiltered_cells,
+    "quadtree": quadtree_cells,
+}
+
+
+def cells_inside_extent(min_lat: float, max_lat: float, min_lon: float, max_lon: float,
+                        row_start: int, row_stop: int, col_start: int, col_stop: int):
+    """
+    Return the lattice cells of a bounding box whose centers lie within its min/max extent.
+
+    Returns
+    -------
+    tuple (np.ndarray, np.ndarray)
+        int32 ``(rows, cols)`` of the cells, latitude-major.
+    """
+    rows, cols = lattice.bbox_cells(row_start, row_stop, col_start, col_stop)
+    lons = lattice.to_degrees(cols)
+    lats = lattice.to_degrees(rows)
+    valid = (lons >= min_lon) & (lons <= max_lon) & (lats >= min_lat) & (lats <= max_lat)
+    return rows[valid], cols[valid]
+
+
+def estimate_costs(data: pd.DataFrame, inside_polygon: bool = True, vertex_counts=None) -> np.ndarray:
+    """
+    Estimate the relative cost of generating the grid for each shrid.
+
+    The cost grows with the number of bounding-box cells and, when testing
+    against the polygon, with the number of polygon vertices.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Shrid table with 'min_lat', 'max_lat', 'min_lon', 'max_lon' and, if
+        ``inside_polygon``, 'polygon_coordinates' columns.
+    inside_polygon : bool, optional
+        Whether cells will be tested against the polygon.
+    vertex_counts : array-like, optional
+        Vertices per polygon, if already known; otherwise counted from the
+        coordinate strings.
+
+    Returns
+    -------
+    np.ndarray
+        float64 cost per row of ``data``.
+    """
+    row_start, row_stop = lattice.cell_bounds(data["min_lat"], data["max_lat"])
+    col_start, col_stop = lattice.cell_bounds(data["min_lon"], data["max_lon"])
+    cells = np.maximum(row_stop - row_start, 0).astype(np.float64) * np.maximum(col_stop - col_start, 0)
+    if not inside_polygon:
+        return cells + 1.0
+    if vertex_counts is None:
+        vertex_counts = data["polygon_coordinates"].str.count(r"\(")
+    vertices = np.asarray(vertex_counts, dtype=np.float64)
+    return cells * np.log2(vertices + 2) + vertices + 1.0
+
+
+def split_work_units(costs, n_units: int) -> list:
+    """
+    Split rows into contiguous ``(start, stop)`` ranges of roughly equal total cost.
+
+    Ranges are contiguous and in order, so concatenating the results of the
+    units reproduces the original row order.
+    """
+    costs = np.asarray(costs, dtype=np.float64)
+    n_rows = len(costs)
+    n_units = max(1, min(int(n_units), n_rows))
+    if n_rows == 0:
+        return []
+    cumulative = np.cumsum(costs)
+    targets = cumulative[-1] * np.arange(1, n_units) / n_units
+    cuts = np.searchsorted(cumulative, targets, side="right")
+    bounds = np.unique(np.concatenate(([0], cuts, [n_rows])))
+    return [(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def _generate_unit(unit):
+    """Generate the cells of one contiguous work unit (runs inside a worker process)."""
+    offset, bounds, extents, geometry, method, simplified = unit
+    polygons = None if geometry is None else polygons_from_arrays(*geometry)
+    polygon_cells = CONTAINMENT_METHODS[method]
+    positions_list = []
+    rows_list = []
+    cols_list = []
+
+    for i in range(len(bounds)):
+        if polygons is not None and simplified is not None:
+            rows, cols = polygon_cells(polygons[i], simplified[0][i], simplified[1][i], *bounds[i])
+        elif polygons is not None:
+            rows, cols = polygon_cells(polygons[i], *bounds[i])
+        else:
+            rows, cols = cells_inside_extent(*extents[i], *bounds[i])
+
+        if len(rows) > 0:
+            positions_list.append(np.full(len(rows), offset + i, dtype=np.int64))
+            rows_list.append(rows)
+            cols_list.append(cols)
+
+    if not rows_list:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+    return np.concatenate(positions_list), np.concatenate(rows_list), np.concatenate(cols_list)
+
+
+def iter_grid_cells(data: pd.DataFrame, inside_polygon: bool = True, workers: int = 1, polygon_arrays=None,
+                    method: str = "prepared", cache_dir: str = None, store_dir: str = None):
+    """
+    Generate the lattice cells of every shrid, one work unit at a time.
+
+    Shrids are split into contiguous work units balanced by :func:`estimate_costs`,
+    each of roughly at most ``MAX_COST_PER_UNIT``. With ``workers > 1``
+    the units are processed in a process pool; results are always yielded in
+    the original row order, so the output is deterministic and independent of
+    the worker count.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Shrid table with 'min_lat', 'max_lat', 'min_lon', 'max_lon' and, if
+        ``inside_polygon``, 'polygon_coordinates' columns.
+    inside_polygon : bool, optional
+        Keep only cells whose centers are strictly inside the polygon. If False,
+        keep every cell whose center lies within the min/max extent.
+    workers : int, optional
+        Number of worker processes. 1 runs in-process; None uses all cores.
+    polygon_arrays : tuple (np.ndarray, np.ndarray), optional
+        Pre-parsed ``(coords, offsets)`` of the polygons, e.g. from
+        :func:`geometry.load_polygon_arrays`. Parsed from the
+        'polygon_coordinates' column if not given.
+    method : str, optional
+        How cells are tested against the polygon, one of ``CONTAINMENT_METHODS``:
+        'prepared' tests every bounding-box cell against the prepared polygon,
+        'scanline' rasterizes the polygon row by row, 'prefilter' settles most
+        cells against simplified inner/outer polygons first (see
+        :mod:`prefilter`), 'quadtree' emits whole blocks of cells that are
+        inside the polygon (see :mod:`quadtree`). Results are identical.
+    cache_dir : str, optional
+        Directory caching the simplified polygons of the 'prefilter' method
+        across runs, e.g. the geometry sidecar of the input CSV.
+    store_dir : str, optional
+        Directory of a :class:`store.GridStore`. Only shrids whose polygon or
+        bounds are not in the store yet are generated (and added to it); all
+        cells are then read back from the store. Reruns on unchanged input, or
+        after a crash, skip the work already done.
+
+    Yields
+    ------
+    tuple (np.ndarray, np.ndarray, np.ndarray)
+        ``(positions, rows, cols)``: the row position in ``data`` of each cell
+        and its int32 lattice indices.
+    """
+    workers = os.cpu_count() if workers is None else max(1, int(workers))
+    if method not in CONTAINMENT_METHODS:
+        raise ValueError(f"Unknown containment method {method!r}, expected one of {list(CONTAINMENT_METHODS)}")
+    if store_dir is not None:
+        yield from _iter_stored_cells(data, inside_polygon, workers, polygon_arrays, method, cache_dir, store_dir)
+        return
+
+    row_start, row_stop = lattice.cell_bounds(data["min_lat"], data["max_lat"])
+    col_start, col_stop = lattice.cell_bounds(data["min_lon"], data["max_lon"])
+    bounds = np.column_stack([row_start, row_stop, col_start, col_stop])
+    extents = data[["min_lat", "max_lat", "min_lon", "max_lon"]].to_numpy(dtype=np.float64)
+    if inside_polygon:
+        coords, offsets = polygon_arrays if polygon_arrays is not None else parse_coordinates(data["polygon_coordinates"])
+        vertex_counts = np.diff(offsets)
+    else:
+        coords, offsets, vertex_counts = None, None, None
+    if inside_polygon and method == "prefilter":
+        inner, outer = load_simplified_bounds(coords, offsets, cache_dir)
+    else:
+        inner, outer = None, None
+
+    def unit_simplified(start, stop):
+        return None if inner is None else (inner[start:stop], outer[start:stop])
+
+    def unit_geometry(start, stop):
+        if coords is None:
+            return None
+        return np.asarray(coords[offsets[start]:offsets[stop]]), np.asarray(offsets[start:stop + 1]) - offsets[start]
+
+    costs = estimate_costs(data, inside_polygon, vertex_counts)
+    n_units = max(int(np.ceil(costs.sum() / MAX_COST_PER_UNIT)), 1 if workers == 1 else workers * UNITS_PER_WORKER)
+    units = (
+        (start, bounds[start:stop], extents[start:stop], unit_geometry(start, stop), method,
+         unit_simplified(start, stop))
+        for start, stop in split_work_units(costs, n_units)
+    )
+
+    if workers == 1:
+        yield from map(_generate_unit, units)
+        return
+
+    # Keep only a bounded window of units in flight so memory does not grow with the input
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for unit in units:
+            pending.append(executor.submit(_generate_unit, unit))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _iter_stored_cells(data: pd.DataFrame, inside_polygon: bool, workers: int, polygon_arrays, method: str,
+                       cache_dir: str, store_dir: str):
+    """Generate the cells of the shrids missing from a GridStore, then yield every shrid's cells from it."""
+    store = GridStore(store_dir)
+    row_start, row_stop = lattice.cell_bounds(data["min_lat"], data["max_lat"])
+    col_start, col_stop = lattice.cell_bounds(data["min_lon"], data["max_lon"])
+    bounds = np.column_stack([row_start, row_stop, col_start, col_stop])
+    extents = data[["min_lat", "max_lat", "min_lon", "max_lon"]].to_numpy(dtype=np.float64)
+    if inside_polygon:
+        coords, offsets = polygon_arrays if polygon_arrays is not None else parse_coordinates(data["polygon_coordinates"])
+    else:
+        coords, offsets = None, None
+    hashes = shrid_hashes(bounds, extents, coords, offsets)
+
+    missing = store.missing(hashes)
+    if len(missing) > 0:
+        subset = data.iloc[missing].reset_index(drop=True)
+        subset_arrays = take_polygons(coords, offsets, missing) if inside_polygon else None
+        # Only cache prefilter polygons for the full input, not for every partial rerun
+        subset_cache = cache_dir if len(missing) == len(data) else None
+
+        # Units arrive in row order, so every shrid up to the last one seen is complete
+        done = 0
+        for positions, rows, cols in iter_grid_cells(subset, inside_polygon, workers, subset_arrays, method, subset_cache):
+            if len(positions) == 0:
+                continue
+            stop = int(positions[-1]) + 1
+            counts = np.bincount(positions - done, minlength=stop - done)
+            store.write_segment(hashes[missing[done:stop]], counts, lattice.pack(rows, cols))
+            done = stop
+        store.write_segment(hashes[missing[done:]], np.zeros(len(missing) - done, dtype=np.int64),
+                            np.empty(0, dtype=np.int64))
+
+    # Read everything back in row order, in batches bounded like work units
+    cell_counts = store.cell_counts(hashes)
+    n_batches = max(int(np.ceil(cell_counts.sum() / MAX_COST_PER_UNIT)), 1)
+    for start, stop in split_work_units(cell_counts, n_batches):
+        counts, keys = store.read(hashes[start:stop])
+        rows, cols = lattice.unpack(keys)
+        yield np.repeat(np.arange(start, stop, dtype=np.int64), counts), rows, cols
+
+    store.write_manifest(data["shrid2"], hashes)
+    store.prune(hashes)
+
+
+def generate_grid_cells(data: pd.DataFrame, inside_polygon: bool = True, workers: int = 1, polygon_arrays=None,
+                        method: str = "prepared", cache_dir: str = None, store_dir: str = None):
+    """
+    Generate the lattice cells of every shrid as flat arrays.
+
+    See :func:`iter_grid_cells` for the parameters.
+
+    Returns
+    -------
+    tuple (np.ndarray, np.ndarray, np.ndarray)
+        ``(positions, rows, cols)`` for all shrids, in the original row order.
+    """
+    positions_list = []
+    rows_list = []
+    cols_list = []
+    for positions, rows, cols in iter_grid_cells(data, inside_polygon, workers, polygon_arrays, method, cache_dir, store_dir):
+        positions_list.append(positions)
+        rows_list.append(rows)
+        cols_list.append(cols)
+
+    if not rows_list:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+    return np.concatenate(positions_list), np.concatenate(rows_list), np.concatenate(cols_list)
+
+
+def iter_coordinate_frames(data: pd.DataFrame, id_column: str = "shrid2",
+                           inside_polygon: bool = True, workers: int = 1, polygon_arrays=None,
+                           method: str = "prepared", cache_dir: str = None, store_dir: str = None):
+    """
+    Generate the grid coordinates of every shrid as a stream of DataFrames.
+
+    Each frame holds one work unit of :func:`iter_grid_cells`, with lattice
+    indices converted to 'Lon'/'Lat' degrees.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Shrid table with 'Unnamed: 0' and 'shrid2' columns besides those
+        required by :func:`iter_grid_cells`.
+    id_column : str, optional
+        Name of the output column holding the shrid ID.
+    inside_polygon : bool, optional
+        See :func:`iter_grid_cells`.
+    workers : int, optional
+        See :func:`iter_grid_cells`.
+    polygon_arrays : tuple (np.ndarray, np.ndarray), optional
+        See :func:`iter_grid_cells`.
+    method : str, optional
+        See :func:`iter_grid_cells`.
+    cache_dir : str, optional
+        See :func:`iter_grid_cells`.
+    store_dir : str, optional
+        See :func:`iter_grid_cells`.
+
+    Yields
+    ------
+    pd.DataFrame
+        Columns 'Unnamed: 0', ``id_column``, 'Lon', 'Lat'.
+    """
+    id_counts = data["Unnamed: 0"].to_numpy()
+    shrid_ids = data["shrid2"].to_numpy()
+    for positions, rows, cols in iter_grid_cells(data, inside_polygon, workers, polygon_arrays, method, cache_dir, store_dir):
+        yield pd.DataFrame({
+            "Unnamed: 0": id_counts[positions],
+            id_column: shrid_ids[positions],
+            "Lon": lattice.to_degrees(cols),
+            "Lat": lattice.to_degrees(rows)
+        })
+
+
+def write_coordinate_chunks(frames, chunk_size: int = CHUNK_SIZE,
+                            prefix: str = "file_coordinates", float_format: str = "%.3f") -> list:
+    """
+    Stream DataFrames into numbered CSV files of at most ``chunk_size`` rows.
+
+    Each file is written as soon as it fills, so at most one chunk plus one
+    incoming frame is held in memory. No file is written for an empty
+    remainder.
+
+    Parameters
+    ----------
+    frames : iterable of pd.DataFrame
+        Frames with identical columns, e.g. from :func:`iter_coordinate_frames`.
+    chunk_size : int, optional
+        Maximum number of rows per file.
+    prefix : str, optional
+        Files are named ``{prefix}_{i}.csv`` starting at 1.
+    float_format : str, optional
+        Format used for float columns.
+
+    Returns
+    -------
+    list of str
+        Names of the files written, in order.
+    """
+    filenames = []
+    buffer = []
+    buffered_rows = 0
+    rows_written = 0
+
+    def flush(chunk_df):
+        nonlocal rows_written
+        chunk_filename = f"{prefix}_{len(filenames) + 1}.csv"
+        chunk_df.to_csv(chunk_filename, index=False, float_format=float_format)
+        filenames.append(chunk_filename)
+        print(f"Saved {chunk_filename} with rows {rows_written} to {rows_written + len(chunk_df) - 1}")
+        rows_written += len(chunk_df)
+
+    for frame in frames:
+        if frame.empty:
+            continue
+        buffer.append(frame)
+        buffered_rows += len(frame)
+
+        # Write out every full chunk and keep the remainder buffered
+        if buffered_rows >= chunk_size:
+            pending = pd.concat(buffer, ignore_index=True)
+            full = (len(pending) // chunk_size) * chunk_size
+            for start in range(0, full, chunk_size):
+                flush(pending.iloc[start:start + chunk_size])
+            buffer = [pending.iloc[full:]] if full < len(pending) else []
+            buffered_rows = len(pending) - full
+
+    if buffered_rows > 0:
+        flush(pd.concat(buffer, ignore_index=True))
+
+    return filenames
@@ -0,0 +1,183 @@
+import numpy as np
+import pandas as pd
+from . import lattice
+from .grid import iter_grid_cells
+from .loader import load_csv
+
+# Points are looked up in a direct-address table over their lattice bounding
+# box, instead of a hash table, unless that box has more cells than this per point
+DENSE_CELLS_PER_POINT = 8
+
+
+def snap_keys(lat, lon) -> np.ndarray:
+    """
+    Snap coordinates to the packed key (:func:`lattice.pack`) of the lattice cell containing them.
+
+    MOSAIKS returns the center of the 0.01° cell it snapped each query to,
+    possibly rounded (e.g. to 3 decimals); any coordinate inside the cell maps
+    to the same key, so the join does not depend on how the floats were written.
+    """
+    return lattice.pack(lattice.to_index(lat), lattice.to_index(lon))
+
+
+class PointIndex:
+    """
+    Hash index from lattice points to the shrids containing them.
+
+    The distinct points are held in a hash-based ``pd.Index`` of their packed
+    keys, and the shrids of each point in CSR form (``indptr``, ``shrid_ids``),
+    so looking up ``n`` result rows is a single O(n) probe followed by
+    vectorized expansion, with no sorting or merging on float columns. A point
+    shared by several shrids, e.g. on a border between bounding boxes, maps to
+    all of them.
+
+    Grid points of neighbouring shrids fill most of their bounding box on the
+    lattice, so the position of every cell of the box is usually kept in a
+    plain array as well: a perfect hash that replaces probing by a single
+    gather and is several times faster.
+    """
+
+    def __init__(self, keys, shrid_ids):
+        """
+        Build the index from one entry per (point, shrid) pair.
+
+        Parameters
+        ----------
+        keys : array-like of int64
+            Packed lattice key of each pair.
+        shrid_ids : array-like
+            Shrid ID of each pair.
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        shrid_ids = np.asarray(shrid_ids)
+        codes, unique_keys = pd.factorize(keys)
+        order = np.argsort(codes, kind="stable")
+        self.keys = pd.Index(unique_keys)
+        # One extra, empty slot for points that are not in the index
+        self.indptr = np.zeros(len(unique_keys) + 2, dtype=np.int64)
+        np.cumsum(np.bincount(codes, minlength=len(unique_keys) + 1), out=self.indptr[1:])
+        self.shrid_ids = shrid_ids[order]
+
+        self._table = None
+        if len(unique_keys) > 0:
+            rows, cols = lattice.unpack(unique_keys)
+            self._origin = (int(rows.min()), int(cols.min()))
+            self._shape = (int(rows.max()) - self._origin[0] + 1, int(cols.max()) - self._origin[1] + 1)
+            if self._shape[0] * self._shape[1] <= DENSE_CELLS_PER_POINT * len(unique_keys):
+                self._table = np.full(self._shape[0] * self._shape[1], len(unique_keys), dtype=np.int64)
+                self._table[self._cells(rows, cols)] = np.arange(len(unique_keys))
+
+    def __len__(self) -> int:
+        """Number of distinct points."""
+        return len(self.keys)
+
+    @classmethod
+    def from_mapping(cls, mapping_file: str, id_column: str = "shrid2") -> "PointIndex":
+        """Build the index from the point-to-shrid table written by :func:`upload.plan_uploads`."""
+        mapping = load_csv(mapping_file, columns=["Lat", "Lon", id_column], features=(), categorical=False)
+        return cls(snap_keys(mapping["Lat"], mapping["Lon"]), mapping[id_column].to_numpy())
+
+    @classmethod
+    def from_shrids(cls, data: pd.DataFrame, inside_polygon: bool = True, **grid_options) -> "PointIndex":
+        """
+        Build the index by generating the grid points of a shrid table.
+
+        Parameters
+        ----------
+        data : pd.DataFrame
+            Shrid table with a 'shrid2' column, as accepted by :func:`grid.iter_grid_cells`.
+        inside_polygon : bool, optional
+            Whether the points were generated inside the polygons or the min/max bounds.
+        **grid_options
+            Further arguments of :func:`grid.iter_grid_cells`, e.g. ``polygon_arrays`` or ``store_dir``.
+        """
+        positions_list = [np.empty(0, dtype=np.int64)]
+        keys_list = [np.empty(0, dtype=np.int64)]
+        for positions, rows, cols in iter_grid_cells(data, inside_polygon, **grid_options):
+            positions_list.append(positions)
+            keys_list.append(lattice.pack(rows, cols))
+        positions = np.concatenate(positions_list)
+        return cls(np.concatenate(keys_list), data["shrid2"].to_numpy()[positions])
+
+    def _cells(self, rows, cols) -> np.ndarray:
+        """Offsets of lattice cells in the direct-address table."""
+        return (np.asarray(rows, dtype=np.int64) - self._origin[0]) * self._shape[1] + (cols - self._origin[1])
+
+    def _positions(self, rows, cols) -> np.ndarray:
+        """Position of each lattice cell among the distinct points; ``len(self)`` for unknown points."""
+        if self._table is None:
+            positions = self.keys.get_indexer(lattice.pack(rows, cols))
+            positions[positions < 0] = len(self.keys)
+            return positions
+        positions = np.full(len(rows), len(self.keys), dtype=np.int64)
+        inside = ((rows >= self._origin[0]) & (rows < self._origin[0] + self._shape[0])
+                  & (cols >= self._origin[1]) & (cols < self._origin[1] + self._shape[1]))
+        positions[inside] = self._table[self._cells(rows[inside], cols[inside])]
+        return positions
+
+    def lookup(self, keys):
+        """
+        Find the shrids of each point.
+
+        Parameters
+        ----------
+        keys : array-like of int64
+            Packed lattice keys, e.g. from :func:`snap_keys`.
+
+        Returns
+        -------
+        tuple (np.ndarray, np.ndarray)
+            ``(rows, shrid_ids)``: one entry per (input row, shrid) match, in
+            input order. Rows of a shared point repeat once per shrid; rows of
+            points not in the index are left out.
+        """
+        return self._expand(self._positions(*lattice.unpack(keys)))
+
+    def _expand(self, positions: np.ndarray):
+        """Expand point positions into one (row, shrid) entry per shrid of each point."""
+        # Unknown points sit at the empty slot past the last point
+        first = self.indptr[positions]
+        counts = self.indptr[positions + 1] - first
+        if counts.max(initial=0) <= 1:
+            # Most points belong to a single shrid, so there is nothing to expand
+            rows = np.flatnonzero(counts)
+            return rows, self.shrid_ids[first[rows]]
+        rows = np.repeat(np.arange(len(positions)), counts)
+        entries = np.repeat(first - (np.cumsum(counts) - counts), counts) + np.arange(len(rows))
+        return rows, self.shrid_ids[entries]
+
+    def join(self, lat, lon):
+        """Find the shrids of coordinates, see :meth:`lookup`. Rows with missing coordinates match nothing."""
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        valid = ~(np.isnan(lat) | np.isnan(lon))
+        if valid.all():
+            return self._expand(self._positions(lattice.to_index(lat), lattice.to_index(lon)))
+        rows, shrid_ids = self._expand(self._positions(lattice.to_index(lat[valid]), lattice.to_index(lon[valid])))
+        return np.flatnonzero(valid)[rows], shrid_ids
+
+
+def attach_shrids(results: pd.DataFrame, index: PointIndex, id_column: str = "shrid2") -> pd.DataFrame:
+    """
+    Attach shrid IDs to MOSAIKS results keyed only by 'Lat'/'Lon'.
+
+    Parameters
+    ----------
+    results : pd.DataFrame
+        MOSAIKS results with 'Lat' and 'Lon' columns.
+    index : PointIndex
+        Index of the generated grid points.
+    id_column : str, optional
+        Name of the inserted ID column; an existing column of that name is replaced.
+
+    Returns
+    -------
+    pd.DataFrame
+        ``results`` with ``id_column`` first and one row per (point, shrid)
+        match, so a point shared by several shrids appears once for each.
+        Points that belong to no shrid are dropped.
+    """
+    rows, shrid_ids = index.join(results["Lat"], results["Lon"])
+    joined = results.drop(columns=[id_column], errors="ignore").iloc[rows].reset_index(drop=True)
+    joined.insert(0, id_column, shrid_ids)
+    return joined
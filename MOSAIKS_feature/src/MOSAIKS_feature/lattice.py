@@ -0,0 +1,82 @@
+import numpy as np
+
+# The MOSAIKS grid: 0.01 degree cells, centers at x.xx5
+CELLS_PER_DEGREE = 100
+CELL_SIZE = 1 / CELLS_PER_DEGREE
+
+_COL_MASK = np.int64(0xFFFFFFFF)
+
+
+def cell_bounds(min_deg, max_deg):
+    """
+    Convert a min/max extent in degrees into a half-open range of lattice indices.
+
+    Cell ``k`` has its center at ``(k + 0.5) / 100``. The range covers the same
+    cells the grid generators have always used, i.e. centers from
+    ``round(min, 2) + 0.005`` to ``round(max, 2) - 0.005``, without the rounding
+    drift of stepping through floats with ``np.arange``.
+
+    Parameters
+    ----------
+    min_deg : float or array-like
+        Lower bound(s) in degrees.
+    max_deg : float or array-like
+        Upper bound(s) in degrees.
+
+    Returns
+    -------
+    tuple (np.ndarray, np.ndarray)
+        int32 ``(start, stop)`` indices; ``stop`` is exclusive.
+    """
+    start = np.rint(np.asarray(min_deg, dtype=float) * CELLS_PER_DEGREE).astype(np.int32)
+    stop = np.rint(np.asarray(max_deg, dtype=float) * CELLS_PER_DEGREE).astype(np.int32)
+    return start, stop
+
+
+def bbox_cells(row_start: int, row_stop: int, col_start: int, col_stop: int):
+    """
+    Enumerate every cell of a lattice bounding box, row by row.
+
+    Parameters
+    ----------
+    row_start, row_stop : int
+        Half-open range of latitude indices.
+    col_start, col_stop : int
+        Half-open range of longitude indices.
+
+    Returns
+    -------
+    tuple (np.ndarray, np.ndarray)
+        int32 ``(rows, cols)`` of equal length, latitude-major like
+        ``np.meshgrid(lons, lats)`` flattened.
+    """
+    n_rows = max(int(row_stop) - int(row_start), 0)
+    n_cols = max(int(col_stop) - int(col_start), 0)
+    rows = np.repeat(np.arange(row_start, row_start + n_rows, dtype=np.int32), n_cols)
+    cols = np.tile(np.arange(col_start, col_start + n_cols, dtype=np.int32), n_rows)
+    return rows, cols
+
+
+def to_degrees(index) -> np.ndarray:
+    """Return the cell-center coordinate in degrees for lattice index/indices."""
+    return (np.asarray(index, dtype=np.float64) + 0.5) / CELLS_PER_DEGREE
+
+
+def to_index(degrees) -> np.ndarray:
+    """Return the int32 index of the lattice cell containing each coordinate."""
+    return np.floor(np.asarray(degrees, dtype=np.float64) * CELLS_PER_DEGREE).astype(np.int32)
+
+
+def pack(rows, cols) -> np.ndarray:
+    """Pack ``(row, col)`` lattice indices into a single int64 key."""
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    return (rows << 32) | (cols & _COL_MASK)
+
+
+def unpack(keys):
+    """Split int64 keys produced by :func:`pack` back into int32 ``(rows, cols)``."""
+    keys = np.asarray(keys, dtype=np.int64)
+    rows = (keys >> 32).astype(np.int32)
+    cols = (keys & _COL_MASK).astype(np.uint32).view(np.int32)
+    return rows, cols
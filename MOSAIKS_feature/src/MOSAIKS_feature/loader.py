@@ -0,0 +1,267 @@
+import glob
+import importlib.util
+import os
+import warnings
+import numpy as np
+import pandas as pd
+
+# Columns identifying a shrid; read as categoricals since each repeats once per grid point
+ID_COLUMNS = ("shrid2", "shrid")
+
+# Coordinates and extents keep full precision so they map onto the lattice exactly
+FLOAT64_COLUMNS = ("Lat", "Lon", "min_lat", "max_lat", "min_lon", "max_lon", "centroid_x", "centroid_y")
+
+TEXT_COLUMNS = ("polygon_coordinates",)
+
+
+def csv_engine() -> str:
+    """Return the fastest installed pandas CSV engine: 'pyarrow' (multithreaded) if available, else 'c'."""
+    return "pyarrow" if importlib.util.find_spec("pyarrow") is not None else "c"
+
+
+def read_header(file_path: str) -> list:
+    """Return the column names of a CSV file without reading any rows."""
+    return list(pd.read_csv(file_path, nrows=0).columns)
+
+
+def result_files(file_paths) -> list:
+    """
+    Resolve CSV files, e.g. MOSAIKS results, from a file, a directory, a glob pattern or a list of these.
+
+    Directories contribute every ``*.csv`` directly inside them. The files are
+    returned sorted and without duplicates.
+
+    Raises
+    ------
+    FileNotFoundError
+        If nothing matches.
+    """
+    if isinstance(file_paths, (str, os.PathLike)):
+        file_paths = [file_paths]
+    files = set()
+    for path in map(os.fspath, file_paths):
+        if os.path.isdir(path):
+            files.update(glob.glob(os.path.join(path, "*.csv")))
+        elif os.path.isfile(path):
+            files.add(path)
+        else:
+            files.update(p for p in glob.glob(path) if os.path.isfile(p))
+    if not files:
+        raise FileNotFoundError(f"No files match {file_paths}")
+    return sorted(files)
+
+
+def is_feature_column(column: str) -> bool:
+    """Whether a column holds MOSAIKS feature values, i.e. is not an ID, coordinate, text or index column."""
+    return (column not in ID_COLUMNS and column not in FLOAT64_COLUMNS and column not in TEXT_COLUMNS
+            and not column.startswith("Unnamed:"))
+
+
+def _feature_set(columns, features=None) -> set:
+    return set(filter(is_feature_column, columns) if features is None else features)
+
+
+def column_dtypes(columns, features=None, feature_dtype=np.float32, categorical: bool = True) -> dict:
+    """
+    Build an explicit dtype map for the given columns.
+
+    Parameters
+    ----------
+    columns : iterable of str
+        Columns to be read.
+    features : iterable of str, optional
+        Feature columns; by default every column :func:`is_feature_column` accepts.
+        Pass ``()`` for tables without features, such as shrid files.
+    feature_dtype : np.dtype, optional
+        dtype of the feature columns.
+    categorical : bool, optional
+        Read ID columns as ``category``; otherwise their type is inferred.
+
+    Returns
+    -------
+    dict
+        dtype per column; columns that are neither features nor known columns
+        are left out, so pandas infers them.
+    """
+    features = _feature_set(columns, features)
+    dtypes = {}
+    for column in columns:
+        if column in features:
+            dtypes[column] = feature_dtype
+        elif column in ID_COLUMNS:
+            if categorical:
+                dtypes[column] = "category"
+        elif column in FLOAT64_COLUMNS:
+            dtypes[column] = np.float64
+        elif column in TEXT_COLUMNS:
+            dtypes[column] = object
+    return dtypes
+
+
+def _text(value: str):
+    return value if value != "" else np.nan
+
+
+def _float(value: str) -> float:
+    return float(value) if value != "" else np.nan
+
+
+def _select_columns(file_path: str, columns=None) -> list:
+    """Return the requested columns in file order, checking they exist."""
+    header = read_header(file_path)
+    if columns is None:
+        return header
+    missing = set(columns) - set(header)
+    if missing:
+        raise ValueError(f"{file_path} has no column(s) {sorted(missing)}")
+    wanted = set(columns)
+    return [column for column in header if column in wanted]
+
+
+def _c_engine_options(columns, features, feature_dtype, categorical):
+    """
+    Express the dtype map as options of the C engine.
+
+    The C engine keeps the raw parse of every column with an entry in a dtype
+    dict until the end of the file, which doubles peak memory instead of
+    halving it. So features get the single scalar ``feature_dtype`` and the few
+    other columns small converters, which take precedence over it.
+    """
+    dtypes = column_dtypes(columns, features, feature_dtype, categorical)
+    feature_set = _feature_set(columns, features)
+    if not feature_set:
+        # Without features the dtype dict only holds a few known columns and is cheap
+        return {"usecols": columns, "dtype": dtypes or None, "converters": {}}, dtypes
+    converters = {column: (_float if dtypes.get(column) is np.float64 else _text)
+                  for column in columns if column not in feature_set}
+    options = {"usecols": columns, "dtype": feature_dtype, "converters": converters}
+    return options, dtypes
+
+
+def _convert(data: pd.DataFrame, dtypes: dict, converters: dict) -> pd.DataFrame:
+    """Give the converted columns their final types."""
+    for column in converters:
+        if dtypes.get(column) == "category":
+            data[column] = data[column].astype("category")
+        elif column not in dtypes:
+            # Columns without an explicit type get the numeric type pandas would have inferred, if any
+            try:
+                data[column] = pd.to_numeric(data[column])
+            except (ValueError, TypeError):
+                pass
+    return data
+
+
+def _read_pyarrow(file_path: str, columns, features, feature_dtype) -> tuple:
+    """
+    Parse a file with features using pyarrow's multithreaded reader, into the frame the C engine builds.
+
+    Features are parsed straight to ``feature_dtype`` and float64 columns as
+    float64. Every other column is read as text with empty fields as NaN, as
+    the converters of :func:`_c_engine_options` do, and the caller then gives
+    them their types with :func:`_convert`. The C engine rounds features
+    through float64, so rarely a value may differ from it in the last bit.
+    """
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+
+    feature_set = _feature_set(columns, features)
+    types = {}
+    for column in columns:
+        if column in feature_set:
+            types[column] = pa.from_numpy_dtype(np.dtype(feature_dtype))
+        elif column in FLOAT64_COLUMNS:
+            types[column] = pa.float64()
+        else:
+            types[column] = pa.string()
+    # pandas names an empty or repeated header differently from pyarrow, so its names are passed in
+    table = pa_csv.read_csv(
+        file_path,
+        read_options=pa_csv.ReadOptions(column_names=read_header(file_path), skip_rows=1),
+        convert_options=pa_csv.ConvertOptions(include_columns=columns, column_types=types, strings_can_be_null=False),
+    )
+    data = table.to_pandas()
+    converted = [column for column in columns if types[column] == pa.string()]
+    for column in converted:
+        data[column] = data[column].mask(data[column] == "")
+    return data, converted
+
+
+def _parse(call, *args, **kwargs):
+    """Run a C engine parse, silencing the warning that the converters take precedence over the dtype."""
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="Both a converter and dtype", category=pd.errors.ParserWarning)
+        return call(*args, **kwargs)
+
+
+def load_csv(file_path: str, columns=None, features=None, feature_dtype=np.float32, categorical: bool = True,
+             nrows: int = None, engine: str = None) -> pd.DataFrame:
+    """
+    Load a MOSAIKS result or shrid CSV with an explicit schema.
+
+    The header is read once to build the dtype map of :func:`column_dtypes`:
+    features as ``feature_dtype`` (float32 by default, half the memory of the
+    float64 pandas infers), shrid IDs as categoricals, coordinates as float64,
+    and only the requested columns are parsed. Files with features are parsed
+    with the fastest installed engine (:func:`csv_engine`); both engines
+    return the same frame.
+
+    Parameters
+    ----------
+    file_path : str
+        CSV file to load.
+    columns : list of str, optional
+        Columns to read, all by default. The result keeps the file's column order.
+    features, feature_dtype, categorical : optional
+        See :func:`column_dtypes`.
+    nrows : int, optional
+        Only read the first ``nrows`` rows. pyarrow cannot stop early, so such
+        reads always use the C engine.
+    engine : str, optional
+        'pyarrow' or 'c'; :func:`csv_engine` by default. Files without
+        features, e.g. shrid files, are always parsed by the C engine.
+
+    Returns
+    -------
+    pd.DataFrame
+        The requested columns, with all features in a single ``feature_dtype`` block.
+
+    Raises
+    ------
+    ValueError
+        If a requested column is not in the file.
+    """
+    columns = _select_columns(file_path, columns)
+    engine = csv_engine() if engine is None else engine
+    if engine == "pyarrow" and nrows is None and _feature_set(columns, features):
+        data, converted = _read_pyarrow(file_path, columns, features, feature_dtype)
+        return _convert(data, column_dtypes(columns, features, feature_dtype, categorical), converted)
+
+    options, dtypes = _c_engine_options(columns, features, feature_dtype, categorical)
+    return _convert(_parse(pd.read_csv, file_path, nrows=nrows, **options), dtypes, options["converters"])
+
+
+def iter_csv(file_path: str, chunksize: int, columns=None, features=None, feature_dtype=np.float32,
+             categorical: bool = True):
+    """
+    Read a CSV chunk by chunk with the same schema as :func:`load_csv`.
+
+    Parameters
+    ----------
+    file_path : str
+        CSV file to read.
+    chunksize : int
+        Rows per chunk.
+    columns, features, feature_dtype, categorical : optional
+        See :func:`load_csv`.
+
+    Yields
+    ------
+    pd.DataFrame
+        Consecutive chunks of at most ``chunksize`` rows.
+    """
+    columns = _select_columns(file_path, columns)
+    options, dtypes = _c_engine_options(columns, features, feature_dtype, categorical)
+    with _parse(pd.read_csv, file_path, chunksize=chunksize, **options) as reader:
+        while (chunk := _parse(next, reader, None)) is not None:
+            yield _convert(chunk, dtypes, options["converters"])
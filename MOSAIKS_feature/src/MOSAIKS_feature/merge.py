@@ -0,0 +1,232 @@
+import os
+import pickle
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from .fingerprint import row_fingerprints
+from .loader import iter_csv, read_header
+
+# Default memory budget of a merge, shared by all workers
+MEMORY_BYTES = 512 * 1024 * 1024
+
+# Rough ratio of the in-memory size of a parsed CSV to its size on disk
+EXPANSION = 4
+
+# Row numbers carried through the partitions to restore pd.merge's row order
+LEFT_ROW = "__left_row"
+RIGHT_ROW = "__right_row"
+
+
+def _row_bytes(file_path: str, sample_bytes: int = 1 << 16) -> float:
+    """Estimate the bytes per row of a CSV file from its first lines."""
+    with open(file_path, "rb") as f:
+        f.readline()
+        sample = f.read(sample_bytes)
+    lines = sample.count(b"\n")
+    return len(sample) / lines if lines else max(len(sample), 1)
+
+
+def plan_partitions(file_paths, memory_bytes: int = MEMORY_BYTES, workers: int = 1):
+    """
+    Choose the number of partitions and the rows read per chunk for a merge.
+
+    The partitions are sized so that the pairs joined at once by all workers
+    fit in ``memory_bytes`` together, assuming a parsed table takes about
+    ``EXPANSION`` times its size on disk.
+
+    Returns
+    -------
+    tuple (int, int)
+        ``(n_partitions, chunk_rows)``.
+    """
+    total = sum(os.path.getsize(path) for path in file_paths) * EXPANSION
+    per_worker = max(memory_bytes // max(workers, 1), 1)
+    n_partitions = max(1, int(np.ceil(total / per_worker)))
+    row_bytes = max(_row_bytes(path) for path in file_paths) * EXPANSION
+    chunk_rows = max(1000, int(per_worker // (2 * row_bytes)))
+    return n_partitions, chunk_rows
+
+
+def partition_file(file_path: str, on_columns: list, n_partitions: int, chunk_rows: int, paths: list,
+                   row_column: str):
+    """
+    Split a CSV into on-disk partitions by the hash of its join key.
+
+    Rows are numbered in ``row_column`` and appended, chunk by chunk, to the
+    pickle stream of their partition in ``paths``. Keys are hashed by
+    :func:`fingerprint.row_fingerprints`, so a key that pandas infers as int in
+    one chunk and as float in another lands in the same partition.
+    """
+    files = [open(path, "ab") for path in paths]
+    try:
+        first_row = 0
+        reader = iter_csv(file_path, chunk_rows, features=(), categorical=False)
+        for chunk in reader:
+            chunk[row_column] = np.arange(first_row, first_row + len(chunk))
+            first_row += len(chunk)
+            parts = (row_fingerprints(chunk[on_columns]) % np.uint64(n_partitions)).astype(np.int64)
+            order = np.argsort(parts, kind="stable")
+            bounds = np.searchsorted(parts[order], np.arange(n_partitions + 1))
+            for i in np.flatnonzero(np.diff(bounds)):
+                pickle.dump(chunk.iloc[order[bounds[i]:bounds[i + 1]]], files[i], protocol=pickle.HIGHEST_PROTOCOL)
+    finally:
+        for f in files:
+            f.close()
+
+
+def _read_frames(path: str):
+    """Yield the frames of a pickle stream written by :func:`partition_file`."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+def _read_partition(path: str, columns: list) -> pd.DataFrame:
+    frames = list(_read_frames(path))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+
+def join_partition(left_path: str, right_path: str, on_columns: list, left_columns: list, right_columns: list,
+                   output_path: str, chunk_rows: int):
+    """
+    Inner-join one pair of partitions and write the result, ordered by left row and then right row.
+
+    The result is written in frames of ``chunk_rows`` rows; :func:`partitioned_merge`
+    passes its chunk size divided by the number of partitions, so one frame of
+    every partition together fits the memory budget of a chunk.
+
+    Returns
+    -------
+    int
+        Number of rows written.
+    """
+    left = _read_partition(left_path, left_columns)
+    right = _read_partition(right_path, right_columns)
+    if len(left) == 0 or len(right) == 0:
+        return 0
+    joined = pd.merge(left, right, on=on_columns, how="inner")
+    joined = joined.sort_values([LEFT_ROW, RIGHT_ROW], kind="stable")
+    with open(output_path, "wb") as f:
+        for start in range(0, len(joined), chunk_rows):
+            pickle.dump(joined.iloc[start:start + chunk_rows], f, protocol=pickle.HIGHEST_PROTOCOL)
+    return len(joined)
+
+
+def _write_in_left_order(result_paths: list, output_file: str, columns: list):
+    """
+    Stream the joined partitions into ``output_file`` in the order of the left rows.
+
+    Every left row lives in exactly one partition and each partition is sorted
+    by left row, so a k-way merge holds one frame per partition: all buffered
+    rows whose left row is below the last left row of every buffer are
+    complete and written out, and the emptied buffers are refilled. If there
+    are none, the buffer with the smallest last left row holds only that one
+    left row, which no other partition has, and it is written out alone.
+    """
+    readers = [_read_frames(path) for path in result_paths]
+    buffers = [next(reader, None) for reader in readers]
+    pd.DataFrame(columns=columns).to_csv(output_file, index=False)
+    while any(buffer is not None for buffer in buffers):
+        live = [i for i, buffer in enumerate(buffers) if buffer is not None]
+        last_rows = [int(buffers[i][LEFT_ROW].iloc[-1]) for i in live]
+        block_end = min(last_rows)
+        pieces = []
+        for i in live:
+            split = int(np.searchsorted(buffers[i][LEFT_ROW].to_numpy(), block_end))
+            if split > 0:
+                pieces.append(buffers[i].iloc[:split])
+                buffers[i] = buffers[i].iloc[split:]
+        if not pieces:
+            i = live[last_rows.index(block_end)]
+            pieces.append(buffers[i])
+            buffers[i] = buffers[i].iloc[:0]
+        for i in live:
+            if len(buffers[i]) == 0:
+                buffers[i] = next(readers[i], None)
+        block = pd.concat(pieces).sort_values([LEFT_ROW, RIGHT_ROW], kind="stable")
+        block[columns].to_csv(output_file, mode="a", header=False, index=False)
+
+
+def partitioned_merge(file_a: str, file_b: str, on_columns, output_file: str, memory_bytes: int = MEMORY_BYTES,
+                      workers: int = 1, n_partitions: int = None, tmp_dir: str = None) -> int:
+    """
+    Inner-join two CSV files larger than memory, like ``pd.merge(a, b, on=on_columns, how='inner')``.
+
+    Both files are streamed in chunks and split into on-disk partitions by the
+    hash of the join key, so matching rows always share a partition. The
+    partition pairs are then joined one at a time, in parallel with
+    ``workers > 1``, and streamed to ``output_file``. Rows come out in the
+    order pd.merge gives them, by row of ``file_a`` and then of ``file_b``,
+    with the same columns and suffixes.
+
+    Parameters
+    ----------
+    file_a, file_b : str
+        Left and right CSV files.
+    on_columns : str or list of str
+        Join key columns, present in both files.
+    output_file : str
+        CSV file to write.
+    memory_bytes : int, optional
+        Approximate memory budget of all workers together; it sets the number
+        of partitions and the rows read per chunk.
+    workers : int, optional
+        Number of partition pairs joined at once; None uses every CPU.
+    n_partitions : int, optional
+        Number of partitions, instead of deriving it from ``memory_bytes``.
+    tmp_dir : str, optional
+        Directory for the partitions; a temporary directory by default.
+
+    Returns
+    -------
+    int
+        Number of rows written.
+
+    Raises
+    ------
+    ValueError
+        If a join column is missing from either file.
+    """
+    on_columns = [on_columns] if isinstance(on_columns, str) else list(on_columns)
+    left_columns = read_header(file_a)
+    right_columns = read_header(file_b)
+    for path, header in ((file_a, left_columns), (file_b, right_columns)):
+        missing = set(on_columns) - set(header)
+        if missing:
+            raise ValueError(f"{path} has no join column(s) {sorted(missing)}")
+    columns = list(pd.merge(pd.DataFrame(columns=left_columns), pd.DataFrame(columns=right_columns),
+                            on=on_columns, how="inner").columns)
+
+    workers = os.cpu_count() if workers is None else max(1, int(workers))
+    planned, chunk_rows = plan_partitions([file_a, file_b], memory_bytes, workers)
+    n_partitions = planned if n_partitions is None else max(1, int(n_partitions))
+
+    work_dir = tempfile.mkdtemp(prefix="merge-", dir=tmp_dir)
+    try:
+        left_paths = [os.path.join(work_dir, f"left_{i}.pkl") for i in range(n_partitions)]
+        right_paths = [os.path.join(work_dir, f"right_{i}.pkl") for i in range(n_partitions)]
+        result_paths = [os.path.join(work_dir, f"joined_{i}.pkl") for i in range(n_partitions)]
+        partition_file(file_a, on_columns, n_partitions, chunk_rows, left_paths, LEFT_ROW)
+        partition_file(file_b, on_columns, n_partitions, chunk_rows, right_paths, RIGHT_ROW)
+
+        # The final merge holds one result frame of every partition at once
+        frame_rows = max(1, chunk_rows // n_partitions)
+        args = [left_paths, right_paths, [on_columns] * n_partitions, [left_columns + [LEFT_ROW]] * n_partitions,
+                [right_columns + [RIGHT_ROW]] * n_partitions, result_paths, [frame_rows] * n_partitions]
+        if workers == 1 or n_partitions == 1:
+            rows = sum(map(join_partition, *args))
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, n_partitions)) as executor:
+                rows = sum(executor.map(join_partition, *args))
+
+        _write_in_left_order(result_paths, output_file, columns)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return rows
@@ -1,12 +1,19 @@
-import pandas as pd
+from .fingerprint import CHUNK_ROWS, HLL_PRECISION, FingerprintCounts, HyperLogLog, iter_fingerprints
+from .loader import load_csv
+from .merge import MEMORY_BYTES, partitioned_merge
+from .sampling import CHUNK_ROWS as SAMPLE_CHUNK_ROWS, sample_csv
 
 class DuplicateCheck:
     @staticmethod
-    def check_duplicates(file_path, subset_columns):
+    def check_duplicates(file_path, subset_columns, chunksize=CHUNK_ROWS):
+        # file_path can be a file, a directory or a glob such as 'file_coordinates_*.csv', so duplicates
+        # across files are found too; only subset_columns are read, chunk by chunk, and every row is
+        # reduced to a 64-bit fingerprint, so memory grows with the distinct rows, not the file size
         try:
-            data = pd.read_csv(file_path)
-            duplicates = data.duplicated(subset=subset_columns, keep=False)
-            num_duplicates = duplicates.sum()
+            counts = FingerprintCounts()
+            for fingerprints in iter_fingerprints(file_path, subset_columns, chunksize):
+                counts.add(fingerprints)
+            num_duplicates = counts.duplicates()
             print(f"Total number of duplicate rows based on {subset_columns}: {num_duplicates}")
             return num_duplicates
         except Exception as e:
@@ -14,13 +21,13 @@ class DuplicateCheck:
 
 class Merge:
     @staticmethod
-    def merge_files(file_a, file_b, on_columns, output_file):
+    def merge_files(file_a, file_b, on_columns, output_file, memory_bytes=MEMORY_BYTES, workers=1):
+        # Same result as pd.merge(how='inner'), but both files are split into on-disk partitions by
+        # join-key hash and joined partition by partition, so memory stays within memory_bytes
         try:
-            df_a = pd.read_csv(file_a)
-            df_b = pd.read_csv(file_b)
-            merged_df = pd.merge(df_a, df_b, on=on_columns, how='inner')
-            merged_df.to_csv(output_file, index=False)
-            print(f"Successfully merged and saved to {output_file}")
+            rows = partitioned_merge(file_a, file_b, on_columns, output_file, memory_bytes=memory_bytes,
+                                     workers=workers)
+            print(f"Successfully merged {rows} rows and saved to {output_file}")
         except Exception as e:
             print(f"Error merging files: {e}")
 
@@ -28,19 +35,37 @@ class Subset:
     @staticmethod
     def fetch_and_save_first_n_rows(input_csv_file_path, output_csv_file_path, n=100):
         try:
-            df = pd.read_csv(input_csv_file_path, nrows=n)
+            df = load_csv(input_csv_file_path, features=(), categorical=False, nrows=n)
             df.to_csv(output_csv_file_path, index=False)
             print(f"First {n} rows saved to {output_csv_file_path}")
         except Exception as e:
             print(f"Error saving first {n} rows: {e}")
 
+    @staticmethod
+    def fetch_and_save_sample(input_csv_file_path, output_csv_file_path, n=100, mode="uniform", seed=None,
+                              strata="shrid2", chunksize=SAMPLE_CHUNK_ROWS):
+        # The first n rows all come from one corner of the country; these modes read the file once
+        # and keep only the sample in memory: mode="uniform" takes n random rows, mode="stratified"
+        # n random rows of every strata value ('shrid2', or 'state' for the shrid state prefix), and
+        # mode="shrids" every grid point of n random shrids. The same seed gives the same sample
+        try:
+            df = sample_csv(input_csv_file_path, n, mode=mode, seed=seed, strata=strata, chunksize=chunksize)
+            df.to_csv(output_csv_file_path, index=False)
+            print(f"{mode.capitalize()} sample of {len(df)} rows saved to {output_csv_file_path}")
+        except Exception as e:
+            print(f"Error saving {mode} sample: {e}")
+
 class Unique:
     @staticmethod
-    def count_distinct_rows(file_path, subset_columns):
+    def count_distinct_rows(file_path, subset_columns, approximate=False, precision=HLL_PRECISION,
+                            chunksize=CHUNK_ROWS):
+        # Streams file_path (a file, directory or glob) like DuplicateCheck; approximate=True estimates
+        # the count with HyperLogLog in constant memory (2**precision bytes, about 0.8% error by default)
         try:
-            data = pd.read_csv(file_path)
-            distinct_rows = data.drop_duplicates(subset=subset_columns)
-            num_distinct = len(distinct_rows)
+            counter = HyperLogLog(precision) if approximate else FingerprintCounts()
+            for fingerprints in iter_fingerprints(file_path, subset_columns, chunksize):
+                counter.add(fingerprints)
+            num_distinct = counter.count() if approximate else counter.distinct()
             print(f"Total number of distinct rows based on {subset_columns}: {num_distinct}")
             return num_distinct
         except Exception as e:
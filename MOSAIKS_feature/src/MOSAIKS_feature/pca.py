@@ -0,0 +1,211 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+from scipy.linalg import eigh
+from scipy.sparse.linalg import eigsh
+from .aggregate import CHUNK_BYTES, chunk_rows
+from .fileio import write_array, write_json
+from .loader import is_feature_column, iter_csv, read_header, result_files
+
+# Bump when the saved arrays or the manifest change so old models are rejected
+MODEL_VERSION = 1
+
+# Above this many features a few components are found by Lanczos iteration instead of a full eigendecomposition
+LANCZOS_FEATURES = 500
+
+
+class StreamingPCA:
+    """
+    Principal components of MOSAIKS features fitted chunk by chunk.
+
+    Each chunk is centred on its own mean and its scatter matrix is computed
+    in float32, then merged into a running float64 mean and scatter with the
+    pairwise update of Chan et al. (1979). The data is read once and never
+    held in memory: memory is one chunk plus a features x features float64
+    matrix (128 MB for 4,000 features). The components are the top
+    eigenvectors of the scatter matrix, so the fit equals
+    ``sklearn.decomposition.PCA`` on all rows at once, with the same sign
+    convention (the largest loading of every component is positive).
+
+    A fitted model is saved with :meth:`save` as ``.npy`` arrays and a
+    ``manifest.json`` in one directory and reloaded with :meth:`load`, so
+    later runs project their rows without refitting.
+    """
+
+    MANIFEST = "manifest.json"
+
+    def __init__(self, n_components: int = 1, features: list = None):
+        """
+        Create an unfitted model.
+
+        Parameters
+        ----------
+        n_components : int, optional
+            Number of components kept.
+        features : list of str, optional
+            Feature columns, in the order of the fitted arrays; taken from the
+            first chunk of :meth:`partial_fit_frame` if not given.
+        """
+        self.n_components = n_components
+        self.features = None if features is None else list(features)
+        self.n_samples = 0
+        self.mean = None
+        self.scatter = None
+        self.components = None
+        self.explained_variance = None
+
+    def partial_fit(self, X):
+        """
+        Add a chunk of rows to the running mean and scatter matrix.
+
+        Missing values count as 0, as in :func:`aggregate.stream_group_means`.
+        """
+        X = np.nan_to_num(np.asarray(X, dtype=np.float32), copy=False)
+        n = len(X)
+        if n == 0:
+            return self
+        mean = X.mean(axis=0, dtype=np.float64)
+        centered = X - mean.astype(np.float32)
+        scatter = (centered.T @ centered).astype(np.float64)
+        if self.scatter is None:
+            self.mean, self.scatter = mean, scatter
+        else:
+            total = self.n_samples + n
+            delta = mean - self.mean
+            self.scatter += scatter
+            self.scatter += np.outer(delta, delta) * (self.n_samples * n / total)
+            self.mean += delta * (n / total)
+        self.n_samples += n
+        self.components = None
+        return self
+
+    def partial_fit_frame(self, data: pd.DataFrame):
+        """Add the feature columns of a chunk of a MOSAIKS frame, see :meth:`partial_fit`."""
+        if self.features is None:
+            self.features = [col for col in data.columns if is_feature_column(col)]
+        return self.partial_fit(data[self.features].to_numpy(dtype=np.float32))
+
+    def fit_files(self, file_paths, features: list = None, chunk_bytes: int = CHUNK_BYTES):
+        """
+        Fit the model on CSV files of features, reading them in chunks.
+
+        Parameters
+        ----------
+        file_paths : str or list of str
+            Files, directories or glob patterns, see :func:`loader.result_files`.
+        features : list of str, optional
+            Feature columns; by default every column of the first file that
+            :func:`loader.is_feature_column` accepts.
+        chunk_bytes : int, optional
+            Approximate size of one chunk of float64 features.
+
+        Returns
+        -------
+        StreamingPCA
+            The fitted model.
+        """
+        files = result_files(file_paths)
+        if features is not None:
+            self.features = list(features)
+        elif self.features is None:
+            self.features = [col for col in read_header(files[0]) if is_feature_column(col)]
+        rows = chunk_rows(len(self.features), chunk_bytes)
+        for file_path in files:
+            for chunk in iter_csv(file_path, rows, columns=self.features, features=self.features):
+                self.partial_fit_frame(chunk)
+        self._solve()
+        return self
+
+    def _solve(self):
+        """Compute the components from the scatter matrix."""
+        if self.n_samples < 2:
+            raise ValueError("PCA needs at least two rows")
+        n_features = len(self.mean)
+        k = min(self.n_components, n_features)
+        if n_features > LANCZOS_FEATURES and 2 * k < n_features:
+            # A fixed start vector keeps the fit deterministic
+            values, vectors = eigsh(self.scatter, k=k, which="LA", v0=np.ones(n_features))
+            order = np.argsort(values)
+            values, vectors = values[order], vectors[:, order]
+        else:
+            values, vectors = eigh(self.scatter, subset_by_index=[n_features - k, n_features - 1])
+        values, vectors = values[::-1], vectors[:, ::-1].T
+        signs = np.sign(vectors[np.arange(k), np.argmax(np.abs(vectors), axis=1)])
+        self.components = vectors * signs[:, None]
+        self.explained_variance = np.maximum(values, 0) / (self.n_samples - 1)
+
+    def transform(self, X) -> np.ndarray:
+        """
+        Project rows onto the components.
+
+        Returns
+        -------
+        np.ndarray
+            Array of shape (n_rows, n_components).
+        """
+        if self.components is None:
+            self._solve()
+        X = np.nan_to_num(np.asarray(X, dtype=np.float64))
+        return (X - self.mean) @ self.components.T
+
+    def save(self, model_dir: str):
+        """Save the fitted model to ``model_dir``, replacing any model there."""
+        if self.components is None:
+            self._solve()
+        os.makedirs(model_dir, exist_ok=True)
+        for name in ("mean", "components", "explained_variance"):
+            write_array(os.path.join(model_dir, f"{name}.npy"), getattr(self, name))
+        manifest = {
+            "version": MODEL_VERSION,
+            "n_components": self.n_components,
+            "n_samples": self.n_samples,
+            "features": self.features,
+        }
+        write_json(os.path.join(model_dir, self.MANIFEST), manifest)
+
+    @classmethod
+    def load(cls, model_dir: str) -> "StreamingPCA":
+        """
+        Load a model saved with :meth:`save`.
+
+        Raises
+        ------
+        ValueError
+            If the model was saved by another version.
+        """
+        with open(os.path.join(model_dir, cls.MANIFEST)) as f:
+            manifest = json.load(f)
+        if manifest.get("version") != MODEL_VERSION:
+            raise ValueError(f"Model in {model_dir} has version {manifest.get('version')}, not {MODEL_VERSION}")
+        model = cls(manifest["n_components"], manifest["features"])
+        model.n_samples = manifest["n_samples"]
+        for name in ("mean", "components", "explained_variance"):
+            setattr(model, name, np.load(os.path.join(model_dir, f"{name}.npy")))
+        return model
+
+
+def fit_pca(file_paths, model_dir: str, n_components: int = 1, features: list = None,
+            chunk_bytes: int = CHUNK_BYTES) -> StreamingPCA:
+    """
+    Fit a :class:`StreamingPCA` on CSV files of features and save it to ``model_dir``.
+
+    Parameters
+    ----------
+    file_paths : str or list of str
+        MOSAIKS result or averaged feature CSV(s), see :func:`loader.result_files`.
+    model_dir : str
+        Directory the model is saved to.
+    n_components : int, optional
+        Number of components kept.
+    features, chunk_bytes : optional
+        See :meth:`StreamingPCA.fit_files`.
+
+    Returns
+    -------
+    StreamingPCA
+        The fitted model.
+    """
+    model = StreamingPCA(n_components).fit_files(file_paths, features, chunk_bytes)
+    model.save(model_dir)
+    return model
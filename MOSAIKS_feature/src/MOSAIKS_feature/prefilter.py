@@ -0,0 +1,178 @@
+import hashlib
+import os
+import numpy as np
+import shapely
+from shapely.geometry import Polygon
+from . import lattice
+from .containment import contains_points
+from .fileio import write_array
+from .geometry import polygons_from_arrays
+
+# Bump when the cached layout or construction changes so stale caches are ignored
+PREFILTER_VERSION = 1
+
+# Simplification tolerance in degrees; the exact-test band is a few times this wide
+SIMPLIFY_TOLERANCE = 0.002
+
+# Polygons with fewer vertices than this are cheap enough to test directly
+MIN_VERTICES = 64
+
+
+def simplified_bounds(polygons, tolerance: float = SIMPLIFY_TOLERANCE, min_vertices: int = MIN_VERTICES):
+    """
+    Derive a conservative inner and outer polygon with few vertices for each polygon.
+
+    The polygon is simplified by ``tolerance`` first, so the buffering works on
+    few vertices; the outer polygon is that simplification grown by
+    ``2 * tolerance`` and the inner one the same simplification shrunk by
+    ``2 * tolerance``. Both are checked exactly (outer covers the polygon, the
+    polygon covers inner) and dropped when the check fails, so using them never
+    changes a containment result.
+
+    Parameters
+    ----------
+    polygons : array-like of shapely.geometry.Polygon
+        Polygons to simplify.
+    tolerance : float, optional
+        Simplification tolerance in degrees.
+    min_vertices : int, optional
+        Polygons with fewer vertices get no inner/outer polygon.
+
+    Returns
+    -------
+    tuple (np.ndarray, np.ndarray)
+        Object arrays ``(inner, outer)`` aligned with ``polygons``; entries are
+        None where no usable simplification exists.
+    """
+    polygons = np.asarray(polygons, dtype=object)
+    inner = np.full(len(polygons), None, dtype=object)
+    outer = np.full(len(polygons), None, dtype=object)
+
+    complex_idx = np.flatnonzero(shapely.get_num_coordinates(polygons) >= min_vertices)
+    if len(complex_idx) == 0:
+        return inner, outer
+    selected = polygons[complex_idx]
+
+    coarse = shapely.simplify(selected, tolerance)
+    grown = shapely.simplify(shapely.buffer(coarse, 2 * tolerance, quad_segs=2), tolerance / 2)
+    shrunk = shapely.simplify(shapely.buffer(coarse, -2 * tolerance, quad_segs=2), tolerance / 2)
+
+    outer_ok = shapely.covers(grown, selected)
+    inner_ok = ~shapely.is_empty(shrunk) & shapely.covers(selected, shrunk)
+    outer[complex_idx[outer_ok]] = grown[outer_ok]
+    inner[complex_idx[inner_ok]] = shrunk[inner_ok]
+    return inner, outer
+
+
+def prefiltered_contains(polygon: Polygon, inner, outer, lons, lats) -> np.ndarray:
+    """
+    Test points against a polygon, resolving most of them with its inner/outer polygons.
+
+    Points outside ``outer`` are rejected and points inside ``inner`` are
+    accepted without touching the full polygon; only the band between the two
+    gets the exact test. The result equals :func:`containment.contains_points`.
+
+    Parameters
+    ----------
+    polygon : shapely.geometry.Polygon
+        Full-resolution polygon.
+    inner, outer : shapely geometry or None
+        Simplified polygons from :func:`simplified_bounds`.
+    lons, lats : array-like
+        Coordinates of the candidate points.
+
+    Returns
+    -------
+    np.ndarray
+        Boolean mask, True where the point lies strictly inside ``polygon``.
+    """
+    lons = np.asarray(lons, dtype=float)
+    lats = np.asarray(lats, dtype=float)
+    result = np.zeros(len(lons), dtype=bool)
+    undecided = np.ones(len(lons), dtype=bool)
+
+    if outer is not None:
+        undecided = contains_points(outer, lons, lats)
+    if inner is not None:
+        accepted = np.zeros(len(lons), dtype=bool)
+        accepted[undecided] = contains_points(inner, lons[undecided], lats[undecided])
+        result[accepted] = True
+        undecided &= ~accepted
+
+    result[undecided] = contains_points(polygon, lons[undecided], lats[undecided])
+    return result
+
+
+def prefiltered_cells(polygon: Polygon, inner, outer, row_start: int, row_stop: int, col_start: int, col_stop: int):
+    """
+    Return the lattice cells of a bounding box whose centers lie strictly inside a polygon.
+
+    Same result as :func:`grid.cells_inside_polygon`, using :func:`prefiltered_contains`.
+    """
+    rows, cols = lattice.bbox_cells(row_start, row_stop, col_start, col_stop)
+    inside = prefiltered_contains(polygon, inner, outer, lattice.to_degrees(cols), lattice.to_degrees(rows))
+    return rows[inside], cols[inside]
+
+
+def _cache_key(coords, offsets, tolerance: float, min_vertices: int) -> str:
+    """Hash the polygon arrays and the simplification parameters into a cache key."""
+    digest = hashlib.sha256(f"prefilter-v{PREFILTER_VERSION}:{tolerance!r}:{min_vertices}:".encode())
+    digest.update(np.ascontiguousarray(coords, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(offsets, dtype=np.int64).tobytes())
+    return digest.hexdigest()[:32]
+
+
+def load_simplified_bounds(coords, offsets, cache_dir: str = None,
+                           tolerance: float = SIMPLIFY_TOLERANCE, min_vertices: int = MIN_VERTICES):
+    """
+    Load or build the inner/outer polygons for flat polygon arrays.
+
+    The result is stored as WKB in ``cache_dir`` under a key derived from the
+    polygon coordinates themselves, so any stage working on the same polygons
+    (grid generation, heatmaps) reuses it across runs.
+
+    Parameters
+    ----------
+    coords, offsets : np.ndarray
+        Polygon arrays from :func:`geometry.load_polygon_arrays`.
+    cache_dir : str, optional
+        Directory to cache the result in; nothing is cached if None.
+    tolerance : float, optional
+        See :func:`simplified_bounds`.
+    min_vertices : int, optional
+        See :func:`simplified_bounds`.
+
+    Returns
+    -------
+    tuple (np.ndarray, np.ndarray)
+        ``(inner, outer)`` as returned by :func:`simplified_bounds`.
+    """
+    if cache_dir is not None:
+        key = _cache_key(coords, offsets, tolerance, min_vertices)
+        data_path = os.path.join(cache_dir, f"{key}.prefilter.npy")
+        offsets_path = os.path.join(cache_dir, f"{key}.prefilter_offsets.npy")
+        if os.path.exists(data_path) and os.path.exists(offsets_path):
+            blob = np.load(data_path, mmap_mode="r")
+            wkb_offsets = np.load(offsets_path)
+            wkbs = [bytes(blob[start:stop]) if stop > start else None
+                    for start, stop in zip(wkb_offsets[:-1], wkb_offsets[1:])]
+            geometries = np.full(len(wkbs), None, dtype=object)
+            present = np.array([w is not None for w in wkbs], dtype=bool)
+            if present.any():
+                geometries[present] = shapely.from_wkb(np.array(wkbs, dtype=object)[present])
+            return geometries[0::2], geometries[1::2]
+
+    inner, outer = simplified_bounds(polygons_from_arrays(coords, offsets), tolerance, min_vertices)
+
+    if cache_dir is not None:
+        # Interleave inner/outer so entry 2i is polygon i's inner and 2i + 1 its outer
+        interleaved = np.empty(2 * len(inner), dtype=object)
+        interleaved[0::2], interleaved[1::2] = inner, outer
+        wkbs = [b"" if g is None else shapely.to_wkb(g) for g in interleaved]
+        wkb_offsets = np.zeros(len(wkbs) + 1, dtype=np.int64)
+        np.cumsum([len(w) for w in wkbs], out=wkb_offsets[1:])
+        os.makedirs(cache_dir, exist_ok=True)
+        write_array(data_path, np.frombuffer(b"".join(wkbs), dtype=np.uint8))
+        write_array(offsets_path, wkb_offsets)
+
+    return inner, outer
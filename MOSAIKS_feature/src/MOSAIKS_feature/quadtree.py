@@ -0,0 +1,148 @@
+import numpy as np
+import shapely
+from shapely.geometry import Polygon
+from . import lattice
+from .containment import contains_points
+
+# Blocks with at most this many cells are tested cell by cell instead of subdivided
+LEAF_CELLS = 16
+
+# Bounding boxes with at most this many cells are tested cell by cell outright;
+# below this size the per-level overhead costs more than the tests it saves
+MIN_QUADTREE_CELLS = 1024
+
+
+def _block_geometries(blocks: np.ndarray) -> np.ndarray:
+    """
+    Build the geometry spanned by the cell centers of each block.
+
+    A block of several rows and columns is the box through its corner centers;
+    a block one cell wide or tall degenerates to a line (or a point).
+    """
+    row_start, row_stop, col_start, col_stop = blocks.T
+    x_min = lattice.to_degrees(col_start)
+    x_max = lattice.to_degrees(col_stop - 1)
+    y_min = lattice.to_degrees(row_start)
+    y_max = lattice.to_degrees(row_stop - 1)
+
+    geometries = np.empty(len(blocks), dtype=object)
+    area = (x_max > x_min) & (y_max > y_min)
+    geometries[area] = shapely.box(x_min[area], y_min[area], x_max[area], y_max[area])
+    flat = ~area
+    if flat.any():
+        ends = np.stack([np.c_[x_min[flat], y_min[flat]], np.c_[x_max[flat], y_max[flat]]], axis=1)
+        geometries[flat] = shapely.linestrings(ends)
+    return geometries
+
+
+def _block_cells(blocks: np.ndarray):
+    """Return the int32 ``(rows, cols)`` of every cell of every block, block by block."""
+    row_start, row_stop, col_start, col_stop = blocks.T
+    widths = col_stop - col_start
+    counts = (row_stop - row_start) * widths
+    owner = np.repeat(np.arange(len(blocks)), counts)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    rows = row_start[owner] + local // widths[owner]
+    cols = col_start[owner] + local % widths[owner]
+    return rows.astype(np.int32), cols.astype(np.int32)
+
+
+def _split_blocks(blocks: np.ndarray) -> np.ndarray:
+    """Split every block into (up to) four quadrants; a single row or column is only halved."""
+    row_start, row_stop, col_start, col_stop = blocks.T
+    row_mid = (row_start + row_stop + 1) // 2
+    col_mid = (col_start + col_stop + 1) // 2
+    quadrants = np.concatenate([
+        np.c_[row_start, row_mid, col_start, col_mid],
+        np.c_[row_start, row_mid, col_mid, col_stop],
+        np.c_[row_mid, row_stop, col_start, col_mid],
+        np.c_[row_mid, row_stop, col_mid, col_stop],
+    ])
+    return quadrants[(quadrants[:, 1] > quadrants[:, 0]) & (quadrants[:, 3] > quadrants[:, 2])]
+
+
+def quadtree_blocks(polygon: Polygon, row_start: int, row_stop: int, col_start: int, col_stop: int,
+                    leaf_cells: int = LEAF_CELLS, min_cells: int = MIN_QUADTREE_CELLS):
+    """
+    Classify the lattice cells of a bounding box by recursive quadtree subdivision.
+
+    The bounding box is split level by level into lattice-aligned blocks. A block
+    whose cell centers all lie strictly inside the polygon is kept whole, a block
+    disjoint from the polygon is dropped, and only blocks crossing the boundary
+    are split further. Blocks with at most ``leaf_cells`` cells, and bounding
+    boxes with at most ``min_cells`` cells, are tested cell by cell with
+    :func:`containment.contains_points`.
+
+    Parameters
+    ----------
+    polygon : shapely.geometry.Polygon
+        Polygon to test against.
+    row_start, row_stop : int
+        Half-open range of latitude indices to consider.
+    col_start, col_stop : int
+        Half-open range of longitude indices to consider.
+    leaf_cells : int, optional
+        Largest block that is tested cell by cell.
+    min_cells : int, optional
+        Largest bounding box that is tested cell by cell without subdividing.
+
+    Returns
+    -------
+    tuple (np.ndarray, np.ndarray, np.ndarray, int)
+        ``(inside_blocks, rows, cols, n_tests)``: the int64 ``(n, 4)`` blocks
+        entirely inside the polygon, the int32 rows/cols of the contained cells of
+        leaf blocks, and the number of containment tests performed (block tests
+        plus cell tests).
+    """
+    inside_blocks = []
+    leaf_blocks = []
+    n_tests = 0
+    shapely.prepare(polygon)
+
+    frontier = np.array([[row_start, row_stop, col_start, col_stop]], dtype=np.int64)
+    frontier = frontier[(frontier[:, 1] > frontier[:, 0]) & (frontier[:, 3] > frontier[:, 2])]
+    threshold = max(leaf_cells, min_cells)
+    while len(frontier) > 0:
+        sizes = (frontier[:, 1] - frontier[:, 0]) * (frontier[:, 3] - frontier[:, 2])
+        leaf = sizes <= threshold
+        threshold = leaf_cells
+        leaf_blocks.append(frontier[leaf])
+        blocks = frontier[~leaf]
+        if len(blocks) == 0:
+            break
+
+        geometries = _block_geometries(blocks)
+        inside = shapely.contains_properly(polygon, geometries)
+        outside = shapely.disjoint(polygon, geometries)
+        n_tests += len(blocks)
+        inside_blocks.append(blocks[inside])
+        frontier = _split_blocks(blocks[~inside & ~outside])
+
+    inside_blocks = np.concatenate(inside_blocks) if inside_blocks else np.empty((0, 4), dtype=np.int64)
+    leaf_blocks = np.concatenate(leaf_blocks) if leaf_blocks else np.empty((0, 4), dtype=np.int64)
+
+    rows, cols = _block_cells(leaf_blocks)
+    n_tests += len(rows)
+    keep = contains_points(polygon, lattice.to_degrees(cols), lattice.to_degrees(rows))
+    return inside_blocks, rows[keep], cols[keep], n_tests
+
+
+def quadtree_cells(polygon: Polygon, row_start: int, row_stop: int, col_start: int, col_stop: int):
+    """
+    Return the lattice cells of a bounding box whose centers lie strictly inside a polygon.
+
+    Same result as :func:`grid.cells_inside_polygon`, computed with
+    :func:`quadtree_blocks` so that the interior of large polygons is emitted
+    block by block without testing each cell.
+
+    Returns
+    -------
+    tuple (np.ndarray, np.ndarray)
+        int32 ``(rows, cols)`` of the contained cells, latitude-major.
+    """
+    inside_blocks, rows, cols, _ = quadtree_blocks(polygon, row_start, row_stop, col_start, col_stop)
+    block_rows, block_cols = _block_cells(inside_blocks)
+    rows = np.concatenate([rows, block_rows])
+    cols = np.concatenate([cols, block_cols])
+    order = np.lexsort((cols, rows))
+    return rows[order], cols[order]
@@ -0,0 +1,113 @@
+import numpy as np
+from shapely.geometry import Polygon
+from . import lattice
+from .containment import contains_points
+
+# Cell centers closer than this (in degrees) to an edge are re-checked exactly,
+# which keeps the strict-boundary behaviour of polygon.contains
+BOUNDARY_TOLERANCE = 1e-9
+
+
+def _polygon_edges(polygon: Polygon):
+    """Return the ``(x0, y0, x1, y1)`` arrays of every edge of every ring of a polygon."""
+    x0, y0, x1, y1 = [], [], [], []
+    for ring in [polygon.exterior, *polygon.interiors]:
+        coords = np.asarray(ring.coords, dtype=np.float64)
+        x0.append(coords[:-1, 0])
+        y0.append(coords[:-1, 1])
+        x1.append(coords[1:, 0])
+        y1.append(coords[1:, 1])
+    return np.concatenate(x0), np.concatenate(y0), np.concatenate(x1), np.concatenate(y1)
+
+
+def _expand_ranges(starts, stops):
+    """Concatenate ``arange(start, stop)`` for every pair; return the values and their range index."""
+    counts = np.maximum(stops - starts, 0)
+    owner = np.repeat(np.arange(len(starts)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return starts[owner] + offsets, owner
+
+
+def scanline_cells(polygon: Polygon, row_start: int, row_stop: int, col_start: int, col_stop: int):
+    """
+    Rasterize a polygon onto the lattice by walking its edges once per row.
+
+    Every edge is intersected with the rows it spans (half-open in latitude, so
+    vertices are counted once), the crossings of each row are sorted, and the
+    cells whose centers fall strictly between consecutive pairs of crossings are
+    emitted as runs. The cost is O(edges x rows spanned + output) instead of
+    O(cells x vertices), which matters for long, thin, diagonal polygons whose
+    bounding box is mostly empty.
+
+    Cells within ``BOUNDARY_TOLERANCE`` of an edge are re-tested with the exact
+    predicate, so the result is identical to testing every cell center with
+    ``polygon.contains``.
+
+    Parameters
+    ----------
+    polygon : shapely.geometry.Polygon
+        Polygon to rasterize.
+    row_start, row_stop : int
+        Half-open range of latitude indices to consider.
+    col_start, col_stop : int
+        Half-open range of longitude indices to consider.
+
+    Returns
+    -------
+    tuple (np.ndarray, np.ndarray)
+        int32 ``(rows, cols)`` of the contained cells, latitude-major.
+    """
+    empty = np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+    if row_stop <= row_start or col_stop <= col_start or polygon.is_empty:
+        return empty
+
+    x0, y0, x1, y1 = _polygon_edges(polygon)
+    ys = lattice.to_degrees(np.arange(row_start, row_stop))
+    y_low = np.minimum(y0, y1)
+    y_high = np.maximum(y0, y1)
+    scale = lattice.CELLS_PER_DEGREE
+
+    # Crossings: edge e crosses row r when y_low <= y < y_high (horizontal edges never count)
+    row_pos, edge = _expand_ranges(np.searchsorted(ys, y_low, "left"), np.searchsorted(ys, y_high, "left"))
+    y = ys[row_pos]
+    x = x0[edge] + (y - y0[edge]) * (x1[edge] - x0[edge]) / (y1[edge] - y0[edge])
+
+    # Pair up the sorted crossings of each row; every row has an even number of them
+    order = np.lexsort((x, row_pos))
+    row_pos, x = row_pos[order], x[order]
+    run_rows, left, right = row_pos[0::2], x[0::2], x[1::2]
+
+    # Cells whose centers lie strictly between the two crossings of a run
+    first_col = np.maximum(np.floor(left * scale - 0.5).astype(np.int64) + 1, col_start)
+    last_col = np.minimum(np.ceil(right * scale - 0.5).astype(np.int64) - 1, col_stop - 1)
+    cols, run = _expand_ranges(first_col, last_col + 1)
+    inside_keys = lattice.pack(run_rows[run] + row_start, cols)
+
+    # Cells close to any edge: the x-extent of each edge within a thin band around the row
+    band_pos, band_edge = _expand_ranges(
+        np.searchsorted(ys, y_low - BOUNDARY_TOLERANCE, "left"),
+        np.searchsorted(ys, y_high + BOUNDARY_TOLERANCE, "right"),
+    )
+    by = ys[band_pos]
+    bx0, by0, bx1, by1 = x0[band_edge], y0[band_edge], x1[band_edge], y1[band_edge]
+    dy = by1 - by0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t_a = np.where(dy == 0, 0.0, np.clip((by - BOUNDARY_TOLERANCE - by0) / dy, 0.0, 1.0))
+        t_b = np.where(dy == 0, 1.0, np.clip((by + BOUNDARY_TOLERANCE - by0) / dy, 0.0, 1.0))
+    xa = bx0 + t_a * (bx1 - bx0)
+    xb = bx0 + t_b * (bx1 - bx0)
+    near_first = np.maximum(np.ceil((np.minimum(xa, xb) - BOUNDARY_TOLERANCE) * scale - 0.5).astype(np.int64), col_start)
+    near_last = np.minimum(np.floor((np.maximum(xa, xb) + BOUNDARY_TOLERANCE) * scale - 0.5).astype(np.int64), col_stop - 1)
+    near_cols, near = _expand_ranges(near_first, near_last + 1)
+    near_keys = np.unique(lattice.pack(band_pos[near] + row_start, near_cols))
+
+    # Re-test the cells near the boundary exactly and merge them with the certain interior
+    near_rows, near_cols = lattice.unpack(near_keys)
+    exact = contains_points(polygon, lattice.to_degrees(near_cols), lattice.to_degrees(near_rows))
+    keys = np.union1d(np.setdiff1d(inside_keys, near_keys, assume_unique=False), near_keys[exact])
+    if len(keys) == 0:
+        return empty
+
+    rows, cols = lattice.unpack(keys)
+    order = np.lexsort((cols, rows))
+    return rows[order], cols[order]
@@ -0,0 +1,163 @@
+import functools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import folium
+from folium.plugins import HeatMap
+
+# Ways of writing the heatmap pages of :func:`write_heatmaps`
+HEATMAP_BACKENDS = ("template", "folium")
+
+# Pages handed to a worker at a time
+PAGES_PER_TASK = 32
+
+# Placeholder values rendered into the template page and then cut out of it
+_CENTER = [-11.0123456789, -22.0123456789]
+_RING = [[-33.0123456789, -44.0123456789], [-55.0123456789, -66.0123456789], [-33.0123456789, -44.0123456789]]
+_POINTS = [[-77.0123456789, -88.0123456789, -99.0123456789]]
+
+
+def folium_heatmap(center, ring, points, zoom_start: int = 15) -> folium.Map:
+    """
+    Build the folium map of one shrid: its polygon outline over a heatmap of its points.
+
+    Parameters
+    ----------
+    center : sequence of float
+        ``(lat, lon)`` the map is centred on.
+    ring : array-like
+        ``(lat, lon)`` vertices of the polygon outline.
+    points : array-like
+        ``(lat, lon, weight)`` rows of the heatmap.
+    zoom_start : int, optional
+        Initial zoom level.
+    """
+    m = folium.Map(location=list(center), zoom_start=zoom_start)
+    folium.Polygon(
+        locations=[tuple(p) for p in np.asarray(ring).tolist()],
+        color='blue', weight=2, fill=True, fill_opacity=0.2
+    ).add_to(m)
+    HeatMap(np.asarray(points).tolist()).add_to(m)
+    return m
+
+
+def _compact_json(values) -> str:
+    return json.dumps(np.asarray(values, dtype=float).tolist(), separators=(",", ":"))
+
+
+class HeatmapTemplate:
+    """
+    Heatmap page rendered once by folium and refilled with the data of every shrid.
+
+    The page of :func:`folium_heatmap` is rendered with placeholder values
+    and cut at them, so a page is written by joining the fixed parts with the
+    map centre, the polygon outline and the heatmap points as compact JSON
+    arrays, without building folium's element tree. The pages are the ones
+    folium writes, except for the element IDs, which folium draws at random.
+    """
+
+    def __init__(self, zoom_start: int = 15):
+        """
+        Render the template page.
+
+        Raises
+        ------
+        RuntimeError
+            If a placeholder is not found exactly once in the page, e.g. after
+            a folium upgrade changed its layout; use the 'folium' backend then.
+        """
+        self.zoom_start = zoom_start
+        rest = folium_heatmap(_CENTER, _RING, _POINTS, zoom_start).get_root().render()
+        self.parts = []
+        for value in (_CENTER, _RING, _POINTS):
+            placeholder = json.dumps(value)
+            if rest.count(placeholder) != 1:
+                raise RuntimeError(f"Placeholder {placeholder} not found once in the folium page; "
+                                   f"use backend='folium'")
+            head, rest = rest.split(placeholder)
+            self.parts.append(head)
+        self.parts.append(rest)
+
+    def render(self, center, ring, points) -> str:
+        """
+        Return the HTML page of one shrid; arguments as in :func:`folium_heatmap`.
+
+        Raises
+        ------
+        ValueError
+            If ``points`` contains NaN, as folium's HeatMap does.
+        """
+        points = np.asarray(points, dtype=float)
+        if np.isnan(points).any():
+            raise ValueError("data may not contain NaNs.")
+        values = [_compact_json(center), _compact_json(ring), _compact_json(points)]
+        return "".join(part + value for part, value in zip(self.parts, values + [""]))
+
+
+@functools.lru_cache(maxsize=None)
+def heatmap_template(zoom_start: int = 15) -> HeatmapTemplate:
+    """Return the :class:`HeatmapTemplate` of a zoom level, rendered once per process."""
+    return HeatmapTemplate(zoom_start)
+
+
+_worker_template = None
+
+
+def _set_worker_template(template: HeatmapTemplate):
+    global _worker_template
+    _worker_template = template
+
+
+def _write_page(page):
+    html_file, center, ring, points = page
+    html = _worker_template.render(center, ring, points)
+    with open(html_file, "wb") as f:
+        f.write(html.encode("utf8"))
+    return html_file
+
+
+def write_heatmaps(pages, zoom_start: int = 15, backend: str = "template", workers: int = 1) -> int:
+    """
+    Write heatmap pages, one HTML file per shrid.
+
+    Parameters
+    ----------
+    pages : iterable of tuple
+        ``(html_file, center, ring, points)`` of every page; see
+        :func:`folium_heatmap` for the last three.
+    zoom_start : int, optional
+        Initial zoom level of the maps.
+    backend : str, optional
+        One of ``HEATMAP_BACKENDS``: 'template' fills a :class:`HeatmapTemplate`,
+        'folium' builds and saves every map with folium.
+    workers : int, optional
+        Processes writing 'template' pages at once; None uses every CPU.
+
+    Returns
+    -------
+    int
+        Number of pages written.
+
+    Raises
+    ------
+    ValueError
+        If ``backend`` is unknown.
+    """
+    if backend not in HEATMAP_BACKENDS:
+        raise ValueError(f"Unknown heatmap backend {backend!r}; choose from {HEATMAP_BACKENDS}")
+    if backend == "folium":
+        written = 0
+        for html_file, center, ring, points in pages:
+            folium_heatmap(center, ring, points, zoom_start).save(html_file)
+            written += 1
+        return written
+
+    template = heatmap_template(zoom_start)
+    workers = os.cpu_count() if workers is None else max(1, int(workers))
+    if workers == 1:
+        _set_worker_template(template)
+        return sum(1 for _ in map(_write_page, pages))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_set_worker_template,
+                             initargs=(template,)) as executor:
+        return sum(1 for _ in executor.map(_write_page, pages, chunksize=PAGES_PER_TASK))
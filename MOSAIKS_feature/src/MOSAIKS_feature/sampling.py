@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+from .loader import iter_csv, read_header
+
+# Rows read per chunk while sampling
+CHUNK_ROWS = 200000
+
+# Sampling modes of :func:`sample_csv`
+SAMPLING_MODES = ("uniform", "stratified", "shrids")
+
+# Position of each row in the file, carried along to write the sample in file order
+_ROW = "__row"
+
+
+def state_prefix(shrid_ids) -> np.ndarray:
+    """Return the state part of SHRUG shrid IDs, e.g. '11-24' for '11-24-476-03961-529712'."""
+    return pd.Series(np.asarray(shrid_ids, dtype=str)).str.split("-", n=2).str[:2].str.join("-").to_numpy()
+
+
+def _strata(chunk: pd.DataFrame, strata: str, id_column: str) -> np.ndarray:
+    if strata == "state":
+        return state_prefix(chunk[id_column])
+    return chunk[strata].astype(str).to_numpy()
+
+
+def _shrid_keys(shrid_ids, hash_key: str) -> np.ndarray:
+    """Pseudo-random key of each shrid; the same shrid gets the same key in every chunk."""
+    return pd.util.hash_array(np.asarray(shrid_ids, dtype=str).astype(object), hash_key=hash_key)
+
+
+def _bottom_k(keys: np.ndarray, groups, k: int) -> np.ndarray:
+    """Return the positions of the ``k`` smallest keys of every group (of all keys if ``groups`` is None)."""
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if groups is None:
+        return np.arange(len(keys)) if len(keys) <= k else np.argpartition(keys, k - 1)[:k]
+    codes = pd.factorize(groups)[0]
+    order = np.lexsort((keys, codes))
+    rank = np.arange(len(order)) - np.searchsorted(codes[order], codes[order], side="left")
+    return order[rank < k]
+
+
+def sample_csv(file_path: str, n: int, mode: str = "uniform", seed: int = None, strata: str = "shrid2",
+               id_column: str = "shrid2", chunksize: int = CHUNK_ROWS) -> pd.DataFrame:
+    """
+    Sample the rows of a CSV file in one streaming pass.
+
+    Every row gets a random key, and the sample is the rows with the smallest
+    keys (bottom-k sampling, equivalent to reservoir sampling): the running
+    sample is updated chunk by chunk, so the file is read once and memory is
+    bounded by the sample plus one chunk.
+
+    Parameters
+    ----------
+    file_path : str
+        CSV file to sample.
+    n : int
+        'uniform': rows in the sample. 'stratified': rows per stratum (all
+        rows of smaller strata). 'shrids': number of shrids kept.
+    mode : str, optional
+        One of ``SAMPLING_MODES``:
+        'uniform' samples ``n`` rows uniformly without replacement;
+        'stratified' samples ``n`` rows uniformly from each stratum;
+        'shrids' keeps every row (e.g. every grid point) of ``n`` shrids
+        chosen uniformly at random.
+    seed : int, optional
+        Seed of the random keys; the same seed gives the same sample,
+        whatever the ``chunksize``.
+    strata : str, optional
+        Column defining the strata of 'stratified' mode, or 'state' for the
+        state prefix of ``id_column`` (see :func:`state_prefix`).
+    id_column : str, optional
+        Shrid ID column, used by 'shrids' mode and ``strata='state'``.
+    chunksize : int, optional
+        Rows read per chunk.
+
+    Returns
+    -------
+    pd.DataFrame
+        The sampled rows, in file order.
+
+    Raises
+    ------
+    ValueError
+        If ``mode`` is unknown.
+    """
+    if mode not in SAMPLING_MODES:
+        raise ValueError(f"Unknown sampling mode {mode!r}; choose from {SAMPLING_MODES}")
+    rng = np.random.default_rng(seed)
+    # The 16-character key of the shrid hash is drawn from the seeded generator too
+    hash_key = "".join(rng.choice(list("0123456789abcdef"), 16))
+    sample = None
+    keys = None
+    groups = None
+    first_row = 0
+    for chunk in iter_csv(file_path, chunksize, features=(), categorical=False):
+        chunk[_ROW] = np.arange(first_row, first_row + len(chunk))
+        first_row += len(chunk)
+        if mode == "shrids":
+            chunk_keys = _shrid_keys(chunk[id_column], hash_key)
+        else:
+            chunk_keys = rng.random(len(chunk))
+        sample = chunk if sample is None else pd.concat([sample, chunk], ignore_index=True)
+        keys = chunk_keys if keys is None else np.concatenate([keys, chunk_keys])
+
+        if mode == "shrids":
+            # Keep the rows of the n shrids with the smallest keys seen so far
+            distinct = np.unique(keys)
+            if len(distinct) <= n:
+                continue
+            keep = np.flatnonzero(keys <= distinct[n - 1]) if n > 0 else np.empty(0, dtype=np.int64)
+        else:
+            if mode == "stratified":
+                chunk_groups = _strata(chunk, strata, id_column)
+                groups = chunk_groups if groups is None else np.concatenate([groups, chunk_groups])
+            keep = _bottom_k(keys, groups, n)
+            groups = groups[keep] if groups is not None else None
+        sample, keys = sample.iloc[keep], keys[keep]
+
+    if sample is None:
+        return pd.DataFrame(columns=read_header(file_path))
+    return sample.sort_values(_ROW).drop(columns=_ROW).reset_index(drop=True)
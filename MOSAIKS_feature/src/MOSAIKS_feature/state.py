@@ -0,0 +1,228 @@
+import glob
+import hashlib
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+from .aggregate import CHUNK_BYTES, GroupMeans, GroupStats, accumulate_files, feature_columns, result_files
+from .fileio import write_array, write_json
+from .join import PointIndex
+
+# Bump when the saved arrays or the manifest change so old states are rejected
+STATE_VERSION = 2
+
+# Bytes read at a time when hashing a result file
+HASH_BLOCK = 1 << 20
+
+
+def file_digest(file_path: str) -> str:
+    """Return the sha256 of a file's contents, so a file is recognised however it is named."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while block := f.read(HASH_BLOCK):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class AggregationState:
+    """
+    Per-shrid sums and counts (or statistics) persisted on disk and updated file by file.
+
+    The running :class:`aggregate.GroupMeans` or :class:`aggregate.GroupStats`
+    is saved in ``state_dir`` as one ``.npy`` file per array plus the shrid
+    IDs, and ``manifest.json`` records the settings, the feature columns and
+    the content hash of every result file ingested so far. :meth:`ingest` reads only files
+    whose hash is not in the manifest, so new MOSAIKS batches update the means
+    without rereading earlier ones, and ingesting a file again is a no-op.
+
+    Every save writes a new generation of arrays and then replaces the
+    manifest, which names the current generation, in one atomic step; a
+    crashed update leaves the previous state intact.
+    """
+
+    MANIFEST = "manifest.json"
+
+    def __init__(self, state_dir: str, id_column: str = "shrid2", exclude=("Lat", "Lon"), statistics: bool = False):
+        """
+        Open the state in ``state_dir``, or prepare an empty one.
+
+        Parameters
+        ----------
+        state_dir : str
+            Directory holding the state.
+        id_column, exclude : optional
+            See :func:`aggregate.stream_group_means`.
+        statistics : bool, optional
+            Keep a :class:`aggregate.GroupStats` (count, mean, variance, min,
+            max) instead of sums and counts only.
+
+        Raises
+        ------
+        ValueError
+            If the saved state was written by another version or with other settings.
+        """
+        self.state_dir = state_dir
+        self.id_column = id_column
+        self.exclude = tuple(exclude)
+        self.groups_class = GroupStats if statistics else GroupMeans
+        self.features = None
+        self.joined = None
+        self.files = {}
+        self.groups = None
+        self.generation = 0
+
+        manifest_path = os.path.join(state_dir, self.MANIFEST)
+        if not os.path.exists(manifest_path):
+            return
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        expected = {"version": STATE_VERSION, "id_column": id_column, "exclude": list(self.exclude),
+                    "groups": self.groups_class.__name__}
+        found = {key: manifest.get(key) for key in expected}
+        if found != expected:
+            raise ValueError(f"State in {state_dir} was saved with {found}, not {expected}")
+        self.features = manifest["features"]
+        self.joined = manifest["joined"]
+        self.files = manifest["files"]
+        self.generation = manifest["generation"]
+        self.groups = self._load_groups()
+
+    def _path(self, generation: int, name: str) -> str:
+        return os.path.join(self.state_dir, f"{generation}.{name}.npy")
+
+    def _load_groups(self) -> GroupMeans:
+        ids = np.load(self._path(self.generation, "ids"))
+        groups = self.groups_class(len(self.features), capacity=0)
+        groups.ids = pd.Index(ids)
+        for name in groups._fields:
+            setattr(groups, name, np.load(self._path(self.generation, name)))
+        return groups
+
+    def _save(self):
+        os.makedirs(self.state_dir, exist_ok=True)
+        generation = self.generation + 1
+        n = len(self.groups.ids)
+        ids = np.asarray(self.groups.ids)
+        if ids.dtype == object:
+            # Store string IDs as fixed-width unicode so no pickling is needed to read them back
+            ids = ids.astype(str)
+        write_array(self._path(generation, "ids"), ids)
+        for name in self.groups._fields:
+            write_array(self._path(generation, name), getattr(self.groups, name)[:n])
+
+        manifest = {
+            "version": STATE_VERSION,
+            "id_column": self.id_column,
+            "exclude": list(self.exclude),
+            "joined": self.joined,
+            "groups": self.groups_class.__name__,
+            "generation": generation,
+            "features": self.features,
+            "files": self.files,
+        }
+        write_json(os.path.join(self.state_dir, self.MANIFEST), manifest)
+
+        self.generation = generation
+        for old in glob.glob(os.path.join(self.state_dir, "*.npy")):
+            if not os.path.basename(old).startswith(f"{generation}."):
+                os.remove(old)
+
+    def pending(self, file_paths) -> dict:
+        """
+        Return the result files not ingested yet, by content hash.
+
+        Files with the same contents as an ingested file, or as an earlier
+        file of ``file_paths``, are skipped. An ingested path whose size and
+        modification time still match the manifest is skipped without
+        reading it, so only new or changed files are hashed.
+
+        Raises
+        ------
+        ValueError
+            If an ingested file has changed since: its old rows are already in
+            the sums and cannot be taken out again.
+        """
+        return {digest: path for digest, (path, _) in self._pending(file_paths).items()}
+
+    def _pending(self, file_paths) -> dict:
+        """:meth:`pending` with the ``os.stat`` of every file taken before it was hashed."""
+        ingested = {entry["path"]: entry for entry in self.files.values()}
+        pending = {}
+        for path in result_files(file_paths):
+            stat = os.stat(path)
+            entry = ingested.get(os.path.abspath(path))
+            if entry is not None and entry["size"] == stat.st_size and entry.get("mtime") == stat.st_mtime_ns:
+                continue
+            digest = file_digest(path)
+            if digest in self.files or digest in pending:
+                continue
+            if entry is not None:
+                raise ValueError(f"{path} has changed since it was ingested into {self.state_dir}")
+            pending[digest] = (path, stat)
+        return pending
+
+    def ingest(self, file_paths, chunk_bytes: int = CHUNK_BYTES, workers: int = 1, index: PointIndex = None) -> list:
+        """
+        Add new result files to the state and save it.
+
+        Parameters
+        ----------
+        file_paths : str or list of str
+            MOSAIKS result CSV(s), see :func:`aggregate.result_files`. Files
+            already ingested are skipped.
+        chunk_bytes, workers, index : optional
+            See :func:`aggregate.stream_group_means`. Either every batch of a
+            state is joined to the shrids through an ``index`` or none is.
+
+        Returns
+        -------
+        list of str
+            The files ingested by this call.
+
+        Raises
+        ------
+        ValueError
+            If a new file does not have the feature columns of the state, or
+            ``index`` is given for a state built without one or vice versa.
+        """
+        joined = index is not None
+        if self.joined is not None and joined != self.joined:
+            raise ValueError(f"State in {self.state_dir} was built {'with' if self.joined else 'without'} "
+                             f"a point index; ingest every batch the same way")
+        pending = self._pending(file_paths)
+        if not pending:
+            return []
+        files = [path for path, _ in pending.values()]
+        features = self.features
+        if features is None:
+            features = feature_columns(files[0], self.id_column, self.exclude)
+        # Accumulate the batch on its own so a failing file leaves the state untouched
+        batch = self.groups_class(len(features))
+        accumulate_files(batch, files, features, self.id_column, self.exclude, chunk_bytes, workers, index)
+        self.features = features
+        self.joined = joined
+        if self.groups is None:
+            self.groups = batch
+        else:
+            self.groups.merge(batch)
+        ingested_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+        for digest, (path, stat) in pending.items():
+            self.files[digest] = {"path": os.path.abspath(path), "size": stat.st_size, "mtime": stat.st_mtime_ns,
+                                  "ingested": ingested_at}
+        self._save()
+        return files
+
+    def means(self) -> pd.DataFrame:
+        """Return the mean of every feature per shrid over all ingested files, as :func:`aggregate.stream_group_means`."""
+        if self.groups is None:
+            raise ValueError(f"No result files have been ingested into {self.state_dir}")
+        return self.groups.means(self.features, self.id_column)
+
+    def statistics(self, statistics=GroupStats.STATISTICS, ddof: int = 1) -> pd.DataFrame:
+        """Return the per-shrid statistics over all ingested files, see :meth:`aggregate.GroupStats.statistics`."""
+        if self.groups is None:
+            raise ValueError(f"No result files have been ingested into {self.state_dir}")
+        if not isinstance(self.groups, GroupStats):
+            raise ValueError("Statistics need a state opened with statistics=True")
+        return self.groups.statistics(self.features, self.id_column, statistics, ddof)
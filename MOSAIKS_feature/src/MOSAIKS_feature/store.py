@@ -0,0 +1,178 @@
+import glob
+import hashlib
+import os
+import time
+import numpy as np
+import pandas as pd
+from .fileio import write_array
+
+# Bump when the hashed content or the segment layout changes so old stores are ignored
+STORE_VERSION = 1
+
+# Bytes of the sha256 digest kept per shrid
+HASH_BYTES = 16
+
+
+def shrid_hashes(bounds: np.ndarray, extents: np.ndarray, coords=None, offsets=None) -> np.ndarray:
+    """
+    Hash everything the grid cells of each shrid depend on.
+
+    Parameters
+    ----------
+    bounds : np.ndarray
+        ``(n, 4)`` lattice bounds ``row_start, row_stop, col_start, col_stop``.
+    extents : np.ndarray
+        ``(n, 4)`` float ``min_lat, max_lat, min_lon, max_lon``.
+    coords, offsets : np.ndarray, optional
+        Polygon arrays; None when cells are not filtered by polygon.
+
+    Returns
+    -------
+    np.ndarray
+        ``S16`` array with one content hash per shrid.
+    """
+    bounds = np.ascontiguousarray(bounds, dtype=np.int64)
+    extents = np.ascontiguousarray(extents, dtype=np.float64)
+    mode = b"polygon" if coords is not None else b"extent"
+    if coords is not None:
+        coords = np.ascontiguousarray(coords, dtype=np.float64)
+        offsets = np.asarray(offsets)
+
+    hashes = np.empty(len(bounds), dtype=f"S{HASH_BYTES}")
+    for i in range(len(bounds)):
+        digest = hashlib.sha256(b"v%d:%s:" % (STORE_VERSION, mode))
+        digest.update(bounds[i].tobytes())
+        digest.update(extents[i].tobytes())
+        if coords is not None:
+            digest.update(coords[offsets[i]:offsets[i + 1]].tobytes())
+        hashes[i] = digest.digest()[:HASH_BYTES]
+    return hashes
+
+
+class GridStore:
+    """
+    Persistent per-shrid store of generated grid cells, keyed by content hash.
+
+    Cells are appended in segments, one per completed work unit. Each segment is
+    three ``.npy`` files: the packed cells, the cell count per shrid and the
+    shrid hashes. The hashes file is written last, so a segment only counts as
+    complete once all of its data is on disk; a crashed run simply resumes
+    from the segments it finished. Since cells are keyed by the content of a
+    shrid rather than by its ID, a rerun recomputes only new or changed
+    polygons.
+    """
+
+    def __init__(self, store_dir: str):
+        """Open (or create) the store in ``store_dir`` and index its complete segments."""
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+        self.index = {}
+        self._cells = {}
+        self._written = 0
+        for hashes_path in sorted(glob.glob(os.path.join(store_dir, "*.hashes.npy"))):
+            segment = os.path.basename(hashes_path)[:-len(".hashes.npy")]
+            counts = np.load(os.path.join(store_dir, f"{segment}.counts.npy"))
+            starts = np.cumsum(counts) - counts
+            for shrid_hash, start, count in zip(np.load(hashes_path), starts, counts):
+                self.index[bytes(shrid_hash)] = (segment, int(start), int(count))
+
+    def missing(self, hashes: np.ndarray) -> np.ndarray:
+        """Return the positions of the first occurrence of every hash not yet in the store."""
+        _, first = np.unique(hashes, return_index=True)
+        first = np.sort(first)
+        stored = np.fromiter((bytes(h) in self.index for h in hashes[first]), dtype=bool, count=len(first))
+        return first[~stored]
+
+    def write_segment(self, hashes: np.ndarray, counts: np.ndarray, keys: np.ndarray):
+        """
+        Append the cells of completed shrids as a new segment.
+
+        Parameters
+        ----------
+        hashes : np.ndarray
+            Content hash of each shrid.
+        counts : np.ndarray
+            Number of cells of each shrid, possibly 0.
+        keys : np.ndarray
+            Packed lattice cells (:func:`lattice.pack`) of all shrids, shrid by shrid.
+        """
+        if len(hashes) == 0:
+            return
+        segment = f"{time.time_ns()}-{os.getpid()}-{self._written}"
+        self._written += 1
+        path = os.path.join(self.store_dir, segment)
+        counts = np.asarray(counts, dtype=np.int64)
+        write_array(f"{path}.cells.npy", np.asarray(keys, dtype=np.int64))
+        write_array(f"{path}.counts.npy", counts)
+        write_array(f"{path}.hashes.npy", np.asarray(hashes, dtype=f"S{HASH_BYTES}"))
+
+        starts = np.cumsum(counts) - counts
+        for shrid_hash, start, count in zip(hashes, starts, counts):
+            self.index[bytes(shrid_hash)] = (segment, int(start), int(count))
+
+    def cell_counts(self, hashes: np.ndarray) -> np.ndarray:
+        """Return the number of stored cells of each shrid."""
+        return np.fromiter((self.index[bytes(h)][2] for h in hashes), dtype=np.int64, count=len(hashes))
+
+    def _segment_cells(self, segment: str) -> np.ndarray:
+        if segment not in self._cells:
+            self._cells[segment] = np.load(os.path.join(self.store_dir, f"{segment}.cells.npy"), mmap_mode="r")
+        return self._cells[segment]
+
+    def read(self, hashes: np.ndarray):
+        """
+        Read the stored cells of a sequence of shrids.
+
+        Returns
+        -------
+        tuple (np.ndarray, np.ndarray)
+            The cell count of each shrid and their packed cells, shrid by shrid.
+
+        Raises
+        ------
+        KeyError
+            If a hash is not in the store.
+        """
+        entries = [self.index[bytes(h)] for h in hashes]
+        counts = np.array([count for _, _, count in entries], dtype=np.int64)
+        keys = np.empty(counts.sum(), dtype=np.int64)
+        position = 0
+        for segment, start, count in entries:
+            keys[position:position + count] = self._segment_cells(segment)[start:start + count]
+            position += count
+        return counts, keys
+
+    def write_manifest(self, shrid_ids, hashes: np.ndarray):
+        """Write ``manifest.csv`` listing the hash and cell count of every shrid of the last run."""
+        manifest = pd.DataFrame({
+            "shrid2": np.asarray(shrid_ids),
+            "hash": [bytes(h).hex() for h in hashes],
+            "cells": self.cell_counts(hashes),
+        })
+        path = os.path.join(self.store_dir, "manifest.csv")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        manifest.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+    def prune(self, hashes: np.ndarray):
+        """
+        Delete segments that hold none of ``hashes``, e.g. those of since-changed polygons.
+
+        Incomplete segments, whose cells or counts were written by a run that
+        crashed before writing their hashes, or left behind by an interrupted
+        prune, are deleted as well.
+        """
+        live = {self.index[bytes(h)][0] for h in hashes if bytes(h) in self.index}
+        segments = set()
+        for suffix in ("hashes", "counts", "cells"):
+            for path in glob.glob(os.path.join(self.store_dir, f"*.{suffix}.npy")):
+                segments.add(os.path.basename(path)[:-len(f".{suffix}.npy")])
+        for segment in segments - live:
+            # Remove the hashes first so a partially deleted segment is never indexed
+            for suffix in ("hashes", "counts", "cells"):
+                try:
+                    os.remove(os.path.join(self.store_dir, f"{segment}.{suffix}.npy"))
+                except FileNotFoundError:
+                    pass
+            self._cells.pop(segment, None)
+        self.index = {h: entry for h, entry in self.index.items() if entry[0] in live}
@@ -1,12 +1,18 @@
+import numpy as np
 import pandas as pd
+from ..aggregate import GroupStats, stream_group_means, stream_group_stats
+from ..state import AggregationState
 
 class aggregateFeatures:
-    def __init__(self, file_path, output_file):
+    def __init__(self, file_path, output_file, workers=1, state_dir=None):
         self.file_path = file_path
         self.output_file = output_file
+        self.workers = workers
+        self.state_dir = state_dir
         self.df = None
         self.feature_columns = []
         self.average_features_df = None
+        self.statistics_df = None
 
     def load_data(self):
         """Load the dataset."""
@@ -27,6 +33,31 @@ class aggregateFeatures:
         if self.df is not None and self.feature_columns:
             self.average_features_df = self.df.groupby('shrid2')[self.feature_columns].mean().reset_index()
 
+    def calculate_statistics(self):
+        """Calculate the count, mean, variance, min and max of each feature column per 'shrid2' in one pass."""
+        if self.df is not None and self.feature_columns:
+            groups = GroupStats(len(self.feature_columns))
+            groups.add(self.df['shrid2'], self.df[self.feature_columns].to_numpy(dtype=np.float64))
+            self.statistics_df = groups.statistics(self.feature_columns)
+
+    def stream_statistics(self):
+        """Calculate the per-shrid statistics chunk by chunk, without loading the whole file(s)."""
+        self.statistics_df = stream_group_stats(self.file_path, id_column='shrid2', exclude=('Lat', 'Lon'),
+                                                workers=self.workers)
+
+    def stream_averages(self):
+        """Calculate the per-shrid averages chunk by chunk, without loading the whole file(s)."""
+        self.average_features_df = stream_group_means(self.file_path, id_column='shrid2', exclude=('Lat', 'Lon'),
+                                                      workers=self.workers)
+        self.feature_columns = list(self.average_features_df.columns[1:])
+
+    def update_averages(self):
+        """Add only the result files not ingested yet to the per-shrid sums saved in state_dir, then average."""
+        state = AggregationState(self.state_dir)
+        state.ingest(self.file_path, workers=self.workers)
+        self.average_features_df = state.means()
+        self.feature_columns = list(self.average_features_df.columns[1:])
+
     def save_results(self):
         """Save the averaged features to a file."""
         if self.average_features_df is not None:
@@ -34,9 +65,10 @@ class aggregateFeatures:
             print(f"Averaged features saved to {self.output_file}")
 
     def process(self):
-        """Run the full process."""
-        self.load_data()
-        self.fill_missing_values()
-        self.identify_feature_columns()
-        self.calculate_averages()
+        """Run the full process, streaming the input so memory does not grow with the number of rows.
+        With a state_dir, files processed by earlier runs are not read again."""
+        if self.state_dir is not None:
+            self.update_averages()
+        else:
+            self.stream_averages()
         self.save_results()
\ No newline at end of file
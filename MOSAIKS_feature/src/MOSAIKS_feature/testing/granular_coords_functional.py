@@ -1,20 +1,30 @@
 import pandas as pd
-import numpy as np
-from shapely.geometry import Polygon, Point
+from .. import lattice
+from .. import grid
+from ..geometry import load_polygon_arrays, parse_polygon
+from ..loader import load_csv
 
 class PolygonGridGenerator:
-    def __init__(self, csv_file):
-        """Initialize the class with a CSV file."""
+    def __init__(self, csv_file, workers=1, geometry_cache=None, method="prepared", store_dir=None):
+        """Initialize the class with a CSV file, the number of worker processes (None for all cores),
+        the optional polygon sidecar directory, the containment method and
+        an optional grid store directory that makes reruns recompute only new or changed polygons."""
         self.csv_file = csv_file
-        self.data = pd.read_csv(csv_file)
+        self.workers = workers
+        self.geometry_cache = geometry_cache
+        self.method = method
+        self.store_dir = store_dir
+        self.data = load_csv(csv_file, features=(), categorical=False)
         self.result_df = None
 
     @staticmethod
     def create_polygon(coordinates):
         """Convert a string representation of coordinates to a Shapely Polygon."""
-        coordinates = eval(coordinates)
-        polygon_coords = [(float(x), float(y)) for x, y in coordinates]
-        return Polygon(polygon_coords)
+        return parse_polygon(coordinates)
+
+    def load_polygons(self):
+        """Load the parsed polygon coordinates, through the binary sidecar cache if one is set."""
+        return load_polygon_arrays(self.csv_file, cache_dir=self.geometry_cache)
 
     def preprocess_coordinates(self):
         """Round and adjust the coordinates in the DataFrame."""
@@ -24,114 +34,52 @@ class PolygonGridGenerator:
         self.data["max_lon_round"] = self.data["max_lon"].round(2) - 0.005
 
     def generate_grid(self):
-        """Generate a grid of valid coordinates for each polygon."""
-        lons_list = []
-        lats_list = []
-        shrid_id_list = []
-        id_count_list = []
-
-        for i, row in self.data.iterrows():
-            polygon = self.create_polygon(row["polygon_coordinates"])
-
-            # Generate coordinate ranges
-            x_range = np.arange(row["min_lon_round"], row["max_lon_round"] + 0.01, 0.01)
-            y_range = np.arange(row["min_lat_round"], row["max_lat_round"] + 0.01, 0.01)
-            x_grid, y_grid = np.meshgrid(x_range, y_range)
-
-            lons = x_grid.flatten()
-            lats = y_grid.flatten()
-
-            # Validate coordinates using the point-in-polygon test
-            valid_lons = []
-            valid_lats = []
-            for lon, lat in zip(lons, lats):
-                point = Point(lon, lat)
-                if polygon.contains(point):
-                    valid_lons.append(lon)
-                    valid_lats.append(lat)
+        """Generate the lattice cells whose centers fall inside each polygon."""
+        positions, rows, cols = grid.generate_grid_cells(
+            self.data, inside_polygon=True, workers=self.workers, polygon_arrays=self.load_polygons(),
+            method=self.method, cache_dir=self.geometry_cache, store_dir=self.store_dir
+        )
 
-            # Append valid results to the lists
-            if valid_lons and valid_lats:
-                shrid_id = np.full(len(valid_lons), row["shrid2"])
-                id_count = np.full(len(valid_lons), row["Unnamed: 0"])
-
-                lons_list.append(valid_lons)
-                lats_list.append(valid_lats)
-                shrid_id_list.append(shrid_id)
-                id_count_list.append(id_count)
-
-        # Combine results into flat arrays
+        # Kept as int32 lattice indices until saved
         self.result_df = pd.DataFrame({
-            "Unnamed: 0": np.hstack(id_count_list),
-            "file2": np.hstack(shrid_id_list),
-            "Lon": np.hstack(lons_list),
-            "Lat": np.hstack(lats_list)
+            "Unnamed: 0": self.data["Unnamed: 0"].to_numpy()[positions],
+            "file2": self.data["shrid2"].to_numpy()[positions],
+            "row": rows,
+            "col": cols
         })
 
     def generate_grid_no_polygon(self):
         """Generate coordinate grids without comparing with polygon coordinate"""
-        # Round and adjust the coordinates
-        self.csv_file["min_lat_round"] = self.csv_file["min_lat"].round(2) + .005
-        self.csv_file["max_lat_round"] = self.csv_file["max_lat"].round(2) - .005
-        self.csv_file["min_lon_round"] = self.csv_file["min_lon"].round(2) + .005
-        self.csv_file["max_lon_round"] = self.csv_file["max_lon"].round(2) - .005
-
-        # Initialize lists to store the results
-        lons_list = []
-        lats_list = []
-        shrid_id_list = []
-        id_count_list = []
-
-        # Iterate over each row in the DataFrame to generate a grid of coordinates
-        for i, row in self.csv_file.iterrows():
-            x_range = np.arange(row["min_lon_round"], row["max_lon_round"] + 0.01, 0.01)
-            y_range = np.arange(row["min_lat_round"], row["max_lat_round"] + 0.01, 0.01)
-            x_grid, y_grid = np.meshgrid(x_range, y_range)
+        positions, rows, cols = grid.generate_grid_cells(self.data, inside_polygon=False, workers=self.workers)
 
-            lons = x_grid.flatten()
-            lats = y_grid.flatten()
-
-            # Filter both lons and lats based on the current row's min/max bounds
-            # Ensures no out-of-bound region errors 
-            valid_indices = (lons >= row["min_lon"]) & (lons <= row["max_lon"]) & \
-                            (lats >= row["min_lat"]) & (lats <= row["max_lat"])
-            
-            lons_filtered = lons[valid_indices]
-            lats_filtered = lats[valid_indices]
-
-            # If filtered arrays are not empty, append the corresponding shrid2 values
-            if len(lons_filtered) > 0 and len(lats_filtered) > 0:
-                shrid_id = np.full(len(lons_filtered), row["shrid2"])
-                id_count = np.full(len(lons_filtered), row["Unnamed: 0"])
-
-                lons_list.append(lons_filtered)
-                lats_list.append(lats_filtered)
-                shrid_id_list.append(shrid_id)
-                id_count_list.append(id_count)
-
-        # Combine all the individual lists into single flat arrays
-        lons_list = np.hstack(lons_list)
-        lats_list = np.hstack(lats_list)
-        shrid_id_list = np.hstack(shrid_id_list)
-        id_count_list = np.hstack(id_count_list)
+        self.result_df = pd.DataFrame({
+            "Unnamed: 0": self.data["Unnamed: 0"].to_numpy()[positions],
+            "shrid2": self.data["shrid2"].to_numpy()[positions],
+            "row": rows,
+            "col": cols
+        })
 
     def save_to_csv(self, chunk_size=100000):
-        """Save the resulting DataFrame to one or more CSV files."""
-        total_rows = self.result_df.shape[0]
-        num_chunks = (total_rows // chunk_size) + 1
-
-        for i in range(num_chunks):
-            start_row = i * chunk_size
-            end_row = min((i + 1) * chunk_size, total_rows)
-
-            chunk_df = self.result_df.iloc[start_row:end_row]
-            chunk_filename = f"file_coordinates_{i + 1}.csv"
-            chunk_df.to_csv(chunk_filename, index=False, float_format="%.3f")
-
-            print(f"Saved {chunk_filename} with rows {start_row} to {end_row - 1}")
+        """Save the resulting DataFrame to one or more CSV files, converting lattice indices to Lon/Lat."""
+        def frames():
+            for start_row in range(0, self.result_df.shape[0], chunk_size):
+                chunk_df = self.result_df.iloc[start_row:start_row + chunk_size]
+                yield chunk_df.drop(columns=["row", "col"]).assign(
+                    Lon=lattice.to_degrees(chunk_df["col"]),
+                    Lat=lattice.to_degrees(chunk_df["row"])
+                )
+
+        return grid.write_coordinate_chunks(frames(), chunk_size=chunk_size)
+
+    def stream_to_csv(self, chunk_size=100000):
+        """Generate the grid batch by batch and write each CSV file as soon as it fills."""
+        frames = grid.iter_coordinate_frames(
+            self.data, id_column="file2", inside_polygon=True, workers=self.workers, polygon_arrays=self.load_polygons(),
+            method=self.method, cache_dir=self.geometry_cache, store_dir=self.store_dir
+        )
+        return grid.write_coordinate_chunks(frames, chunk_size=chunk_size)
 
     def run(self):
-        """Execute the full pipeline."""
+        """Execute the full pipeline, streaming the output so memory stays bounded."""
         self.preprocess_coordinates()
-        self.generate_grid()
-        self.save_to_csv()
\ No newline at end of file
+        self.stream_to_csv()
@@ -15,6 +15,11 @@ from io import BytesIO
 import geopandas as gpd
 import matplotlib.patches as patches
 from shapely.geometry import Polygon, Point, box
+from .. import geometry
+from ..loader import load_csv
+# Columns visualized alongside each polygon
+BOUNDING_BOX_COLUMNS = ['shrid2', 'min_lat', 'max_lat', 'min_lon', 'max_lon', 'centroid_x', 'centroid_y']
+
 
 def compute_bounding_box(polygon):
     """Takes a polygon and returns its bounding box coordinates."""
@@ -22,47 +27,36 @@ def compute_bounding_box(polygon):
     return miny, maxy, minx, maxx  # Returning (min lat, max lat, min lon, max lon)
     
     
-def process_shrid_bounding_boxes(csv_file):
-    """Processes a CSV file of polygons, calculates bounding boxes and centroids, and saves them."""
-    df = pd.read_csv(csv_file)
-    min_lats = []
-    max_lats = []
-    min_lons = []
-    max_lons = []
-    centroids = []
-    
-    for index, row in df.iterrows():
-        polygon = Polygon(eval(row['polygon_coordinates']))
-        min_lat, max_lat, min_lon, max_lon = compute_bounding_box(polygon)
-        min_lats.append(min_lat)
-        max_lats.append(max_lat)
-        min_lons.append(min_lon)
-        max_lons.append(max_lon)
-        centroids.append((polygon.centroid.x, polygon.centroid.y)) 
-   
-    df['min_lat'] = min_lats
-    df['max_lat'] = max_lats
-    df['min_lon'] = min_lons
-    df['max_lon'] = max_lons
-    df['centroid_x'] = [centroid[0] for centroid in centroids]
-    df['centroid_y'] = [centroid[1] for centroid in centroids]
+def process_shrid_bounding_boxes(csv_file, output_file="shrid_bounding_boxes_for_mosaiks.csv", polygon_arrays=None):
+    """Processes a CSV file of polygons, calculates bounding boxes and centroids, and saves them to output_file."""
+    df = load_csv(csv_file, features=(), categorical=False)
+    # Flat (coords, offsets) of every polygon, from the sidecar unless passed in
+    coords, offsets = polygon_arrays if polygon_arrays is not None else geometry.load_polygon_arrays(csv_file)
+    bounds = geometry.polygon_bounds(coords, offsets)
+    centroids = geometry.polygon_centroids(coords, offsets)
+
+    df['min_lat'] = bounds[:, 1]
+    df['max_lat'] = bounds[:, 3]
+    df['min_lon'] = bounds[:, 0]
+    df['max_lon'] = bounds[:, 2]
+    df['centroid_x'] = centroids[:, 0]
+    df['centroid_y'] = centroids[:, 1]
 
-    output_file = "shrid_bounding_boxes_for_mosaiks.csv"
     df.to_csv(output_file, index=False)
-    
+
     return output_file
 
 ## Visualizing Boundary Boxes
 
 def parse_polygon(polygon_string):
     """Converts a string of polygon coordinates into a Polygon object."""
-    coordinates = eval(polygon_string)
-    return Polygon(coordinates)
+    return geometry.parse_polygon(polygon_string)
 
 def visualize_boundary_boxes(csv_file_path):
     """Visualizes polygons along with their bounding boxes and centroids."""
-    shrid_data = pd.read_csv(csv_file_path)
-    shrid_data['geometry'] = shrid_data['polygon_coordinates'].apply(parse_polygon)
+    # The polygons come from the sidecar, so only the bounding box and centroid columns are parsed
+    shrid_data = load_csv(csv_file_path, columns=BOUNDING_BOX_COLUMNS, features=(), categorical=False)
+    shrid_data['geometry'] = geometry.polygons_from_arrays(*geometry.load_polygon_arrays(csv_file_path))
     gdf = gpd.GeoDataFrame(shrid_data, geometry='geometry')
 
     def create_bbox(minx, miny, maxx, maxy):
@@ -0,0 +1,287 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import mercantile
+import numpy as np
+import requests
+from PIL import Image
+from xyzservices import TileProvider
+
+# Default size budget of a tile cache
+CACHE_BYTES = 1024 * 1024 * 1024
+
+# Margin matplotlib adds around plotted data (rcParams 'axes.xmargin'/'axes.ymargin'),
+# so the tiles of a shrid's image can be predicted from its bounds
+PLOT_MARGIN = 0.05
+
+# Tiles fetched at once while prefetching
+FETCH_WORKERS = 4
+
+USER_AGENT = "MOSAIKS_feature"
+
+
+class UrlTileSource:
+    """
+    Tiles fetched over HTTP from an xyzservices provider or a URL template.
+
+    Any server with ``{z}/{x}/{y}`` URLs works, including a local stand-in
+    serving fixture tiles.
+    """
+
+    def __init__(self, provider, name: str = None, timeout: float = 30, max_retries: int = 2):
+        """
+        Parameters
+        ----------
+        provider : xyzservices.TileProvider or str
+            Provider, e.g. ``contextily.providers.Esri.WorldImagery``, or a URL
+            template with ``{z}``, ``{x}`` and ``{y}`` fields.
+        name : str, optional
+            Name the tiles are cached under; the provider's name, or the host
+            of the URL template, by default.
+        timeout : float, optional
+            Seconds to wait for a response.
+        max_retries : int, optional
+            Further attempts after a connection error or a server error.
+        """
+        if isinstance(provider, str):
+            name = name or re.sub(r"^\w+://", "", provider).split("/")[0]
+            provider = TileProvider(name=name, url=provider, attribution="")
+        self.provider = provider
+        self.name = name or provider.name
+        self.timeout = timeout
+        self.max_retries = max_retries
+
+    def __call__(self, z: int, x: int, y: int) -> bytes:
+        """Return the encoded image of one tile."""
+        url = self.provider.build_url(x=x, y=y, z=z)
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = requests.get(url, headers={"User-Agent": USER_AGENT}, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                continue
+            # Server errors are retried; client errors such as a missing tile are not
+            if response.status_code >= 500 and attempt < self.max_retries:
+                continue
+            response.raise_for_status()
+            return response.content
+
+
+class DirectoryTileSource:
+    """Tiles read from a directory laid out as ``{z}/{x}/{y}.png``, e.g. fixture tiles or an offline mirror."""
+
+    def __init__(self, root: str, name: str = None, pattern: str = "{z}/{x}/{y}.png"):
+        """
+        Parameters
+        ----------
+        root : str
+            Directory holding the tiles.
+        name : str, optional
+            Name the tiles are cached under; the directory name by default.
+        pattern : str, optional
+            Path of a tile relative to ``root``.
+        """
+        self.root = root
+        self.name = name or os.path.basename(os.path.normpath(root))
+        self.pattern = pattern
+
+    def __call__(self, z: int, x: int, y: int) -> bytes:
+        """Return the encoded image of one tile; raises FileNotFoundError if it is missing."""
+        with open(os.path.join(self.root, self.pattern.format(z=z, x=x, y=y)), "rb") as f:
+            return f.read()
+
+
+def tiles_for_bounds(bounds, zoom: int, margin: float = PLOT_MARGIN) -> list:
+    """
+    Return the tiles covering lon/lat boxes, each widened by ``margin`` of its size.
+
+    Parameters
+    ----------
+    bounds : array-like
+        ``(west, south, east, north)`` rows, e.g. ``GeoSeries.bounds``.
+    zoom : int
+        Zoom level.
+    margin : float, optional
+        Relative margin added on every side, as matplotlib does when plotting.
+
+    Returns
+    -------
+    list of mercantile.Tile
+        The union of the tiles of every box, sorted.
+    """
+    tiles = set()
+    for west, south, east, north in np.asarray(bounds, dtype=float):
+        dx, dy = (east - west) * margin, (north - south) * margin
+        tiles.update(mercantile.tiles(west - dx, south - dy, east + dx, north + dy, [zoom]))
+    return sorted(tiles)
+
+
+class TileCache:
+    """
+    Persistent on-disk cache of map tiles with a size budget and LRU eviction.
+
+    Tiles are stored as ``{cache_dir}/{source name}/{z}/{x}/{y}.tile`` and
+    fetched from ``source`` (any callable ``(z, x, y) -> bytes``, such as
+    :class:`UrlTileSource` or :class:`DirectoryTileSource`) only on a miss.
+    The modification time of a tile records its last use, so the least
+    recently used tiles are evicted first, across runs, once the tiles of all
+    sources in ``cache_dir`` exceed ``max_bytes``.
+    """
+
+    def __init__(self, cache_dir: str, source, max_bytes: int = CACHE_BYTES):
+        """
+        Open the cache in ``cache_dir``, indexing the tiles already there.
+
+        Parameters
+        ----------
+        cache_dir : str
+            Directory holding the cached tiles.
+        source : callable
+            ``source(z, x, y)`` returns the encoded image of a tile; its
+            ``name`` attribute, if any, separates its tiles from other sources'.
+        max_bytes : int, optional
+            Size budget of the cache.
+        """
+        self.cache_dir = cache_dir
+        self.source = source
+        self.max_bytes = max_bytes
+        self.directory = os.path.join(cache_dir, re.sub(r"[^\w.-]+", "_", getattr(source, "name", "tiles")))
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        entries = []
+        for root, _, files in os.walk(cache_dir):
+            for file in files:
+                if file.endswith(".tile"):
+                    stat = os.stat(os.path.join(root, file))
+                    entries.append((stat.st_mtime, os.path.join(root, file), stat.st_size))
+        # Least recently used first
+        self._index = OrderedDict((path, size) for _, path, size in sorted(entries))
+        self.size = sum(self._index.values())
+
+    def _path(self, z: int, x: int, y: int) -> str:
+        return os.path.join(self.directory, str(z), str(x), f"{y}.tile")
+
+    def __contains__(self, tile) -> bool:
+        return self._path(*_zxy(tile)) in self._index
+
+    def get(self, z: int, x: int, y: int) -> bytes:
+        """Return the encoded image of a tile, from the cache or else from the source."""
+        path = self._path(z, x, y)
+        with self._lock:
+            cached = path in self._index
+            if cached:
+                self._index.move_to_end(path)
+                self.hits += 1
+        if cached:
+            try:
+                os.utime(path)
+                with open(path, "rb") as f:
+                    return f.read()
+            except FileNotFoundError:
+                # Evicted by another process sharing the cache
+                with self._lock:
+                    self.size -= self._index.pop(path, 0)
+        data = self.source(z, x, y)
+        self._store(path, data)
+        return data
+
+    def _store(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.misses += 1
+            self.size += len(data) - self._index.pop(path, 0)
+            self._index[path] = len(data)
+            # Evict the least recently used tiles, never the one just stored
+            while self.size > self.max_bytes and len(self._index) > 1:
+                old, size = self._index.popitem(last=False)
+                self.size -= size
+                try:
+                    os.remove(old)
+                except FileNotFoundError:
+                    pass
+
+    def prefetch(self, tiles, workers: int = FETCH_WORKERS) -> int:
+        """
+        Fetch the tiles not cached yet, ``workers`` at a time.
+
+        Returns
+        -------
+        int
+            Number of tiles fetched from the source.
+        """
+        missing = [_zxy(tile) for tile in dict.fromkeys(tiles) if tile not in self]
+        if workers <= 1:
+            for tile in missing:
+                self.get(*tile)
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(lambda tile: self.get(*tile), missing))
+        return len(missing)
+
+    def image(self, west: float, south: float, east: float, north: float, zoom: int):
+        """
+        Mosaic the tiles covering a lon/lat box, like ``contextily.bounds2img``.
+
+        Returns
+        -------
+        tuple (np.ndarray, tuple)
+            RGBA image and its ``(left, right, bottom, top)`` extent in Web
+            Mercator (EPSG:3857).
+        """
+        tiles = list(mercantile.tiles(west, south, east, north, [zoom]))
+        arrays = [np.asarray(Image.open(BytesIO(self.get(*_zxy(tile)))).convert("RGBA")) for tile in tiles]
+        xs = np.array([tile.x for tile in tiles])
+        ys = np.array([tile.y for tile in tiles])
+        h, w, d = arrays[0].shape
+        image = np.zeros((h * (ys.max() - ys.min() + 1), w * (xs.max() - xs.min() + 1), d), dtype=np.uint8)
+        for x, y, array in zip(xs - xs.min(), ys - ys.min(), arrays):
+            image[y * h:(y + 1) * h, x * w:(x + 1) * w] = array
+        top_left = mercantile.xy_bounds(xs.min(), ys.min(), zoom)
+        bottom_right = mercantile.xy_bounds(xs.max(), ys.max(), zoom)
+        return image, (top_left.left, bottom_right.right, bottom_right.bottom, top_left.top)
+
+
+def warp_to_lonlat(image: np.ndarray, extent):
+    """
+    Reproject a Web Mercator image, e.g. from :meth:`TileCache.image`, to lon/lat (EPSG:4326).
+
+    Longitude is linear in Web Mercator x, so only the rows move: every
+    output row is linearly interpolated between the two source rows around
+    its latitude.
+
+    Returns
+    -------
+    tuple (np.ndarray, tuple)
+        Image of the same shape and its ``(west, east, south, north)`` extent.
+    """
+    left, right, bottom, top = extent
+    west, south = mercantile.lnglat(left, bottom)
+    east, north = mercantile.lnglat(right, top)
+    h = image.shape[0]
+    lats = north - (np.arange(h) + 0.5) * (north - south) / h
+    ys = mercantile.RE * np.log(np.tan(np.pi / 4 + np.radians(lats) / 2))
+    rows = np.clip((top - ys) / (top - bottom) * h - 0.5, 0, h - 1)
+    below = np.minimum(rows.astype(np.int64), max(h - 2, 0))
+    above = np.minimum(below + 1, h - 1)
+    weight = (rows - below).reshape((h,) + (1,) * (image.ndim - 1))
+    warped = image[below] * (1 - weight) + image[above] * weight
+    if np.issubdtype(image.dtype, np.integer):
+        warped = np.round(warped)
+    return warped.astype(image.dtype), (west, east, south, north)
+
+
+def _zxy(tile) -> tuple:
+    """``(z, x, y)`` of a mercantile.Tile or a ``(z, x, y)`` tuple."""
+    if isinstance(tile, mercantile.Tile):
+        return tile.z, tile.x, tile.y
+    return tuple(int(v) for v in tile)
@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+from . import lattice
+from .grid import CHUNK_SIZE, iter_grid_cells
+
+
+def pack_shrids(point_counts, chunk_size: int = CHUNK_SIZE) -> np.ndarray:
+    """
+    Assign shrids to upload files without splitting any shrid across a file boundary.
+
+    Shrids are packed in order (next fit), which keeps neighbouring shrids, and
+    therefore the points they share, in the same file. A shrid that does not fit
+    in the remaining space of the current file starts a new one. Only a shrid
+    with more than ``chunk_size`` points of its own spans several files, which
+    it then fills consecutively.
+
+    Parameters
+    ----------
+    point_counts : array-like of int
+        Number of points each shrid adds to the upload.
+    chunk_size : int, optional
+        Maximum number of points per file.
+
+    Returns
+    -------
+    np.ndarray
+        int64 index of the (first) file of each shrid, starting at 0.
+    """
+    point_counts = np.asarray(point_counts, dtype=np.int64)
+    files = np.zeros(len(point_counts), dtype=np.int64)
+    current = 0
+    fill = 0
+    for i, count in enumerate(point_counts):
+        if fill > 0 and fill + count > chunk_size:
+            current += 1
+            fill = 0
+        files[i] = current
+        if count > chunk_size:
+            extra = (count - 1) // chunk_size
+            current += extra
+            fill = count - extra * chunk_size
+        else:
+            fill += count
+    return files
+
+
+def plan_uploads(data: pd.DataFrame, id_column: str = "shrid2", inside_polygon: bool = True, workers: int = 1,
+                 polygon_arrays=None, method: str = "prepared", cache_dir: str = None, store_dir: str = None,
+                 chunk_size: int = CHUNK_SIZE, prefix: str = "file_coordinates",
+                 mapping_file: str = "point_shrids.csv", float_format: str = "%.3f") -> dict:
+    """
+    Write deduplicated MOSAIKS upload files and the point-to-shrid table needed to join the results.
+
+    Neighbouring bounding boxes (and polygons sharing a border) overlap on the
+    lattice, so the same point is generated for several shrids. Each point is
+    uploaded once, in the file of the first shrid that contains it, and
+    :func:`pack_shrids` keeps the points a shrid adds together in one file.
+    ``mapping_file`` lists every (point, shrid) pair with the upload file that
+    holds the point, so the features returned by MOSAIKS can be joined back to
+    all of the shrids that contain it.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Shrid table as accepted by :func:`grid.iter_grid_cells`, with a 'shrid2' column.
+    id_column : str, optional
+        Name of the shrid ID column in ``mapping_file``.
+    inside_polygon, workers, polygon_arrays, method, cache_dir, store_dir : optional
+        See :func:`grid.iter_grid_cells`.
+    chunk_size : int, optional
+        Maximum number of points per upload file.
+    prefix : str, optional
+        Upload files are named ``{prefix}_{i}.csv`` starting at 1.
+    mapping_file : str, optional
+        Path of the point-to-shrid table.
+    float_format : str, optional
+        Format used for the coordinates.
+
+    Returns
+    -------
+    dict
+        'points' (before deduplication), 'unique_points', 'saved_points',
+        'saved_fraction', 'split_shrids' (shrids too large for one file),
+        'files' and 'mapping_file'.
+    """
+    positions_list = [np.empty(0, dtype=np.int64)]
+    keys_list = [np.empty(0, dtype=np.int64)]
+    for positions, rows, cols in iter_grid_cells(data, inside_polygon, workers, polygon_arrays, method, cache_dir,
+                                                 store_dir):
+        positions_list.append(positions)
+        keys_list.append(lattice.pack(rows, cols))
+    positions = np.concatenate(positions_list)
+    keys = np.concatenate(keys_list)
+
+    # Every unique point is owned by the first shrid (in row order) that contains it
+    unique_keys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    owners = positions[first]
+    new_counts = np.bincount(owners, minlength=len(data))
+    shrid_files = pack_shrids(new_counts, chunk_size)
+
+    # Points of a shrid larger than a file continue into the files after its first one
+    order = np.lexsort((unique_keys, owners))
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order)) - np.repeat(np.cumsum(new_counts) - new_counts, new_counts)
+    point_files = shrid_files[owners] + rank // chunk_size
+
+    # Renumber so the files written are consecutive from 1
+    file_ids, point_files = np.unique(point_files, return_inverse=True)
+    point_files = point_files + 1
+
+    filenames = []
+    rows_written = 0
+    point_order = np.lexsort((unique_keys, point_files))
+    file_bounds = np.searchsorted(point_files[point_order], np.arange(1, len(file_ids) + 2))
+    for i in range(len(file_ids)):
+        chunk = point_order[file_bounds[i]:file_bounds[i + 1]]
+        rows, cols = lattice.unpack(unique_keys[chunk])
+        chunk_filename = f"{prefix}_{i + 1}.csv"
+        pd.DataFrame({"Lon": lattice.to_degrees(cols), "Lat": lattice.to_degrees(rows)}).to_csv(
+            chunk_filename, index=False, float_format=float_format
+        )
+        filenames.append(chunk_filename)
+        print(f"Saved {chunk_filename} with rows {rows_written} to {rows_written + len(chunk) - 1}")
+        rows_written += len(chunk)
+
+    # One row per (point, shrid) pair, grouped by the upload file holding the point
+    mapping_order = np.lexsort((positions, keys, point_files[inverse]))
+    rows, cols = lattice.unpack(keys[mapping_order])
+    pd.DataFrame({
+        "Lon": lattice.to_degrees(cols),
+        "Lat": lattice.to_degrees(rows),
+        id_column: data["shrid2"].to_numpy()[positions[mapping_order]],
+        "file": point_files[inverse[mapping_order]],
+    }).to_csv(mapping_file, index=False, float_format=float_format)
+
+    saved = len(keys) - len(unique_keys)
+    report = {
+        "points": len(keys),
+        "unique_points": len(unique_keys),
+        "saved_points": saved,
+        "saved_fraction": saved / len(keys) if len(keys) > 0 else 0.0,
+        "split_shrids": int((new_counts > chunk_size).sum()),
+        "files": filenames,
+        "mapping_file": mapping_file,
+    }
+    print(f"Uploading {report['unique_points']} unique points instead of {report['points']} "
+          f"({saved} duplicates removed, {report['saved_fraction']:.1%} less query volume)")
+    return report
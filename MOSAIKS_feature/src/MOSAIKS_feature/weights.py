@@ -0,0 +1,199 @@
+import hashlib
+import os
+import numpy as np
+import shapely
+from scipy import sparse
+from . import lattice
+from .fileio import write_array
+from .geometry import polygons_from_arrays
+
+# Bump when the cached layout or the weighting changes so stale caches are ignored
+WEIGHTS_VERSION = 1
+
+# Candidate cells intersected with their polygons per vectorized batch
+BATCH_CELLS = 1 << 20
+
+CELL_AREA = lattice.CELL_SIZE ** 2
+
+
+def polygon_cell_bounds(polygons):
+    """
+    Return the lattice cells whose squares can overlap each polygon.
+
+    Unlike :func:`lattice.cell_bounds`, which selects cells by their centers,
+    this includes every cell whose 0.01° square reaches into the polygon's
+    bounding box.
+
+    Returns
+    -------
+    np.ndarray
+        int64 ``(n, 4)`` half-open ``row_start, row_stop, col_start, col_stop``.
+    """
+    min_lon, min_lat, max_lon, max_lat = shapely.bounds(polygons).T
+    bounds = np.c_[
+        lattice.to_index(min_lat), lattice.to_index(max_lat) + 1,
+        lattice.to_index(min_lon), lattice.to_index(max_lon) + 1,
+    ].astype(np.int64)
+    bounds[np.isnan(min_lon)] = 0
+    return bounds
+
+
+def area_weights(polygons, batch_cells: int = BATCH_CELLS):
+    """
+    Compute the fraction of every lattice cell covered by each polygon.
+
+    Candidate cells of many polygons are built as 0.01° boxes and tested in
+    vectorized batches: cells covered by their polygon get weight 1 without
+    computing an intersection, cells that do not intersect it are dropped, and
+    only cells on the boundary get the intersection area. Invalid polygons are
+    repaired with ``shapely.make_valid`` first so their area is well defined.
+
+    Parameters
+    ----------
+    polygons : array-like of shapely.geometry.Polygon
+        One polygon per shrid.
+    batch_cells : int, optional
+        Number of candidate cells processed per batch.
+
+    Returns
+    -------
+    tuple (np.ndarray, np.ndarray, np.ndarray)
+        CSR arrays ``(indptr, cells, weights)``: the packed lattice keys
+        (:func:`lattice.pack`) of shrid ``i`` are ``cells[indptr[i]:indptr[i + 1]]``,
+        sorted, with the covered fraction of each cell in ``weights``.
+    """
+    polygons = np.array(polygons, dtype=object)
+    invalid = ~shapely.is_valid(polygons)
+    if invalid.any():
+        polygons[invalid] = shapely.make_valid(polygons[invalid])
+    shapely.prepare(polygons)
+
+    bounds = polygon_cell_bounds(polygons)
+    sizes = (bounds[:, 1] - bounds[:, 0]) * (bounds[:, 3] - bounds[:, 2])
+    batch_ids = np.cumsum(sizes) // max(int(batch_cells), 1)
+    batch_starts = np.flatnonzero(np.r_[True, batch_ids[1:] != batch_ids[:-1]]) if len(sizes) else []
+
+    owners_list = [np.empty(0, dtype=np.int64)]
+    cells_list = [np.empty(0, dtype=np.int64)]
+    weights_list = [np.empty(0, dtype=np.float64)]
+    for start, stop in zip(batch_starts, [*batch_starts[1:], len(sizes)]):
+        widths = bounds[start:stop, 3] - bounds[start:stop, 2]
+        counts = sizes[start:stop]
+        owners = np.repeat(np.arange(start, stop), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        rows = bounds[owners, 0] + local // widths[owners - start]
+        cols = bounds[owners, 2] + local % widths[owners - start]
+
+        boxes = shapely.box(cols * lattice.CELL_SIZE, rows * lattice.CELL_SIZE,
+                            (cols + 1) * lattice.CELL_SIZE, (rows + 1) * lattice.CELL_SIZE)
+        weights = np.zeros(len(boxes), dtype=np.float64)
+        touching = shapely.intersects(polygons[owners], boxes)
+        covered = touching.copy()
+        covered[touching] = shapely.covers(polygons[owners[touching]], boxes[touching])
+        weights[covered] = 1.0
+        partial = touching & ~covered
+        weights[partial] = shapely.area(shapely.intersection(polygons[owners[partial]], boxes[partial])) / CELL_AREA
+
+        keep = weights > 0
+        owners_list.append(owners[keep])
+        cells_list.append(lattice.pack(rows[keep], cols[keep]))
+        weights_list.append(np.minimum(weights[keep], 1.0))
+
+    owners = np.concatenate(owners_list)
+    cells = np.concatenate(cells_list)
+    weights = np.concatenate(weights_list)
+    order = np.lexsort((cells, owners))
+    indptr = np.zeros(len(polygons) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(owners, minlength=len(polygons)), out=indptr[1:])
+    return indptr, cells[order], weights[order]
+
+
+def _cache_key(coords, offsets) -> str:
+    """Hash the polygon arrays into a cache key."""
+    digest = hashlib.sha256(f"weights-v{WEIGHTS_VERSION}:".encode())
+    digest.update(np.ascontiguousarray(coords, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(offsets, dtype=np.int64).tobytes())
+    return digest.hexdigest()[:32]
+
+
+def load_area_weights(coords, offsets, cache_dir: str = None):
+    """
+    Load or build the shrid-by-cell area weights for flat polygon arrays.
+
+    The CSR arrays are stored in ``cache_dir`` under a key derived from the
+    polygon coordinates, so they are computed once per shrid file and reused
+    for every MOSAIKS result file and feature version aggregated against it.
+
+    Parameters
+    ----------
+    coords, offsets : np.ndarray
+        Polygon arrays from :func:`geometry.load_polygon_arrays`.
+    cache_dir : str, optional
+        Directory to cache the result in; nothing is cached if None.
+
+    Returns
+    -------
+    tuple (np.ndarray, np.ndarray, np.ndarray)
+        ``(indptr, cells, weights)`` as returned by :func:`area_weights`.
+    """
+    if cache_dir is not None:
+        key = _cache_key(coords, offsets)
+        paths = [os.path.join(cache_dir, f"{key}.weights_{name}.npy") for name in ("indptr", "cells", "values")]
+        if all(os.path.exists(path) for path in paths):
+            return tuple(np.load(path, mmap_mode="r") for path in paths)
+
+    result = area_weights(polygons_from_arrays(coords, offsets))
+
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        for path, array in zip(paths, result):
+            write_array(path, array)
+    return result
+
+
+class AreaWeights:
+    """
+    Sparse shrid-by-cell area weights.
+
+    Row ``i`` holds the lattice cells overlapping shrid ``i`` and the fraction
+    of each cell the shrid covers, in CSR form (see :func:`area_weights`). An
+    index of the entries by cell is built once, so the weights of each chunk of
+    a MOSAIKS result file can be looked up without rescanning the matrix.
+    """
+
+    def __init__(self, indptr, cells, weights):
+        """Wrap CSR arrays from :func:`area_weights` or :func:`load_area_weights`."""
+        self.indptr = np.asarray(indptr)
+        self.cells = np.asarray(cells)
+        self.weights = np.asarray(weights)
+        self.n_shrids = len(self.indptr) - 1
+        self._owners = np.repeat(np.arange(self.n_shrids), np.diff(self.indptr))
+        self._by_cell = np.argsort(self.cells, kind="stable")
+        self._sorted_cells = self.cells[self._by_cell]
+
+    def matrix(self, cell_keys) -> sparse.csr_matrix:
+        """
+        Map feature rows onto the weights.
+
+        Parameters
+        ----------
+        cell_keys : np.ndarray
+            Packed lattice key of each feature row; a key may repeat.
+
+        Returns
+        -------
+        scipy.sparse.csr_matrix
+            ``(n_shrids, len(cell_keys))`` matrix holding the weight of every
+            row's cell for every shrid overlapping it, so ``matrix @ features``
+            gives the weighted feature sums per shrid.
+        """
+        cell_keys = np.asarray(cell_keys, dtype=np.int64)
+        first = np.searchsorted(self._sorted_cells, cell_keys, side="left")
+        counts = np.searchsorted(self._sorted_cells, cell_keys, side="right") - first
+
+        # Shrids overlapping a cell form one contiguous run of the by-cell index
+        feature_rows = np.repeat(np.arange(len(cell_keys)), counts)
+        runs = np.repeat(first - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+        entries = self._by_cell[runs]
+        return sparse.csr_matrix((self.weights[entries], (self._owners[entries], feature_rows)),
+                                 shape=(self.n_shrids, len(cell_keys)))
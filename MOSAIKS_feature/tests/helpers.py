@@ -0,0 +1,66 @@
+"""Test data builders shared by several test modules."""
+import numpy as np
+import pandas as pd
+from shapely.geometry import Polygon
+
+
+def make_shrids(n, seed=0, max_vertices=30):
+    """Random star-shaped polygons with their bounding boxes."""
+    rng = np.random.default_rng(seed)
+    records = []
+    for i in range(n):
+        cx, cy = rng.uniform(75, 85), rng.uniform(10, 25)
+        angles = np.sort(rng.uniform(0, 2 * np.pi, rng.integers(3, max_vertices)))
+        radii = rng.uniform(0.01, 0.1, len(angles))
+        coords = [(float(cx + r * np.cos(a)), float(cy + r * np.sin(a))) for r, a in zip(radii, angles)]
+        coords.append(coords[0])
+        min_lon, min_lat, max_lon, max_lat = Polygon(coords).bounds
+        records.append({
+            "Unnamed: 0": i, "shrid2": f"11-{i:05d}", "polygon_coordinates": str(coords),
+            "min_lat": min_lat, "max_lat": max_lat, "min_lon": min_lon, "max_lon": max_lon,
+        })
+    return pd.DataFrame(records)
+
+
+def overlapping_shrids():
+    """Adjacent shrids whose bounding boxes overlap by a few lattice columns."""
+    data = make_shrids(30, seed=11)
+    data["min_lon"] = 78.0 + 0.05 * np.arange(len(data))
+    data["max_lon"] = data["min_lon"] + 0.08
+    data["min_lat"] = 20.0
+    data["max_lat"] = 20.1
+    return data
+
+
+def wiggly_polygon(n_vertices, cx=78.0, cy=20.0, seed=0):
+    """A star-shaped polygon with many small wiggles, like a detailed shrid boundary."""
+    rng = np.random.default_rng(seed)
+    angles = np.linspace(0, 2 * np.pi, n_vertices, endpoint=False)
+    radii = 0.1 + 0.01 * np.sin(7 * angles) + rng.uniform(0, 0.002, n_vertices)
+    return Polygon(np.c_[cx + radii * np.cos(angles), cy + radii * np.sin(angles)])
+
+
+def make_results(n_rows=500, n_features=6, n_shrids=40, seed=0):
+    """A MOSAIKS-style result table with missing feature values."""
+    rng = np.random.default_rng(seed)
+    data = pd.DataFrame(rng.normal(size=(n_rows, n_features)), columns=[f"feature{i}" for i in range(n_features)])
+    data[data > 1.5] = np.nan
+    data.insert(0, "Lon", rng.uniform(70, 90, n_rows))
+    data.insert(0, "Lat", rng.uniform(8, 30, n_rows))
+    data.insert(0, "shrid2", rng.choice([f"11-{i:05d}" for i in range(n_shrids)], n_rows))
+    return data
+
+
+def in_memory_means(file_path):
+    df = pd.read_csv(file_path).fillna(0)
+    features = [col for col in df.columns if col not in ['shrid2', 'Lat', 'Lon']]
+    return df.groupby('shrid2')[features].mean().reset_index()
+
+
+def in_memory_stats(file_path):
+    df = pd.read_csv(file_path).fillna(0)
+    features = [col for col in df.columns if col not in ['shrid2', 'Lat', 'Lon']]
+    stats = df.groupby('shrid2')[features].agg(['mean', 'var', 'min', 'max'])
+    stats.columns = [f"{feature}_{name}" for feature, name in stats.columns]
+    stats.insert(0, 'count', df.groupby('shrid2').size())
+    return stats.reset_index()
@@ -0,0 +1,215 @@
+import unittest
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from shapely.geometry import box
+from src.MOSAIKS_feature import lattice
+from src.MOSAIKS_feature.aggregate import (GroupMeans, GroupStats, area_weighted_means, chunk_rows, feature_columns,
+                                           result_files, stream_group_means, stream_group_stats, stream_weighted_means)
+from src.MOSAIKS_feature.extract_features.aggregate_features import aggregate, default_output_file
+from src.MOSAIKS_feature.weights import AreaWeights
+from tests.helpers import in_memory_means, in_memory_stats, make_results
+
+
+class TestGroupMeans(unittest.TestCase):
+
+    def test_grows_and_sorts(self):
+        groups = GroupMeans(2, capacity=1)
+        groups.add(["b", "a", "b"], np.array([[1.0, 2.0], [3.0, 4.0], [5.0, 6.0]]))
+        groups.add(["c", "a"], np.array([[7.0, 8.0], [9.0, 10.0]]))
+        result = groups.means(["x", "y"])
+        self.assertListEqual(result["shrid2"].tolist(), ["a", "b", "c"])
+        self.assertListEqual(result["x"].tolist(), [6.0, 3.0, 7.0])
+        self.assertListEqual(result["y"].tolist(), [7.0, 4.0, 8.0])
+
+    def test_merge(self):
+        first = GroupMeans(1)
+        first.add(["a", "b"], np.array([[1.0], [2.0]]))
+        second = GroupMeans(1)
+        second.add(["c", "a"], np.array([[3.0], [5.0]]))
+        first.merge(second)
+        result = first.means(["x"])
+        self.assertListEqual(result["shrid2"].tolist(), ["a", "b", "c"])
+        self.assertListEqual(result["x"].tolist(), [3.0, 2.0, 3.0])
+
+    def test_chunk_rows(self):
+        self.assertEqual(chunk_rows(4000, 64 * 1024 * 1024), 2097)
+        self.assertEqual(chunk_rows(10, 1), 1)
+
+
+class TestGroupStats(unittest.TestCase):
+
+    def test_matches_pandas_with_offset(self):
+        # A large offset breaks the naive sum-of-squares variance but not the pairwise merge
+        rng = np.random.default_rng(1)
+        ids = rng.integers(0, 30, 2000)
+        values = 1e8 + rng.normal(size=(2000, 3))
+        groups = GroupStats(3, capacity=2)
+        for start in range(0, 2000, 150):
+            groups.add(ids[start:start + 150], values[start:start + 150])
+        result = groups.statistics(["a", "b", "c"], statistics=("mean", "var", "std"))
+
+        frame = pd.DataFrame(values, columns=["a", "b", "c"]).assign(shrid2=ids)
+        expected = frame.groupby("shrid2").agg(["mean", "var", "std"])
+        np.testing.assert_allclose(result["b_var"], expected[("b", "var")], rtol=1e-6)
+        np.testing.assert_allclose(result["c_std"], expected[("c", "std")], rtol=1e-6)
+        np.testing.assert_allclose(result["a_mean"], expected[("a", "mean")], rtol=1e-15)
+
+    def test_merge_matches_single_pass(self):
+        rng = np.random.default_rng(2)
+        ids = rng.choice(["x", "y", "z", "w"], 300)
+        values = rng.normal(size=(300, 2))
+        whole = GroupStats(2)
+        whole.add(ids, values)
+        merged = GroupStats(2)
+        for start in (200, 0, 100):
+            part = GroupStats(2)
+            part.add(ids[start:start + 100], values[start:start + 100])
+            merged.merge(part)
+        pd.testing.assert_frame_equal(merged.statistics(["a", "b"]), whole.statistics(["a", "b"]),
+                                      check_exact=False, rtol=1e-12)
+
+    def test_single_row_variance(self):
+        groups = GroupStats(1)
+        groups.add(["a", "b", "b"], np.array([[1.0], [2.0], [4.0]]))
+        result = groups.statistics(["x"])
+        self.assertTrue(np.isnan(result["x_var"][0]))
+        self.assertEqual(result["x_var"][1], 2.0)
+        self.assertListEqual(groups.statistics(["x"], ddof=0)["x_var"].tolist(), [0.0, 1.0])
+        with self.assertRaises(ValueError):
+            groups.statistics(["x"], statistics=("median",))
+
+
+class TestStreamGroupMeans(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmp.name, "results.csv")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_matches_in_memory_groupby(self):
+        make_results().to_csv(self.file_path, index=False)
+        # A tiny budget forces many chunks, with shrids spread across them
+        result = stream_group_means(self.file_path, chunk_bytes=200)
+        pd.testing.assert_frame_equal(result, in_memory_means(self.file_path))
+
+    def test_missing_ids_count_as_zero(self):
+        data = make_results(n_rows=50, n_shrids=5)
+        data["shrid2"] = np.arange(50) % 5
+        data.loc[[3, 7], "shrid2"] = np.nan
+        data.to_csv(self.file_path, index=False)
+        pd.testing.assert_frame_equal(stream_group_means(self.file_path, chunk_bytes=400),
+                                      in_memory_means(self.file_path), check_dtype=False)
+
+    def test_feature_columns(self):
+        make_results(n_rows=5, n_features=3).to_csv(self.file_path, index=False)
+        self.assertListEqual(feature_columns(self.file_path), ["feature0", "feature1", "feature2"])
+
+
+class TestMultipleFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        data = make_results(n_rows=900)
+        self.paths = []
+        for i, start in enumerate(range(0, 900, 300)):
+            path = os.path.join(self.tmp.name, f"results_{i + 1}.csv")
+            data.iloc[start:start + 300].to_csv(path, index=False)
+            self.paths.append(path)
+        self.combined = os.path.join(self.tmp.name, "combined.txt")
+        data.to_csv(self.combined, index=False)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_result_files(self):
+        self.assertListEqual(result_files(self.tmp.name), self.paths)
+        self.assertListEqual(result_files(os.path.join(self.tmp.name, "results_*.csv")), self.paths)
+        self.assertListEqual(result_files([self.paths[1], self.paths[0], self.paths[1]]), self.paths[:2])
+        with self.assertRaises(FileNotFoundError):
+            result_files(os.path.join(self.tmp.name, "missing_*.csv"))
+
+    def test_matches_single_file(self):
+        expected = in_memory_means(self.combined)
+        for workers in (1, 2):
+            result = stream_group_means(self.tmp.name, chunk_bytes=500, workers=workers)
+            pd.testing.assert_frame_equal(result, expected)
+
+    def test_stats_match_single_file(self):
+        expected = in_memory_stats(self.combined)
+        for workers in (1, 2):
+            result = stream_group_stats(self.tmp.name, chunk_bytes=500, workers=workers)
+            pd.testing.assert_frame_equal(result, expected, check_exact=False, rtol=1e-10)
+
+    def test_mismatched_features(self):
+        pd.read_csv(self.paths[0]).drop(columns="feature0").to_csv(self.paths[0], index=False)
+        with self.assertRaises(ValueError):
+            stream_group_means(self.paths)
+
+    def test_aggregate_default_output_file(self):
+        # The output goes next to the directory of result files, not into it
+        results_dir = os.path.join(self.tmp.name, "results")
+        os.mkdir(results_dir)
+        for path in self.paths:
+            os.replace(path, os.path.join(results_dir, os.path.basename(path)))
+        output_file = os.path.join(self.tmp.name, "results_averaged.csv")
+
+        self.assertEqual(aggregate(results_dir), output_file)
+        self.assertEqual(aggregate(os.path.join(results_dir, "*.csv")), output_file)
+        pd.testing.assert_frame_equal(pd.read_csv(output_file), in_memory_means(self.combined), check_dtype=False)
+        self.assertEqual(default_output_file(self.combined), os.path.join(self.tmp.name, "combined_averaged.csv"))
+
+
+class TestWeightedMeans(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_results(self, name, rows, cols, values):
+        path = os.path.join(self.tmp.name, name)
+        data = pd.DataFrame(values, columns=[f"feature{i}" for i in range(values.shape[1])])
+        data.insert(0, "Lon", lattice.to_degrees(cols))
+        data.insert(0, "Lat", lattice.to_degrees(rows))
+        data.to_csv(path, index=False)
+        return path
+
+    def test_weighted_means(self):
+        # Shrid a covers cell 10 fully and cell 11 by a quarter; shrid b covers cell 11 by half
+        area_weights = AreaWeights(np.array([0, 2, 3, 3]), lattice.pack([1, 1, 1], [10, 11, 11]),
+                                   np.array([1.0, 0.25, 0.5]))
+        self.write_results("results_1.csv", np.array([1, 1]), np.array([10, 11]), np.array([[2.0, 1.0], [6.0, np.nan]]))
+        self.write_results("results_2.csv", np.array([5]), np.array([5]), np.array([[100.0, 100.0]]))
+        for workers in (1, 2):
+            result = stream_weighted_means(self.tmp.name, area_weights, ["a", "b", "c"], chunk_bytes=16,
+                                           workers=workers)
+            self.assertListEqual(result["shrid2"].tolist(), ["a", "b", "c"])
+            np.testing.assert_allclose(result["feature0"][:2], [(2.0 + 0.25 * 6.0) / 1.25, 6.0])
+            np.testing.assert_allclose(result["feature1"][:2], [1.0 / 1.25, 0.0])
+            self.assertTrue(result.iloc[2, 1:].isna().all())
+
+    def test_area_weighted_means(self):
+        shrid_file = os.path.join(self.tmp.name, "shrids.csv")
+        polygons = [box(78.0, 20.0, 78.02, 20.02), box(78.01, 20.0, 78.03, 20.01)]
+        pd.DataFrame({
+            "shrid2": ["11-1", "11-2"],
+            "polygon_coordinates": [str(list(p.exterior.coords)) for p in polygons],
+        }).to_csv(shrid_file, index=False)
+        rows, cols = lattice.bbox_cells(2000, 2002, 7800, 7803)
+        values = np.arange(len(rows), dtype=float)[:, None]
+        results = self.write_results("results.csv", rows, cols, values)
+
+        cache_dir = os.path.join(self.tmp.name, "geometry")
+        result = area_weighted_means(results, shrid_file, geometry_cache=cache_dir)
+        # Both boxes are aligned to the lattice, so this is a plain mean over their cells
+        np.testing.assert_allclose(result["feature0"], [np.mean([0, 1, 3, 4]), np.mean([1, 2])])
+        self.assertTrue(any(".weights_" in name for name in os.listdir(cache_dir)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -68,6 +68,36 @@ class TestFeatureAverager(unittest.TestCase):
         expected_df = pd.DataFrame(expected_data)
         pd.testing.assert_frame_equal(saved_df, expected_df)
 
+    def test_stream_averages(self):
+        self.averager.stream_averages()
+
+        expected_data = {
+            'shrid2': [1, 2],
+            'feature1': [10.0, 5.0],
+            'feature2': [12.5, 2.5],
+            'feature3': [7.5, 30.0],
+        }
+        expected_df = pd.DataFrame(expected_data)
+
+        pd.testing.assert_frame_equal(self.averager.average_features_df, expected_df)
+        self.assertListEqual(self.averager.feature_columns, ['feature1', 'feature2', 'feature3'])
+
+    def test_calculate_statistics(self):
+        self.averager.load_data()
+        self.averager.fill_missing_values()
+        self.averager.identify_feature_columns()
+        self.averager.calculate_statistics()
+
+        stats = self.averager.statistics_df
+        self.assertListEqual(stats['count'].tolist(), [2, 2])
+        self.assertListEqual(stats['feature1_mean'].tolist(), [10.0, 5.0])
+        self.assertListEqual(stats['feature1_var'].tolist(), [50.0, 50.0])
+        self.assertListEqual(stats['feature2_min'].tolist(), [0.0, 0.0])
+        self.assertListEqual(stats['feature3_max'].tolist(), [15.0, 35.0])
+
+        self.averager.stream_statistics()
+        pd.testing.assert_frame_equal(self.averager.statistics_df, stats)
+
     def tearDown(self):
         # Clean up any created files
         if os.path.exists(self.file_path):
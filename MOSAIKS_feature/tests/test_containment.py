@@ -0,0 +1,37 @@
+import unittest
+import numpy as np
+from shapely.geometry import Polygon, Point
+from src.MOSAIKS_feature.containment import contains_points, contains_points_many
+
+
+class TestContainment(unittest.TestCase):
+
+    def setUp(self):
+        # Irregular, non-convex polygon with a vertex sitting on a lattice point
+        self.polygon = Polygon([
+            (30.0, 10.0), (30.2, 10.005), (30.115, 10.1), (30.2, 10.2), (30.0, 10.2), (30.05, 10.1)
+        ])
+        x_grid, y_grid = np.meshgrid(np.arange(29.995, 30.21, 0.005), np.arange(9.995, 10.21, 0.005))
+        self.lons = x_grid.flatten()
+        self.lats = y_grid.flatten()
+
+    def test_contains_points_matches_loop(self):
+        expected = [self.polygon.contains(Point(x, y)) for x, y in zip(self.lons, self.lats)]
+        mask = contains_points(self.polygon, self.lons, self.lats)
+        self.assertListEqual(mask.tolist(), expected)
+
+    def test_boundary_points_excluded(self):
+        mask = contains_points(self.polygon, [30.0, 30.1, 30.1], [10.0, 10.2, 10.15])
+        self.assertListEqual(mask.tolist(), [False, False, True])
+
+    def test_contains_points_many(self):
+        square = Polygon([(40.0, 20.0), (40.2, 20.0), (40.2, 20.2), (40.0, 20.2)])
+        polygons = [self.polygon, square]
+        lons = [30.1, 30.1, 40.1, 30.1]
+        lats = [10.15, 10.15, 20.1, 20.1]
+        mask = contains_points_many(polygons, [0, 1, 1, 1], lons, lats)
+        self.assertListEqual(mask.tolist(), [True, False, True, False])
+
+
+if __name__ == "__main__":
+    unittest.main()
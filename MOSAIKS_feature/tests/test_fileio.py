@@ -0,0 +1,33 @@
+import unittest
+import json
+import os
+import tempfile
+import numpy as np
+from src.MOSAIKS_feature import fileio
+
+
+class TestFileIO(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_write_array_replaces_file(self):
+        path = os.path.join(self.tmp.name, "values.npy")
+        fileio.write_array(path, np.arange(3))
+        fileio.write_array(path, np.arange(5.0))
+        np.testing.assert_array_equal(np.load(path), np.arange(5.0))
+        self.assertListEqual(os.listdir(self.tmp.name), ["values.npy"])
+
+    def test_write_json(self):
+        path = os.path.join(self.tmp.name, "manifest.json")
+        fileio.write_json(path, {"version": 1, "files": ["a.csv"]})
+        with open(path) as f:
+            self.assertDictEqual(json.load(f), {"version": 1, "files": ["a.csv"]})
+        self.assertListEqual(os.listdir(self.tmp.name), ["manifest.json"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+import numpy as np
+import pandas as pd
+from src.MOSAIKS_feature.fingerprint import FingerprintCounts, HyperLogLog, row_fingerprints
+
+
+class TestFingerprints(unittest.TestCase):
+
+    def test_int_and_float_hash_alike(self):
+        ints = pd.DataFrame({"a": [1, 2], "b": ["x", "y"]})
+        floats = pd.DataFrame({"a": [1.0, 2.0], "b": ["x", "y"]}, index=[5, 6])
+        np.testing.assert_array_equal(row_fingerprints(ints), row_fingerprints(floats))
+        self.assertNotEqual(row_fingerprints(ints)[0], row_fingerprints(ints)[1])
+
+    def test_counts_match_pandas(self):
+        rng = np.random.default_rng(0)
+        data = pd.DataFrame({"Lat": rng.integers(0, 30, 5000) / 100, "Lon": rng.integers(0, 30, 5000) / 100})
+        counts = FingerprintCounts()
+        for start in range(0, len(data), 700):
+            counts.add(row_fingerprints(data.iloc[start:start + 700]))
+        self.assertEqual(counts.distinct(), len(data.drop_duplicates()))
+        self.assertEqual(counts.duplicates(), data.duplicated(keep=False).sum())
+        self.assertEqual(FingerprintCounts().duplicates(), 0)
+
+
+class TestHyperLogLog(unittest.TestCase):
+
+    def test_estimates(self):
+        for n in (0, 100, 200000):
+            hll = HyperLogLog()
+            fingerprints = row_fingerprints(pd.DataFrame({"id": np.arange(n)}))
+            # Adding every row twice does not change the estimate
+            hll.add(fingerprints)
+            hll.add(fingerprints)
+            self.assertAlmostEqual(hll.count(), n, delta=0.03 * n + 1)
+
+    def test_merge(self):
+        a, b, both = HyperLogLog(12), HyperLogLog(12), HyperLogLog(12)
+        fingerprints = row_fingerprints(pd.DataFrame({"id": np.arange(50000)}))
+        a.add(fingerprints[:30000])
+        b.add(fingerprints[20000:])
+        both.add(fingerprints)
+        a.merge(b)
+        self.assertEqual(a.count(), both.count())
+        with self.assertRaises(ValueError):
+            HyperLogLog(20)
+
+
+if __name__ == '__main__':
+    unittest.main()
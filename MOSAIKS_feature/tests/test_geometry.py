@@ -0,0 +1,146 @@
+import unittest
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from shapely.geometry import Polygon
+from src.MOSAIKS_feature import geometry
+
+
+class TestParseCoordinates(unittest.TestCase):
+
+    def test_matches_eval(self):
+        strings = [
+            "[(30.0, 10.0), (30.2, 10.0), (30.2, 10.2), (30.0, 10.2), (30.0, 10.0)]",
+            "[(-130.1234, -60.2345), (-130.1234, -60.4345), (-130.3234, -60.4345)]",
+            "[(1e-3,2.5E+1), (3,4), (5,6)]",
+        ]
+        coords, offsets = geometry.parse_coordinates(strings)
+        self.assertListEqual(offsets.tolist(), [0, 5, 8, 11])
+        for i, s in enumerate(strings):
+            np.testing.assert_array_equal(coords[offsets[i]:offsets[i + 1]], np.array(eval(s), dtype=float))
+
+    def test_rejects_code_and_malformed_input(self):
+        for bad in ["Invalid input", "[(__import__('os').getcwd(), 1)]", "[(1, 2, 3)]", "[(1, 2), (3)]", "[]",
+                    "[(nan, 1), (2, 2), (3, 1)]"]:
+            with self.assertRaises(ValueError):
+                geometry.parse_coordinates([bad])
+
+    def test_parse_polygon(self):
+        polygon = geometry.parse_polygon("[(0,0), (0,2), (2,2), (2,0)]")
+        self.assertIsInstance(polygon, Polygon)
+        self.assertEqual(polygon.area, 4)
+
+    def test_polygons_from_arrays(self):
+        strings = ["[(0,0), (0,2), (2,2), (2,0)]", "[(5,5), (6,5), (6,6), (5,5)]"]
+        polygons = geometry.polygons_from_arrays(*geometry.parse_coordinates(strings))
+        self.assertEqual(len(polygons), 2)
+        for polygon, s in zip(polygons, strings):
+            self.assertTrue(polygon.equals(Polygon(eval(s))))
+
+    def test_take_polygons(self):
+        strings = ["[(0,0), (0,2), (2,2)]", "[(5,5), (6,5), (6,6), (5,6)]", "[(9,9), (8,9), (8,8)]"]
+        coords, offsets = geometry.parse_coordinates(strings)
+        taken_coords, taken_offsets = geometry.take_polygons(coords, offsets, [2, 0])
+        expected_coords, expected_offsets = geometry.parse_coordinates([strings[2], strings[0]])
+        np.testing.assert_array_equal(taken_coords, expected_coords)
+        np.testing.assert_array_equal(taken_offsets, expected_offsets)
+
+    def test_bounds_and_centroids_match_shapely(self):
+        strings = [
+            "[(77.51, 12.93), (77.53, 12.93), (77.53, 12.96), (77.51, 12.95), (77.51, 12.93)]",
+            "[(0,0), (4,0), (4,1), (1,1), (1,4), (0,4)]",
+            "[(-70.3, -33.4), (-70.1, -33.5), (-70.2, -33.2)]",
+        ]
+        coords, offsets = geometry.parse_coordinates(strings)
+        polygons = [Polygon(eval(s)) for s in strings]
+        np.testing.assert_array_equal(geometry.polygon_bounds(coords, offsets), [p.bounds for p in polygons])
+        np.testing.assert_allclose(geometry.polygon_centroids(coords, offsets),
+                                   [(p.centroid.x, p.centroid.y) for p in polygons], rtol=0, atol=1e-12)
+
+    def test_degenerate_centroids_match_shapely(self):
+        # Zero area falls back to the centre of the boundary, zero length to the mean vertex
+        strings = ["[(0,0), (2,0), (6,0)]", "[(3,3), (3,3), (3,3)]"]
+        coords, offsets = geometry.parse_coordinates(strings)
+        expected = [(p.centroid.x, p.centroid.y) for p in (Polygon(eval(s)) for s in strings)]
+        np.testing.assert_allclose(geometry.polygon_centroids(coords, offsets), expected)
+
+
+class TestLoadPolygonArrays(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.csv_file = os.path.join(self.tmp.name, "shrids.csv")
+        pd.DataFrame({
+            "shrid2": ["a", "b"],
+            "polygon_coordinates": ["[(0,0), (0,2), (2,2), (2,0)]", "[(5,5), (6,5), (6,6)]"],
+        }).to_csv(self.csv_file, index=False)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_not_cached_without_cache_dir(self):
+        coords, offsets = geometry.load_polygon_arrays(self.csv_file)
+        self.assertNotIsInstance(coords, np.memmap)
+        self.assertListEqual(list(offsets), [0, 4, 7])
+        self.assertListEqual(os.listdir(self.tmp.name), ["shrids.csv"])
+
+    def test_writes_and_reuses_sidecar(self):
+        cache_dir = os.path.join(self.tmp.name, "cache")
+        coords, offsets = geometry.load_polygon_arrays(self.csv_file, cache_dir=cache_dir)
+        self.assertEqual(len([name for name in os.listdir(cache_dir) if name.endswith(".npy")]), 2)
+
+        cached_coords, cached_offsets = geometry.load_polygon_arrays(self.csv_file, cache_dir=cache_dir)
+        self.assertIsInstance(cached_coords, np.memmap)
+        np.testing.assert_array_equal(cached_coords, coords)
+        np.testing.assert_array_equal(cached_offsets, offsets)
+
+    def test_changed_source_replaces_only_its_own_sidecar(self):
+        cache_dir = os.path.join(self.tmp.name, "cache")
+        other_file = os.path.join(self.tmp.name, "other.csv")
+        pd.DataFrame({"polygon_coordinates": ["[(7,7), (7,9), (9,9)]"]}).to_csv(other_file, index=False)
+        geometry.load_polygon_arrays(other_file, cache_dir=cache_dir)
+        geometry.load_polygon_arrays(self.csv_file, cache_dir=cache_dir)
+        # Arrays of other stages stored in the same directory
+        for name in ("0123.prefilter.npy", "0123.weights_values.npy"):
+            np.save(os.path.join(cache_dir, name), np.zeros(1))
+        before = set(os.listdir(cache_dir))
+
+        pd.DataFrame({"polygon_coordinates": ["[(1,1), (1,3), (3,3)]"]}).to_csv(self.csv_file, index=False)
+        coords, offsets = geometry.load_polygon_arrays(self.csv_file, cache_dir=cache_dir)
+        self.assertListEqual(offsets.tolist(), [0, 3])
+        after = set(os.listdir(cache_dir))
+        self.assertEqual(len(before - after), 2)
+        self.assertEqual(len(after - before), 2)
+        self.assertTrue({"0123.prefilter.npy", "0123.weights_values.npy", geometry.SOURCES} <= after)
+        other_coords, _ = geometry.load_polygon_arrays(other_file, cache_dir=cache_dir)
+        self.assertIsInstance(other_coords, np.memmap)
+
+    def test_shared_content_is_not_removed(self):
+        # Two files with the same content share one key, which stays while either still uses it
+        cache_dir = os.path.join(self.tmp.name, "cache")
+        copy_file = os.path.join(self.tmp.name, "copy.csv")
+        shutil.copy(self.csv_file, copy_file)
+        geometry.load_polygon_arrays(self.csv_file, cache_dir=cache_dir)
+        geometry.load_polygon_arrays(copy_file, cache_dir=cache_dir)
+        pd.DataFrame({"polygon_coordinates": ["[(1,1), (1,3), (3,3)]"]}).to_csv(self.csv_file, index=False)
+        geometry.load_polygon_arrays(self.csv_file, cache_dir=cache_dir)
+
+        coords, _ = geometry.load_polygon_arrays(copy_file, cache_dir=cache_dir)
+        self.assertIsInstance(coords, np.memmap)
+
+    def test_series_cached_only_with_cache_dir(self):
+        series = pd.read_csv(self.csv_file)["polygon_coordinates"]
+        coords, _ = geometry.load_polygon_arrays(series)
+        self.assertNotIsInstance(coords, np.memmap)
+
+        cache_dir = os.path.join(self.tmp.name, "cache")
+        geometry.load_polygon_arrays(series, cache_dir=cache_dir)
+        coords, offsets = geometry.load_polygon_arrays(series, cache_dir=cache_dir)
+        self.assertIsInstance(coords, np.memmap)
+        self.assertListEqual(list(offsets), [0, 4, 7])
+
+
+if __name__ == "__main__":
+    unittest.main()
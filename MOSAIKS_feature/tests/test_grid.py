@@ -0,0 +1,121 @@
+import unittest
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from shapely.geometry import Polygon, Point
+from src.MOSAIKS_feature import lattice
+from src.MOSAIKS_feature.grid import (
+    estimate_costs, split_work_units, generate_grid_cells, iter_grid_cells,
+    iter_coordinate_frames, write_coordinate_chunks
+)
+from tests.helpers import make_shrids
+
+
+class TestGrid(unittest.TestCase):
+
+    def setUp(self):
+        self.data = make_shrids(40)
+
+    def test_split_work_units_contiguous(self):
+        costs = estimate_costs(self.data)
+        units = split_work_units(costs, 6)
+        self.assertEqual(units[0][0], 0)
+        self.assertEqual(units[-1][1], len(self.data))
+        for (_, stop), (start, _) in zip(units[:-1], units[1:]):
+            self.assertEqual(stop, start)
+
+    def test_split_work_units_balanced(self):
+        units = split_work_units(np.ones(100), 4)
+        self.assertListEqual(units, [(0, 25), (25, 50), (50, 75), (75, 100)])
+
+    def test_cells_match_point_loop(self):
+        positions, rows, cols = generate_grid_cells(self.data, inside_polygon=True)
+        row = self.data.iloc[3]
+        polygon = Polygon(eval(row["polygon_coordinates"]))
+        lons = np.arange(round(row["min_lon"], 2) + 0.005, row["max_lon"], 0.01)
+        lats = np.arange(round(row["min_lat"], 2) + 0.005, row["max_lat"], 0.01)
+        expected = [(lat, lon) for lat in lats for lon in lons if polygon.contains(Point(lon, lat))]
+
+        mask = positions == 3
+        got = list(zip(lattice.to_degrees(rows[mask]), lattice.to_degrees(cols[mask])))
+        np.testing.assert_allclose(got, expected if expected else np.empty((0, 2)))
+
+    def test_parallel_matches_serial(self):
+        serial = generate_grid_cells(self.data, inside_polygon=True, workers=1)
+        parallel = generate_grid_cells(self.data, inside_polygon=True, workers=2)
+        for a, b in zip(serial, parallel):
+            np.testing.assert_array_equal(a, b)
+        # Results come back in the original shrid order
+        self.assertTrue(np.all(np.diff(serial[0]) >= 0))
+
+    def test_scanline_method_matches_prepared(self):
+        prepared = generate_grid_cells(self.data, inside_polygon=True, method="prepared")
+        scanline = generate_grid_cells(self.data, inside_polygon=True, workers=2, method="scanline")
+        for a, b in zip(prepared, scanline):
+            np.testing.assert_array_equal(a, b)
+
+    def test_prefilter_method_matches_prepared(self):
+        data = make_shrids(20, seed=3, max_vertices=500)
+        prepared = generate_grid_cells(data, inside_polygon=True, method="prepared")
+        prefiltered = generate_grid_cells(data, inside_polygon=True, workers=2, method="prefilter")
+        for a, b in zip(prepared, prefiltered):
+            np.testing.assert_array_equal(a, b)
+
+    def test_quadtree_method_matches_prepared(self):
+        prepared = generate_grid_cells(self.data, inside_polygon=True, method="prepared")
+        quadtree = generate_grid_cells(self.data, inside_polygon=True, method="quadtree")
+        for a, b in zip(prepared, quadtree):
+            np.testing.assert_array_equal(a, b)
+
+    def test_unknown_method(self):
+        with self.assertRaises(ValueError):
+            generate_grid_cells(self.data, method="bogus")
+
+    def test_iter_grid_cells_extent_mode(self):
+        batches = list(iter_grid_cells(self.data, inside_polygon=False, workers=1))
+        positions = np.concatenate([b[0] for b in batches])
+        rows = np.concatenate([b[1] for b in batches])
+        lats = lattice.to_degrees(rows)
+        self.assertTrue(np.all(lats >= self.data["min_lat"].to_numpy()[positions]))
+        self.assertTrue(np.all(lats <= self.data["max_lat"].to_numpy()[positions]))
+
+
+class TestWriteCoordinateChunks(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.prefix = os.path.join(self.tmp.name, "file_coordinates")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def frames(self, sizes):
+        start = 0
+        for size in sizes:
+            yield pd.DataFrame({"shrid2": np.arange(start, start + size), "Lon": 0.005, "Lat": 0.005})
+            start += size
+
+    def test_exact_multiple_has_no_empty_file(self):
+        filenames = write_coordinate_chunks(self.frames([3, 4, 0, 3]), chunk_size=5, prefix=self.prefix)
+        self.assertEqual(len(filenames), 2)
+        self.assertListEqual(sorted(os.listdir(self.tmp.name)), ["file_coordinates_1.csv", "file_coordinates_2.csv"])
+
+    def test_rows_preserved_across_frames(self):
+        filenames = write_coordinate_chunks(self.frames([7, 1, 9]), chunk_size=4, prefix=self.prefix)
+        chunks = [pd.read_csv(f) for f in filenames]
+        self.assertListEqual([len(c) for c in chunks], [4, 4, 4, 4, 1])
+        self.assertListEqual(pd.concat(chunks)["shrid2"].tolist(), list(range(17)))
+
+    def test_streams_generated_grid(self):
+        data = make_shrids(20)
+        filenames = write_coordinate_chunks(iter_coordinate_frames(data), chunk_size=500, prefix=self.prefix)
+        written = pd.concat([pd.read_csv(f) for f in filenames], ignore_index=True)
+        positions, rows, cols = generate_grid_cells(data)
+        self.assertEqual(len(written), len(positions))
+        self.assertTrue(all(len(pd.read_csv(f)) == 500 for f in filenames[:-1]))
+        np.testing.assert_allclose(written["Lat"], np.round(lattice.to_degrees(rows), 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+import json
+import os
+import re
+import tempfile
+import numpy as np
+import pandas as pd
+from shapely.geometry import Point, Polygon
+from src.MOSAIKS_feature.analysis.img_generation_heatmap import generate_heatmaps
+from src.MOSAIKS_feature.pca import StreamingPCA
+
+
+def heatmap_points(html_file):
+    """Return the [lat, lon, weight] rows of the heat layer in a saved folium map."""
+    with open(html_file) as f:
+        match = re.search(r"L\.heatLayer\(\s*(\[.*?\]\]),", f.read(), re.S)
+    return json.loads(match.group(1))
+
+
+class TestGenerateHeatmaps(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.polygons = {
+            "a": "[(0,0), (0,1), (1,1), (1,0)]",
+            "b": "[(5,5), (5,6), (6,6), (6,5)]",
+            "c": "[(10,10), (10,11), (11,11), (11,10)]",
+        }
+        rng = np.random.default_rng(0)
+        # Rows of the shrids are interleaved; 'c' has no point inside its polygon
+        shrids = rng.choice(["a", "b", "c"], 300)
+        offset = np.array([{"a": 0.0, "b": 5.0, "c": 12.0}[s] for s in shrids])
+        self.data = pd.DataFrame({
+            "shrid2": shrids,
+            "Lat_x": offset + rng.uniform(-0.5, 1.5, 300),
+            "Lon_x": offset + rng.uniform(-0.5, 1.5, 300),
+            "polygon_coordinates": [self.polygons[s] for s in shrids],
+            "feature_1": rng.normal(size=300),
+            "feature_2": rng.normal(size=300),
+        })
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_points_grouped_by_shrid(self):
+        generate_heatmaps(self.data, self.tmp.name)
+        self.assertListEqual(sorted(os.listdir(self.tmp.name)),
+                             ["polygon_with_heatmap_a.html", "polygon_with_heatmap_b.html"])
+        for shrid in ["a", "b"]:
+            polygon = Polygon(eval(self.polygons[shrid]))
+            rows = self.data[self.data["shrid2"] == shrid]
+            inside = [polygon.contains(Point(lon, lat)) for lat, lon in zip(rows["Lat_x"], rows["Lon_x"])]
+            expected = rows.loc[inside, ["Lat_x", "Lon_x"]].to_numpy()
+            points = np.array(heatmap_points(os.path.join(self.tmp.name, f"polygon_with_heatmap_{shrid}.html")))
+            # Points keep their original row order within the shrid
+            np.testing.assert_allclose(points[:, :2], expected)
+
+    def test_saved_pca_model(self):
+        # A model fitted elsewhere is applied to the points inside each polygon without refitting
+        features = self.data[["feature_1", "feature_2"]].to_numpy()
+        model = StreamingPCA(1, ["feature_1", "feature_2"]).partial_fit(features[::-1] * 2)
+        model_dir = os.path.join(self.tmp.name, "model")
+        model.save(model_dir)
+        output_folder = os.path.join(self.tmp.name, "maps")
+
+        generate_heatmaps(self.data, output_folder, pca_model=model_dir)
+        self.assertNotIn("PCA_1", self.data.columns)
+        polygon = Polygon(eval(self.polygons["b"]))
+        rows = self.data[self.data["shrid2"] == "b"]
+        inside = [polygon.contains(Point(lon, lat)) for lat, lon in zip(rows["Lat_x"], rows["Lon_x"])]
+        expected = model.transform(rows.loc[inside, ["feature_1", "feature_2"]].to_numpy())[:, 0]
+        points = np.array(heatmap_points(os.path.join(output_folder, "polygon_with_heatmap_b.html")))
+        np.testing.assert_allclose(points[:, 2], expected, rtol=1e-6)
+
+    def test_saved_pca_model_needs_matching_features(self):
+        model_dir = os.path.join(self.tmp.name, "model")
+        StreamingPCA(1, ["x", "y", "z"]).partial_fit(np.eye(3)).save(model_dir)
+        with self.assertRaises(ValueError):
+            generate_heatmaps(self.data, self.tmp.name, pca_model=model_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from src.MOSAIKS_feature import join, lattice
+from src.MOSAIKS_feature.aggregate import stream_group_means
+from src.MOSAIKS_feature.upload import plan_uploads
+from tests.helpers import overlapping_shrids
+
+
+class TestPointIndex(unittest.TestCase):
+
+    def setUp(self):
+        # Point (2000, 7800) is shared by shrids 'a' and 'b'
+        keys = lattice.pack([2000, 2000, 2000, 2001], [7800, 7800, 7801, 7800])
+        self.index = join.PointIndex(keys, ["a", "b", "b", "c"])
+
+    def test_snapping_tolerates_rounding(self):
+        keys = join.snap_keys([20.005, 20.0049999, 20.00500001, 20.009], [78.005, 78.005, 78.0051, 78.0])
+        self.assertEqual(len(set(keys.tolist())), 1)
+        self.assertEqual(keys[0], lattice.pack(2000, 7800))
+
+    def test_shared_and_unknown_points(self):
+        rows, shrids = self.index.join([20.015, 20.005, 19.0, 20.005, np.nan], [78.005, 78.005, 78.005, 78.015, 78.0])
+        self.assertListEqual(rows.tolist(), [0, 1, 1, 3])
+        self.assertListEqual(shrids.tolist(), ["c", "a", "b", "b"])
+        self.assertEqual(len(self.index), 3)
+
+    def test_hash_fallback_matches_table(self):
+        rng = np.random.default_rng(0)
+        rows = rng.integers(1000, 1040, 300)
+        cols = rng.integers(7000, 7040, 300)
+        dense = join.PointIndex(lattice.pack(rows, cols), np.arange(300))
+        sparse = join.PointIndex(lattice.pack(rows * 100, cols), np.arange(300))
+        self.assertIsNotNone(dense._table)
+        self.assertIsNone(sparse._table)
+        query_rows = rng.integers(990, 1050, 1000)
+        query_cols = rng.integers(6990, 7050, 1000)
+        expected = dense.lookup(lattice.pack(query_rows, query_cols))
+        result = sparse.lookup(lattice.pack(query_rows * 100, query_cols))
+        for a, b in zip(result, expected):
+            np.testing.assert_array_equal(a, b)
+
+    def test_attach_shrids(self):
+        results = pd.DataFrame({"Lat": [20.005, 20.015, 25.0], "Lon": [78.005, 78.005, 78.0], "X_0": [1.0, 2.0, 3.0]})
+        joined = join.attach_shrids(results, self.index)
+        self.assertListEqual(list(joined.columns), ["shrid2", "Lat", "Lon", "X_0"])
+        self.assertListEqual(joined["shrid2"].tolist(), ["a", "b", "c"])
+        self.assertListEqual(joined["X_0"].tolist(), [1.0, 1.0, 2.0])
+
+
+class TestJoinResults(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.mapping_file = os.path.join(self.tmp.name, "point_shrids.csv")
+        self.data = overlapping_shrids()
+        self.report = plan_uploads(self.data, inside_polygon=False, prefix=os.path.join(self.tmp.name, "coords"),
+                                   mapping_file=self.mapping_file)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_mapping_and_grid_indexes_agree(self):
+        from_mapping = join.PointIndex.from_mapping(self.mapping_file)
+        from_shrids = join.PointIndex.from_shrids(self.data, inside_polygon=False)
+        self.assertEqual(len(from_mapping), self.report["unique_points"])
+        uploads = pd.concat([pd.read_csv(f) for f in self.report["files"]])
+        rows, shrids = from_mapping.join(uploads["Lat"], uploads["Lon"])
+        expected_rows, expected_shrids = from_shrids.join(uploads["Lat"], uploads["Lon"])
+        self.assertEqual(len(rows), self.report["points"])
+        self.assertEqual(sorted(zip(rows, shrids)), sorted(zip(expected_rows, expected_shrids)))
+
+    def test_aggregate_results_without_shrids(self):
+        # MOSAIKS returns the uploaded points, rounded, with their features and no shrid column
+        uploads = pd.concat([pd.read_csv(f) for f in self.report["files"]], ignore_index=True)
+        rng = np.random.default_rng(1)
+        results = uploads.assign(**{f"X_{i}": rng.normal(size=len(uploads)) for i in range(3)})
+        results_file = os.path.join(self.tmp.name, "results.csv")
+        results.to_csv(results_file, index=False, float_format="%.6f")
+
+        index = join.PointIndex.from_mapping(self.mapping_file)
+        means = stream_group_means(results_file, index=index)
+        expected = join.attach_shrids(pd.read_csv(results_file), index).groupby("shrid2")[["X_0", "X_1", "X_2"]].mean()
+        self.assertListEqual(means["shrid2"].tolist(), expected.index.tolist())
+        np.testing.assert_allclose(means[["X_0", "X_1", "X_2"]].to_numpy(), expected.to_numpy())
+        self.assertEqual(len(means), len(self.data))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+import numpy as np
+from src.MOSAIKS_feature import lattice
+
+
+class TestLattice(unittest.TestCase):
+
+    def test_cell_bounds_matches_rounded_centers(self):
+        # Centers run from round(min, 2) + 0.005 to round(max, 2) - 0.005
+        start, stop = lattice.cell_bounds(25.197965, 25.278901)
+        centers = lattice.to_degrees(np.arange(start, stop))
+        self.assertEqual(len(centers), 8)
+        self.assertAlmostEqual(centers[0], 25.205)
+        self.assertAlmostEqual(centers[-1], 25.275)
+
+    def test_cell_bounds_vectorized(self):
+        start, stop = lattice.cell_bounds([10.0, -5.004], [10.2, -4.996])
+        self.assertEqual(start.dtype, np.int32)
+        self.assertListEqual(start.tolist(), [1000, -500])
+        self.assertListEqual(stop.tolist(), [1020, -500])
+
+    def test_bbox_cells_row_major(self):
+        rows, cols = lattice.bbox_cells(10, 12, 5, 8)
+        self.assertListEqual(rows.tolist(), [10, 10, 10, 11, 11, 11])
+        self.assertListEqual(cols.tolist(), [5, 6, 7, 5, 6, 7])
+
+    def test_bbox_cells_empty(self):
+        rows, cols = lattice.bbox_cells(10, 10, 5, 8)
+        self.assertEqual(len(rows), 0)
+        self.assertEqual(len(cols), 0)
+
+    def test_to_index_round_trip(self):
+        index = np.array([-18000, -1, 0, 1234, 17999], dtype=np.int32)
+        np.testing.assert_array_equal(lattice.to_index(lattice.to_degrees(index)), index)
+
+    def test_pack_unpack(self):
+        rows = np.array([-9000, -1, 0, 2345, 8999], dtype=np.int32)
+        cols = np.array([17999, -18000, -1, 7712, 0], dtype=np.int32)
+        keys = lattice.pack(rows, cols)
+        self.assertEqual(keys.dtype, np.int64)
+        self.assertEqual(len(np.unique(keys)), len(keys))
+        unpacked_rows, unpacked_cols = lattice.unpack(keys)
+        np.testing.assert_array_equal(unpacked_rows, rows)
+        np.testing.assert_array_equal(unpacked_cols, cols)
+
+
+if __name__ == "__main__":
+    unittest.main()
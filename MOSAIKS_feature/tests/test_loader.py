@@ -0,0 +1,96 @@
+import unittest
+import importlib.util
+import os
+import tempfile
+import warnings
+import numpy as np
+import pandas as pd
+from src.MOSAIKS_feature import loader
+
+
+class TestLoader(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmp.name, "results.csv")
+        self.data = pd.DataFrame({
+            "Unnamed: 0": [0, 1, 2, 3],
+            "shrid2": ["11-a", "11-a", "11-b", "11-c"],
+            "Lat": [20.005, 20.015, 20.025, 20.035],
+            "Lon": [78.005, 78.015, 78.025, 78.035],
+            "X_0": [0.1, 0.2, np.nan, 0.4],
+            "X_1": [1.0, 2.0, 3.0, 4.0],
+            "X_2": [-1.5, 0.0, 1.5, 1e-3],
+        })
+        self.data.to_csv(self.file_path, index=False)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_column_dtypes(self):
+        dtypes = loader.column_dtypes(self.data.columns)
+        self.assertEqual(dtypes["shrid2"], "category")
+        self.assertIs(dtypes["Lat"], np.float64)
+        self.assertTrue(all(dtypes[f"X_{i}"] is np.float32 for i in range(3)))
+        self.assertNotIn("Unnamed: 0", dtypes)
+        self.assertNotIn("shrid2", loader.column_dtypes(self.data.columns, categorical=False))
+        self.assertNotIn("X_0", loader.column_dtypes(self.data.columns, features=("X_1",)))
+
+    def test_load_csv_types_and_values(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            df = loader.load_csv(self.file_path)
+        self.assertListEqual(list(df.columns), list(self.data.columns))
+        self.assertIsInstance(df["shrid2"].dtype, pd.CategoricalDtype)
+        self.assertListEqual(df["shrid2"].astype(str).tolist(), self.data["shrid2"].tolist())
+        self.assertEqual(df["Lat"].dtype, np.float64)
+        np.testing.assert_array_equal(df["Lat"], self.data["Lat"])
+        self.assertEqual(df["Unnamed: 0"].dtype, np.int64)
+        for column in ("X_0", "X_1", "X_2"):
+            self.assertEqual(df[column].dtype, np.float32)
+            np.testing.assert_array_equal(df[column], self.data[column].astype(np.float32))
+
+    def test_load_csv_prunes_columns(self):
+        df = loader.load_csv(self.file_path, columns=["X_1", "shrid2"], categorical=False)
+        self.assertListEqual(list(df.columns), ["shrid2", "X_1"])
+        self.assertEqual(df["shrid2"].dtype, object)
+        with self.assertRaises(ValueError):
+            loader.load_csv(self.file_path, columns=["shrid2", "X_9"])
+
+    def test_load_csv_without_features(self):
+        df = loader.load_csv(self.file_path, features=(), categorical=False, nrows=2)
+        self.assertEqual(len(df), 2)
+        self.assertEqual(df["X_1"].dtype, np.float64)
+        self.assertEqual(df["Lon"].dtype, np.float64)
+
+    def test_iter_csv_matches_load_csv(self):
+        chunks = list(loader.iter_csv(self.file_path, chunksize=3, feature_dtype=np.float64))
+        self.assertListEqual([len(chunk) for chunk in chunks], [3, 1])
+        whole = loader.load_csv(self.file_path, feature_dtype=np.float64, categorical=False)
+        combined = pd.concat(chunks, ignore_index=True)
+        combined["shrid2"] = combined["shrid2"].astype(str)
+        pd.testing.assert_frame_equal(combined, whole)
+
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow is not installed")
+    def test_engines_match(self):
+        rng = np.random.default_rng(0)
+        data = pd.DataFrame(rng.normal(size=(200, 20)), columns=[f"X_{i}" for i in range(20)])
+        data[data > 1.5] = np.nan
+        data.insert(0, "note", rng.choice(["a", "b,c", 'say "d"', "NA", None], 200))
+        data.insert(0, "count", rng.choice([1.0, 2.0, np.nan], 200))
+        data.insert(0, "Lon", rng.uniform(70, 90, 200))
+        data.insert(0, "shrid2", rng.choice(["11-a", "11-b", "11-c", None], 200))
+        # The unnamed index column is read back as 'Unnamed: 0'
+        data.to_csv(self.file_path)
+        features = [f"X_{i}" for i in range(20)]
+        for options in [{}, {"categorical": False}, {"columns": ["X_3", "shrid2", "note"]},
+                        {"feature_dtype": np.float64}]:
+            with self.subTest(**options):
+                pd.testing.assert_frame_equal(
+                    loader.load_csv(self.file_path, features=features, engine="pyarrow", **options),
+                    loader.load_csv(self.file_path, features=features, engine="c", **options))
+
+
+if __name__ == '__main__':
+    unittest.main()
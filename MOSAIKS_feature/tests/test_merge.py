@@ -0,0 +1,92 @@
+import unittest
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from src.MOSAIKS_feature import merge
+from src.MOSAIKS_feature.merge import partitioned_merge, plan_partitions
+
+
+class TestPartitionedMerge(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        n = 3000
+        self.left = pd.DataFrame({
+            "shrid2": rng.choice([f"11-{i:04d}" for i in range(400)] + [np.nan], n),
+            "year": rng.integers(2010, 2013, n),
+            "value": rng.normal(size=n),
+            "label": rng.choice(["a", "b", "c"], n),
+        })
+        self.right = pd.DataFrame({
+            "year": rng.integers(2010, 2014, 1500),
+            "shrid2": rng.choice([f"11-{i:04d}" for i in range(500)] + [np.nan], 1500),
+            "value": rng.normal(size=1500),
+            "area": rng.uniform(size=1500),
+        })
+        self.file_a = os.path.join(self.tmp.name, "a.csv")
+        self.file_b = os.path.join(self.tmp.name, "b.csv")
+        self.left.to_csv(self.file_a, index=False)
+        self.right.to_csv(self.file_b, index=False)
+        self.output_file = os.path.join(self.tmp.name, "merged.csv")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def expected(self, on_columns):
+        return pd.merge(pd.read_csv(self.file_a), pd.read_csv(self.file_b), on=on_columns, how="inner")
+
+    def test_matches_pandas(self):
+        for on_columns, n_partitions, workers in ((["shrid2", "year"], 7, 1), ("shrid2", 3, 2), (["shrid2"], 1, 1)):
+            rows = partitioned_merge(self.file_a, self.file_b, on_columns, self.output_file,
+                                     n_partitions=n_partitions, workers=workers, tmp_dir=self.tmp.name)
+            expected = self.expected(on_columns)
+            self.assertEqual(rows, len(expected))
+            pd.testing.assert_frame_equal(pd.read_csv(self.output_file), expected)
+        # Partitions are removed afterwards
+        self.assertListEqual(sorted(os.listdir(self.tmp.name)), ["a.csv", "b.csv", "merged.csv"])
+
+    def test_memory_budget_and_chunks(self):
+        # A small budget means many partitions and small chunks; the result does not change
+        n_partitions, chunk_rows = plan_partitions([self.file_a, self.file_b], memory_bytes=100000)
+        self.assertGreater(n_partitions, 5)
+        partitioned_merge(self.file_a, self.file_b, ["shrid2"], self.output_file, memory_bytes=100000)
+        pd.testing.assert_frame_equal(pd.read_csv(self.output_file), self.expected(["shrid2"]))
+
+    def test_final_merge_stays_within_budget(self):
+        # Track the rows of the joined frames held at once by the k-way merge: each reader holds the
+        # frame it yielded last, and the buffers never hold more than those frames
+        held = {}
+        peak = [0]
+        read_frames = merge._read_frames
+
+        def tracked_frames(path):
+            for frame in read_frames(path):
+                if os.path.basename(path).startswith("joined_"):
+                    held[path] = len(frame)
+                    peak[0] = max(peak[0], sum(held.values()))
+                yield frame
+            held.pop(path, None)
+
+        memory_bytes = 200000
+        n_partitions, chunk_rows = merge.plan_partitions([self.file_a, self.file_b], memory_bytes)
+        merge._read_frames = tracked_frames
+        try:
+            rows = partitioned_merge(self.file_a, self.file_b, ["shrid2"], self.output_file, memory_bytes=memory_bytes)
+        finally:
+            merge._read_frames = read_frames
+        self.assertGreater(rows, 2 * chunk_rows)
+        self.assertLessEqual(peak[0], chunk_rows)
+        pd.testing.assert_frame_equal(pd.read_csv(self.output_file), self.expected(["shrid2"]))
+
+    def test_no_matches_and_missing_columns(self):
+        self.right.assign(year=1900).to_csv(self.file_b, index=False)
+        self.assertEqual(partitioned_merge(self.file_a, self.file_b, ["year"], self.output_file), 0)
+        self.assertListEqual(list(pd.read_csv(self.output_file).columns), list(self.expected(["year"]).columns))
+        with self.assertRaises(ValueError):
+            partitioned_merge(self.file_a, self.file_b, ["area"], self.output_file)
+
+
+if __name__ == '__main__':
+    unittest.main()
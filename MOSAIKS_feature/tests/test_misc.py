@@ -1,5 +1,7 @@
 import unittest
 from unittest.mock import patch
+import os
+import tempfile
 import pandas as pd
 from io import StringIO
 from src.MOSAIKS_feature.misc import DuplicateCheck, Merge, Subset, Unique 
@@ -23,23 +25,39 @@ class TestCSVOperations(unittest.TestCase):
             "37.77,-122.41,San Francisco\n"
         ))
 
-    @patch("pandas.read_csv")
-    def test_duplicate_check(self, mock_read_csv):
-        # Mock pandas.read_csv to return test_data
-        mock_read_csv.return_value = self.test_data
-        # Call the DuplicateCheck function
-        num_duplicates = DuplicateCheck.check_duplicates("mock_path.csv", ["Lat", "Lon"])
+    def write_test_data(self, tmp_dir, name="data.csv"):
+        # DuplicateCheck and Unique stream the files in chunks, so they read real files
+        path = os.path.join(tmp_dir, name)
+        self.test_data.to_csv(path, index=False)
+        return path
+
+    def test_duplicate_check(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # Call the DuplicateCheck function
+            num_duplicates = DuplicateCheck.check_duplicates(self.write_test_data(tmp_dir), ["Lat", "Lon"])
         self.assertEqual(num_duplicates, 2, "Number of duplicates should be 2")
 
-    @patch("pandas.read_csv")
-    @patch("pandas.DataFrame.to_csv")
-    def test_merge(self, mock_to_csv, mock_read_csv):
-        # Mock pandas.read_csv for both input files
-        mock_read_csv.side_effect = [self.test_data, self.test_data_b]
-        # Call the Merge function
-        Merge.merge_files("mock_file_a.csv", "mock_file_b.csv", ["Lat", "Lon"], "mock_output.csv")
-        # Ensure to_csv is called once
-        mock_to_csv.assert_called_once()
+    def test_duplicate_check_across_files(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for i in range(2):
+                self.write_test_data(tmp_dir, f"file_coordinates_{i + 1}.csv")
+            pattern = os.path.join(tmp_dir, "file_coordinates_*.csv")
+            num_duplicates = DuplicateCheck.check_duplicates(pattern, ["Lat", "Lon"], chunksize=3)
+            num_distinct = Unique.count_distinct_rows(pattern, ["Lat", "Lon", "Value"], chunksize=3)
+        self.assertEqual(num_duplicates, 8)
+        self.assertEqual(num_distinct, 4)
+
+    def test_merge(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # Merge streams both files through on-disk partitions, so it reads real files
+            file_a = self.write_test_data(tmp_dir, "a.csv")
+            file_b = os.path.join(tmp_dir, "b.csv")
+            self.test_data_b.to_csv(file_b, index=False)
+            output_file = os.path.join(tmp_dir, "merged.csv")
+            # Call the Merge function
+            Merge.merge_files(file_a, file_b, ["Lat", "Lon"], output_file)
+            merged = pd.read_csv(output_file)
+        pd.testing.assert_frame_equal(merged, pd.merge(self.test_data, self.test_data_b, on=["Lat", "Lon"]))
 
     @patch("pandas.read_csv")
     @patch("pandas.DataFrame.to_csv")
@@ -51,13 +69,14 @@ class TestCSVOperations(unittest.TestCase):
         # Ensure to_csv is called once
         mock_to_csv.assert_called_once()
 
-    @patch("pandas.read_csv")
-    def test_unique(self, mock_read_csv):
-        # Mock pandas.read_csv
-        mock_read_csv.return_value = self.test_data
-        # Call the Unique function
-        num_distinct = Unique.count_distinct_rows("mock_path.csv", ["Lat", "Lon"])
+    def test_unique(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = self.write_test_data(tmp_dir)
+            # Call the Unique function
+            num_distinct = Unique.count_distinct_rows(path, ["Lat", "Lon"])
+            approximate = Unique.count_distinct_rows(path, ["Lat", "Lon"], approximate=True)
         self.assertEqual(num_distinct, 3, "Number of distinct rows should be 3")
+        self.assertEqual(approximate, 3)
 
 
 if __name__ == "__main__":
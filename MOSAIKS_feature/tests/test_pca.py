@@ -0,0 +1,86 @@
+import unittest
+import json
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from sklearn.decomposition import PCA
+from src.MOSAIKS_feature import pca
+
+
+def correlated_features(rows, columns, seed=0):
+    rng = np.random.default_rng(seed)
+    return (rng.normal(size=(rows, 8)) @ rng.normal(size=(8, columns)) * 0.1 + 5).astype(np.float32)
+
+
+class TestStreamingPCA(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.X = correlated_features(3000, 40)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_chunked_fit_matches_pca(self):
+        expected = PCA(3).fit(self.X.astype(np.float64))
+        model = pca.StreamingPCA(3)
+        for start in range(0, len(self.X), 700):
+            model.partial_fit(self.X[start:start + 700])
+        np.testing.assert_allclose(model.transform(self.X[:50]), expected.transform(self.X[:50]), atol=1e-6)
+        np.testing.assert_allclose(model.components, expected.components_, atol=1e-7)
+        np.testing.assert_allclose(model.explained_variance, expected.explained_variance_, rtol=1e-6)
+
+    def test_lanczos_matches_full_eigendecomposition(self):
+        full = pca.StreamingPCA(2).partial_fit(self.X)
+        full._solve()
+        original = pca.LANCZOS_FEATURES
+        pca.LANCZOS_FEATURES = 10
+        try:
+            lanczos = pca.StreamingPCA(2).partial_fit(self.X)
+            lanczos._solve()
+        finally:
+            pca.LANCZOS_FEATURES = original
+        np.testing.assert_allclose(lanczos.components, full.components, atol=1e-9)
+
+    def test_fit_files_save_and_load(self):
+        columns = [f"feature_{i}" for i in range(40)]
+        for i, part in enumerate(np.array_split(np.arange(len(self.X)), 2)):
+            frame = pd.DataFrame(self.X[part], columns=columns)
+            frame.insert(0, "Lat", 20.0)
+            frame.insert(1, "Lon", 78.0)
+            frame.to_csv(os.path.join(self.tmp.name, f"results_{i}.csv"), index=False)
+
+        model_dir = os.path.join(self.tmp.name, "model")
+        model = pca.fit_pca(os.path.join(self.tmp.name, "*.csv"), model_dir, n_components=1, chunk_bytes=50_000)
+        self.assertListEqual(model.features, columns)
+        self.assertEqual(model.n_samples, len(self.X))
+        expected = PCA(1).fit(self.X.astype(np.float64)).transform(self.X[:20])
+        loaded = pca.StreamingPCA.load(model_dir)
+        self.assertIsNone(loaded.scatter)
+        np.testing.assert_allclose(loaded.transform(self.X[:20]), expected, atol=1e-5)
+
+    def test_missing_values_count_as_zero(self):
+        X = self.X.copy()
+        X[::7, 3] = np.nan
+        model = pca.StreamingPCA(1).partial_fit(X)
+        np.testing.assert_allclose(model.transform(X[:10]), PCA(1).fit(np.nan_to_num(X)).transform(np.nan_to_num(X[:10])),
+                                   atol=1e-4)
+
+    def test_rejects_other_version_and_single_row(self):
+        model_dir = os.path.join(self.tmp.name, "model")
+        pca.StreamingPCA(1, [str(i) for i in range(40)]).partial_fit(self.X).save(model_dir)
+        manifest_path = os.path.join(model_dir, pca.StreamingPCA.MANIFEST)
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        manifest["version"] = pca.MODEL_VERSION + 1
+        with open(manifest_path, "w") as f:
+            json.dump(manifest, f)
+        with self.assertRaises(ValueError):
+            pca.StreamingPCA.load(model_dir)
+        with self.assertRaises(ValueError):
+            pca.StreamingPCA(1).partial_fit(self.X[:1]).transform(self.X[:1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import os
+import tempfile
+import numpy as np
+import shapely
+from shapely.geometry import Polygon
+from src.MOSAIKS_feature import geometry, prefilter
+from src.MOSAIKS_feature.containment import contains_points
+from tests.helpers import wiggly_polygon
+
+
+class TestSimplifiedBounds(unittest.TestCase):
+
+    def test_bounds_enclose_polygon(self):
+        polygon = wiggly_polygon(2000)
+        inner, outer = prefilter.simplified_bounds([polygon])
+        self.assertTrue(outer[0].covers(polygon))
+        self.assertTrue(polygon.covers(inner[0]))
+        self.assertLess(shapely.get_num_coordinates(outer[0]), 300)
+        self.assertLess(shapely.get_num_coordinates(inner[0]), 300)
+
+    def test_simple_polygons_skipped(self):
+        inner, outer = prefilter.simplified_bounds([Polygon([(0, 0), (1, 0), (1, 1)])])
+        self.assertIsNone(inner[0])
+        self.assertIsNone(outer[0])
+
+    def test_thin_polygon_has_no_inner(self):
+        angles = np.linspace(0, 2 * np.pi, 200, endpoint=False)
+        sliver = Polygon(np.c_[78 + 0.1 * np.cos(angles), 20 + 0.001 * np.sin(angles)])
+        inner, outer = prefilter.simplified_bounds([sliver])
+        self.assertIsNone(inner[0])
+        self.assertTrue(outer[0].covers(sliver))
+
+
+class TestPrefilteredContains(unittest.TestCase):
+
+    def test_matches_exact_containment(self):
+        rng = np.random.default_rng(1)
+        for seed in range(5):
+            polygon = wiggly_polygon(500, seed=seed)
+            inner, outer = prefilter.simplified_bounds([polygon])
+            lons = rng.uniform(77.85, 78.15, 5000)
+            lats = rng.uniform(19.85, 20.15, 5000)
+            np.testing.assert_array_equal(
+                prefilter.prefiltered_contains(polygon, inner[0], outer[0], lons, lats),
+                contains_points(polygon, lons, lats),
+            )
+
+    def test_without_bounds(self):
+        polygon = Polygon([(0, 0), (1, 0), (1, 1), (0, 1)])
+        result = prefilter.prefiltered_contains(polygon, None, None, [0.5, 1.0, 2.0], [0.5, 0.5, 0.5])
+        self.assertListEqual(result.tolist(), [True, False, False])
+
+
+class TestLoadSimplifiedBounds(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        polygons = [wiggly_polygon(300), Polygon([(0, 0), (1, 0), (1, 1)]), wiggly_polygon(400, 80.0, 22.0)]
+        strings = [str([tuple(c) for c in p.exterior.coords]) for p in polygons]
+        self.coords, self.offsets = geometry.parse_coordinates(strings)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_cache_round_trip(self):
+        inner, outer = prefilter.load_simplified_bounds(self.coords, self.offsets, self.tmp.name)
+        self.assertEqual(len(os.listdir(self.tmp.name)), 2)
+
+        cached_inner, cached_outer = prefilter.load_simplified_bounds(self.coords, self.offsets, self.tmp.name)
+        for expected, cached in zip([*inner, *outer], [*cached_inner, *cached_outer]):
+            if expected is None:
+                self.assertIsNone(cached)
+            else:
+                self.assertTrue(shapely.equals_exact(expected, cached, 0))
+
+    def test_cache_keyed_by_polygons(self):
+        prefilter.load_simplified_bounds(self.coords, self.offsets, self.tmp.name)
+        prefilter.load_simplified_bounds(self.coords[:self.offsets[2]], self.offsets[:3], self.tmp.name)
+        self.assertEqual(len(os.listdir(self.tmp.name)), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+import numpy as np
+from shapely.geometry import Point, Polygon
+from src.MOSAIKS_feature import lattice
+from src.MOSAIKS_feature.grid import cells_inside_polygon
+from src.MOSAIKS_feature.quadtree import quadtree_blocks, quadtree_cells
+
+
+def bbox_indices(polygon):
+    min_lon, min_lat, max_lon, max_lat = polygon.bounds
+    row_start, row_stop = lattice.cell_bounds(min_lat, max_lat)
+    col_start, col_stop = lattice.cell_bounds(min_lon, max_lon)
+    return int(row_start), int(row_stop), int(col_start), int(col_stop)
+
+
+class TestQuadtree(unittest.TestCase):
+
+    def assertSameCells(self, polygon):
+        bounds = bbox_indices(polygon)
+        expected_rows, expected_cols = cells_inside_polygon(polygon, *bounds)
+        rows, cols = quadtree_cells(polygon, *bounds)
+        np.testing.assert_array_equal(rows, expected_rows)
+        np.testing.assert_array_equal(cols, expected_cols)
+
+        # Force subdivision even for small bounding boxes
+        inside_blocks, leaf_rows, leaf_cols, _ = quadtree_blocks(polygon, *bounds, min_cells=0)
+        keys = [lattice.pack(leaf_rows, leaf_cols)]
+        for block in inside_blocks:
+            keys.append(lattice.pack(*lattice.bbox_cells(*block)))
+        np.testing.assert_array_equal(np.sort(np.concatenate(keys)), np.sort(lattice.pack(expected_rows, expected_cols)))
+
+    def test_random_polygons(self):
+        rng = np.random.default_rng(7)
+        for _ in range(50):
+            angles = np.sort(rng.uniform(0, 2 * np.pi, rng.integers(3, 60)))
+            radii = rng.uniform(0.05, 0.5, len(angles))
+            cx, cy = rng.uniform(70, 90), rng.uniform(8, 30)
+            self.assertSameCells(Polygon(np.c_[cx + radii * np.cos(angles), cy + radii * np.sin(angles)]))
+
+    def test_edges_on_cell_centers(self):
+        # Block corners and edges coincide with cell centers on the polygon boundary
+        self.assertSameCells(Polygon([(30.005, 10.005), (30.405, 10.005), (30.405, 10.305), (30.005, 10.305)]))
+
+    def test_polygon_with_hole(self):
+        polygon = Point(78.0, 20.0).buffer(0.4).difference(Point(78.1, 20.0).buffer(0.1))
+        self.assertSameCells(polygon)
+
+    def test_fewer_tests_for_large_polygon(self):
+        polygon = Point(78.0, 20.0).buffer(1.0)
+        bounds = bbox_indices(polygon)
+        _, _, _, n_tests = quadtree_blocks(polygon, *bounds)
+        self.assertLess(n_tests, (bounds[1] - bounds[0]) * (bounds[3] - bounds[2]) / 5)
+
+    def test_small_bbox_tested_directly(self):
+        polygon = Point(78.0, 20.0).buffer(0.1)
+        bounds = bbox_indices(polygon)
+        inside_blocks, _, _, n_tests = quadtree_blocks(polygon, *bounds)
+        self.assertEqual(len(inside_blocks), 0)
+        self.assertEqual(n_tests, (bounds[1] - bounds[0]) * (bounds[3] - bounds[2]))
+
+    def test_empty_bounds(self):
+        rows, cols = quadtree_cells(Polygon([(0.0, 0.0), (0.1, 0.0), (0.1, 0.1)]), 5, 5, 0, 10)
+        self.assertEqual(len(rows), 0)
+        self.assertEqual(len(cols), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+import numpy as np
+from shapely.geometry import Polygon
+from src.MOSAIKS_feature import lattice
+from src.MOSAIKS_feature.grid import cells_inside_polygon
+from src.MOSAIKS_feature.rasterize import scanline_cells
+
+
+def bbox_indices(polygon):
+    min_lon, min_lat, max_lon, max_lat = polygon.bounds
+    row_start, row_stop = lattice.cell_bounds(min_lat, max_lat)
+    col_start, col_stop = lattice.cell_bounds(min_lon, max_lon)
+    return int(row_start), int(row_stop), int(col_start), int(col_stop)
+
+
+class TestScanlineCells(unittest.TestCase):
+
+    def assertSameCells(self, polygon):
+        bounds = bbox_indices(polygon)
+        expected_rows, expected_cols = cells_inside_polygon(polygon, *bounds)
+        rows, cols = scanline_cells(polygon, *bounds)
+        np.testing.assert_array_equal(rows, expected_rows)
+        np.testing.assert_array_equal(cols, expected_cols)
+
+    def test_random_polygons(self):
+        rng = np.random.default_rng(42)
+        for _ in range(100):
+            angles = np.sort(rng.uniform(0, 2 * np.pi, rng.integers(3, 60)))
+            radii = rng.uniform(0.01, 0.2, len(angles))
+            cx, cy = rng.uniform(70, 90), rng.uniform(8, 30)
+            self.assertSameCells(Polygon(np.c_[cx + radii * np.cos(angles), cy + radii * np.sin(angles)]))
+
+    def test_vertices_and_edges_on_cell_centers(self):
+        # Vertices, horizontal edges and vertical edges lying exactly on lattice centers
+        polygon = Polygon([(30.005, 10.005), (30.105, 10.005), (30.105, 10.055), (30.055, 10.055),
+                           (30.055, 10.105), (30.005, 10.105)])
+        self.assertSameCells(polygon)
+        rows, cols = scanline_cells(polygon, *bbox_indices(polygon))
+        self.assertNotIn(lattice.pack(1000, 3000), lattice.pack(rows, cols))
+
+    def test_thin_diagonal_polygon(self):
+        polygon = Polygon([(78.0, 20.0), (80.0, 22.0), (80.0, 22.015), (78.0, 20.015)])
+        self.assertSameCells(polygon)
+        rows, _ = scanline_cells(polygon, *bbox_indices(polygon))
+        self.assertGreater(len(rows), 0)
+
+    def test_polygon_with_hole(self):
+        polygon = Polygon(
+            [(0.0, 0.0), (0.3, 0.0), (0.3, 0.3), (0.0, 0.3)],
+            [[(0.1, 0.1), (0.2, 0.1), (0.2, 0.2), (0.1, 0.2)]],
+        )
+        self.assertSameCells(polygon)
+
+    def test_empty_bounds(self):
+        polygon = Polygon([(0.0, 0.0), (0.1, 0.0), (0.1, 0.1)])
+        rows, cols = scanline_cells(polygon, 5, 5, 0, 10)
+        self.assertEqual(len(rows), 0)
+        self.assertEqual(len(cols), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+import os
+import re
+import tempfile
+import numpy as np
+from src.MOSAIKS_feature import render
+
+
+def normalized(html):
+    """Drop the random element IDs and all whitespace, which folium and the template format differently."""
+    return re.sub(r"\s+", "", re.sub(r"_[0-9a-f]{32}", "_id", html))
+
+
+class TestWriteHeatmaps(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        self.pages = []
+        for i in range(5):
+            lat, lon = 20 + i, 78 + i
+            ring = np.array([[lat, lon], [lat + 0.1, lon], [lat + 0.1, lon + 0.1], [lat, lon]])
+            points = np.column_stack([lat + rng.uniform(0, 0.1, 30), lon + rng.uniform(0, 0.1, 30),
+                                      rng.normal(size=30)])
+            self.pages.append((f"page_{i}.html", [lat + 0.05, lon + 0.05], ring, points))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, folder, **kwargs):
+        os.makedirs(os.path.join(self.tmp.name, folder))
+        pages = [(os.path.join(self.tmp.name, folder, name), *rest) for name, *rest in self.pages]
+        self.assertEqual(render.write_heatmaps(pages, zoom_start=13, **kwargs), len(pages))
+        pages_html = []
+        for name, *_ in self.pages:
+            with open(os.path.join(self.tmp.name, folder, name)) as f:
+                pages_html.append(f.read())
+        return pages_html
+
+    def test_template_matches_folium(self):
+        folium_pages = self.write("folium", backend="folium")
+        template_pages = self.write("template")
+        for folium_page, template_page in zip(folium_pages, template_pages):
+            self.assertEqual(normalized(template_page), normalized(folium_page))
+        self.assertIn('"zoom":13', normalized(template_pages[0]))
+
+    def test_workers_write_the_same_pages(self):
+        self.assertListEqual(self.write("parallel", workers=2), self.write("serial"))
+
+    def test_rejects_nan_and_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            render.heatmap_template(15).render([0, 0], [[0, 0], [1, 1]], [[0, 0, np.nan]])
+        with self.assertRaises(ValueError):
+            render.write_heatmaps([], backend="svg")
+
+
+if __name__ == '__main__':
+    unittest.main()
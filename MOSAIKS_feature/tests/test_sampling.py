@@ -0,0 +1,74 @@
+import unittest
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from src.MOSAIKS_feature.misc import Subset
+from src.MOSAIKS_feature.sampling import sample_csv, state_prefix
+
+
+class TestSampling(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        shrids = [f"11-{state:02d}-{i:03d}-00001-{i:06d}" for state in (1, 2, 3) for i in range(20)]
+        n = 2000
+        # Sorted by shrid, like the grid files, so the first rows all come from one state
+        self.data = pd.DataFrame({
+            "shrid2": np.sort(rng.choice(shrids, n)),
+            "Lat": rng.uniform(8, 30, n),
+            "Lon": rng.uniform(70, 90, n),
+            "X_0": np.arange(n),
+        })
+        self.file_path = os.path.join(self.tmp.name, "points.csv")
+        self.data.to_csv(self.file_path, index=False)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_state_prefix(self):
+        self.assertListEqual(state_prefix(["11-24-476-03961-529712", "11-01"]).tolist(), ["11-24", "11-01"])
+
+    def test_uniform(self):
+        sample = sample_csv(self.file_path, 100, seed=3, chunksize=150)
+        self.assertEqual(len(sample), 100)
+        self.assertTrue(np.all(np.diff(sample["X_0"]) > 0))
+        pd.testing.assert_frame_equal(sample, sample_csv(self.file_path, 100, seed=3, chunksize=1000))
+        self.assertFalse(sample.equals(sample_csv(self.file_path, 100, seed=4)))
+        pd.testing.assert_frame_equal(sample, self.data[self.data["X_0"].isin(sample["X_0"])].reset_index(drop=True))
+        self.assertEqual(len(sample_csv(self.file_path, 5000, seed=3, chunksize=150)), len(self.data))
+
+    def test_uniform_is_unbiased(self):
+        # Every row is picked with probability n / rows
+        picked = np.zeros(len(self.data))
+        for seed in range(100):
+            picked[sample_csv(self.file_path, 200, seed=seed, chunksize=700)["X_0"]] += 1
+        halves = picked.reshape(2, -1).sum(axis=1) / picked.sum()
+        np.testing.assert_allclose(halves, [0.5, 0.5], atol=0.02)
+
+    def test_stratified(self):
+        sample = sample_csv(self.file_path, 30, mode="stratified", strata="state", seed=1, chunksize=300)
+        self.assertDictEqual(pd.Series(state_prefix(sample["shrid2"])).value_counts().to_dict(),
+                             {"11-01": 30, "11-02": 30, "11-03": 30})
+        per_shrid = sample_csv(self.file_path, 2, mode="stratified", seed=1, chunksize=300)
+        self.assertTrue((per_shrid.groupby("shrid2").size() == 2).all())
+        self.assertEqual(per_shrid["shrid2"].nunique(), self.data["shrid2"].nunique())
+
+    def test_whole_shrids(self):
+        sample = sample_csv(self.file_path, 4, mode="shrids", seed=2, chunksize=100)
+        kept = sample["shrid2"].unique()
+        self.assertEqual(len(kept), 4)
+        pd.testing.assert_frame_equal(sample, self.data[self.data["shrid2"].isin(kept)].reset_index(drop=True))
+        pd.testing.assert_frame_equal(sample, sample_csv(self.file_path, 4, mode="shrids", seed=2, chunksize=999))
+        with self.assertRaises(ValueError):
+            sample_csv(self.file_path, 4, mode="first")
+
+    def test_fetch_and_save_sample(self):
+        output = os.path.join(self.tmp.name, "sample.csv")
+        Subset.fetch_and_save_sample(self.file_path, output, n=3, mode="shrids", seed=0)
+        self.assertEqual(pd.read_csv(output)["shrid2"].nunique(), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+import pandas as pd
+from src.MOSAIKS_feature import lattice
+from src.MOSAIKS_feature.join import PointIndex
+from src.MOSAIKS_feature.state import AggregationState, file_digest
+from src.MOSAIKS_feature.testing.aggregate_features_functional import aggregateFeatures
+from tests.helpers import in_memory_means, in_memory_stats, make_results
+
+
+class TestAggregationState(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.state_dir = os.path.join(self.tmp.name, "state")
+        data = make_results(n_rows=900)
+        self.paths = []
+        for i, start in enumerate(range(0, 900, 300)):
+            path = os.path.join(self.tmp.name, f"results_{i + 1}.csv")
+            data.iloc[start:start + 300].to_csv(path, index=False)
+            self.paths.append(path)
+        self.combined = os.path.join(self.tmp.name, "combined.txt")
+        data.to_csv(self.combined, index=False)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_batches_match_single_pass(self):
+        # Each batch reopens the state from disk, as a later run would
+        for path in self.paths:
+            self.assertListEqual(AggregationState(self.state_dir).ingest(path), [path])
+        pd.testing.assert_frame_equal(AggregationState(self.state_dir).means(), in_memory_means(self.combined))
+
+    def test_statistics_batches(self):
+        AggregationState(self.state_dir, statistics=True).ingest(self.paths[:2])
+        state = AggregationState(self.state_dir, statistics=True)
+        state.ingest(self.paths)
+        pd.testing.assert_frame_equal(state.statistics(), in_memory_stats(self.combined), check_exact=False, rtol=1e-10)
+        with self.assertRaises(ValueError):
+            AggregationState(self.state_dir)
+
+    def test_ingesting_again_is_a_no_op(self):
+        AggregationState(self.state_dir).ingest(self.paths[0])
+        copy = os.path.join(self.tmp.name, "copy.csv")
+        shutil.copy(self.paths[0], copy)
+        state = AggregationState(self.state_dir)
+        self.assertListEqual(state.ingest([self.paths[0], copy]), [])
+        self.assertEqual(state.generation, 1)
+        pd.testing.assert_frame_equal(state.means(), in_memory_means(self.paths[0]))
+
+    def test_only_new_or_changed_files_are_hashed(self):
+        AggregationState(self.state_dir).ingest(self.paths[:2])
+        os.utime(self.paths[1], ns=(0, 0))
+        with patch("src.MOSAIKS_feature.state.file_digest", wraps=file_digest) as digest:
+            self.assertListEqual(AggregationState(self.state_dir).ingest(self.paths), [self.paths[2]])
+        # The untouched file is skipped unread; the touched one is hashed and found unchanged
+        self.assertListEqual([c.args[0] for c in digest.call_args_list], self.paths[1:])
+
+    def test_changed_and_mismatched_files(self):
+        state = AggregationState(self.state_dir)
+        state.ingest(self.paths[0])
+        expected = in_memory_means(self.paths[0])
+        pd.read_csv(self.paths[0]).iloc[:10].to_csv(self.paths[0], index=False)
+        with self.assertRaises(ValueError):
+            state.ingest(self.paths[0])
+        pd.read_csv(self.paths[1]).drop(columns="feature0").to_csv(self.paths[1], index=False)
+        with self.assertRaises(ValueError):
+            state.ingest([self.paths[1], self.paths[2]])
+        # The failed batch left the saved state and the one in memory unchanged
+        self.assertEqual(len(state.files), 1)
+        pd.testing.assert_frame_equal(state.means(), expected)
+        pd.testing.assert_frame_equal(AggregationState(self.state_dir).means(), expected)
+        self.assertEqual(len(os.listdir(self.state_dir)), 4)
+
+    def test_failed_first_batch(self):
+        pd.read_csv(self.paths[1]).drop(columns="feature0").to_csv(self.paths[1], index=False)
+        state = AggregationState(self.state_dir)
+        with self.assertRaises(ValueError):
+            state.ingest(self.paths[1:])
+        self.assertIsNone(state.features)
+        self.assertListEqual(state.ingest(self.paths[2]), [self.paths[2]])
+        pd.testing.assert_frame_equal(state.means(), in_memory_means(self.paths[2]))
+
+    def test_settings_must_match(self):
+        AggregationState(self.state_dir).ingest(self.paths[0])
+        with self.assertRaises(ValueError):
+            AggregationState(self.state_dir, exclude=("Lat",))
+        # Rows keyed by 'shrid2' cannot be mixed with rows joined through a point index
+        index = PointIndex(lattice.pack([2000], [7800]), ["11-00000"])
+        with self.assertRaises(ValueError):
+            AggregationState(self.state_dir).ingest(self.paths[1], index=index)
+
+    def test_aggregate_features_process(self):
+        output_file = os.path.join(self.tmp.name, "averages.csv")
+        aggregateFeatures(self.paths[0], output_file, state_dir=self.state_dir).process()
+        aggregateFeatures(os.path.join(self.tmp.name, "results_*.csv"), output_file, state_dir=self.state_dir).process()
+        expected = in_memory_means(self.combined)
+        pd.testing.assert_frame_equal(pd.read_csv(output_file), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
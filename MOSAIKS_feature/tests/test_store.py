@@ -0,0 +1,142 @@
+import unittest
+import glob
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from src.MOSAIKS_feature import grid, lattice
+from src.MOSAIKS_feature.geometry import parse_coordinates
+from src.MOSAIKS_feature.grid import generate_grid_cells
+from src.MOSAIKS_feature.store import GridStore, shrid_hashes
+from tests.helpers import make_shrids
+
+
+def segments(store_dir):
+    return sorted(glob.glob(os.path.join(store_dir, "*.hashes.npy")))
+
+
+class TestGridStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store_dir = os.path.join(self.tmp.name, "store")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_write_and_reopen(self):
+        hashes = np.array([b"a" * 16, b"b" * 16, b"c" * 16], dtype="S16")
+        store = GridStore(self.store_dir)
+        store.write_segment(hashes, [2, 0, 1], [10, 11, 12])
+
+        reopened = GridStore(self.store_dir)
+        counts, keys = reopened.read(hashes[[2, 0, 1]])
+        self.assertListEqual(counts.tolist(), [1, 2, 0])
+        self.assertListEqual(keys.tolist(), [12, 10, 11])
+        self.assertEqual(len(reopened.missing(np.array([b"a" * 16, b"d" * 16], dtype="S16"))), 1)
+
+    def test_incomplete_segment_ignored(self):
+        store = GridStore(self.store_dir)
+        store.write_segment(np.array([b"a" * 16], dtype="S16"), [1], [10])
+        # A crash after the cells but before the hashes leaves an unindexed segment
+        os.remove(segments(self.store_dir)[0])
+        self.assertEqual(len(GridStore(self.store_dir).index), 0)
+
+    def test_prune_removes_incomplete_segments(self):
+        store = GridStore(self.store_dir)
+        for name, key in [(b"a", 10), (b"b", 11), (b"c", 12)]:
+            store.write_segment(np.array([name * 16], dtype="S16"), [1], [key])
+        _, pruned, crashed = segments(self.store_dir)
+        # A prune that stopped after the hashes and counts, and a run that crashed before the hashes
+        os.remove(pruned)
+        os.remove(pruned.replace(".hashes.npy", ".counts.npy"))
+        os.remove(crashed)
+
+        store = GridStore(self.store_dir)
+        store.prune(np.array([b"a" * 16], dtype="S16"))
+        self.assertEqual(len(os.listdir(self.store_dir)), 3)
+        self.assertListEqual(store.read(np.array([b"a" * 16], dtype="S16"))[1].tolist(), [10])
+
+    def test_hashes_track_polygon_and_bounds(self):
+        data = make_shrids(3)
+        bounds = np.zeros((3, 4))
+        extents = data[["min_lat", "max_lat", "min_lon", "max_lon"]].to_numpy()
+        coords = np.arange(18, dtype=float).reshape(9, 2)
+        hashes = shrid_hashes(bounds, extents, coords, np.array([0, 3, 6, 9]))
+        self.assertEqual(len(set(hashes)), 3)
+
+        moved = coords.copy()
+        moved[4] += 0.001
+        changed = shrid_hashes(bounds, extents, moved, np.array([0, 3, 6, 9]))
+        self.assertListEqual((hashes == changed).tolist(), [True, False, True])
+        self.assertFalse((shrid_hashes(bounds, extents) == hashes).any())
+
+
+class TestStoredGrid(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store_dir = os.path.join(self.tmp.name, "store")
+        self.data = make_shrids(40)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def assertSameCells(self, a, b):
+        for x, y in zip(a, b):
+            np.testing.assert_array_equal(x, y)
+
+    def test_matches_direct_generation(self):
+        expected = generate_grid_cells(self.data)
+        self.assertSameCells(generate_grid_cells(self.data, store_dir=self.store_dir), expected)
+        self.assertSameCells(generate_grid_cells(self.data, store_dir=self.store_dir, workers=2), expected)
+        manifest = pd.read_csv(os.path.join(self.store_dir, "manifest.csv"))
+        self.assertListEqual(manifest["shrid2"].tolist(), self.data["shrid2"].tolist())
+        self.assertEqual(manifest["cells"].sum(), len(expected[0]))
+
+    def test_unchanged_rerun_computes_nothing(self):
+        generate_grid_cells(self.data, store_dir=self.store_dir)
+        before = segments(self.store_dir)
+        generate_grid_cells(self.data, store_dir=self.store_dir)
+        self.assertListEqual(segments(self.store_dir), before)
+
+    def test_only_changed_polygons_recomputed(self):
+        generate_grid_cells(self.data, store_dir=self.store_dir)
+        changed = make_shrids(40)
+        replacement = make_shrids(2, seed=9)
+        for column in ["polygon_coordinates", "min_lat", "max_lat", "min_lon", "max_lon"]:
+            changed.loc[[5, 17], column] = replacement[column].to_numpy()
+
+        self.assertEqual(len(GridStore(self.store_dir).missing(self._hashes(changed))), 2)
+        self.assertSameCells(generate_grid_cells(changed, store_dir=self.store_dir), generate_grid_cells(changed))
+
+    def test_extent_mode(self):
+        expected = generate_grid_cells(self.data, inside_polygon=False)
+        self.assertSameCells(generate_grid_cells(self.data, inside_polygon=False, store_dir=self.store_dir), expected)
+
+    def test_resumes_after_crash(self):
+        original = grid.MAX_COST_PER_UNIT
+        grid.MAX_COST_PER_UNIT = 2000
+        try:
+            generate_grid_cells(self.data, store_dir=self.store_dir)
+            # Lose the last few completed units, as if the run had stopped there
+            for hashes_path in segments(self.store_dir)[-3:]:
+                os.remove(hashes_path)
+            store = GridStore(self.store_dir)
+            self.assertGreater(len(store.missing(self._hashes(self.data))), 0)
+            self.assertSameCells(generate_grid_cells(self.data, store_dir=self.store_dir), generate_grid_cells(self.data))
+        finally:
+            grid.MAX_COST_PER_UNIT = original
+
+    def _hashes(self, data):
+        row_start, row_stop = lattice.cell_bounds(data["min_lat"], data["max_lat"])
+        col_start, col_stop = lattice.cell_bounds(data["min_lon"], data["max_lon"])
+        return shrid_hashes(
+            np.column_stack([row_start, row_stop, col_start, col_stop]),
+            data[["min_lat", "max_lat", "min_lon", "max_lon"]].to_numpy(),
+            *parse_coordinates(data["polygon_coordinates"]),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
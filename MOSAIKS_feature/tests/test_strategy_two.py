@@ -4,6 +4,7 @@ import os
 from shapely.geometry import Polygon
 from io import StringIO
 from src.MOSAIKS_feature.testing.strategy_two_functional import compute_bounding_box, process_shrid_bounding_boxes, parse_polygon, visualize_boundary_boxes
+from src.MOSAIKS_feature.geometry import parse_coordinates
 
 class TestBoundingBoxFunctions(unittest.TestCase):
     def setUp(self):
@@ -39,6 +40,24 @@ class TestBoundingBoxFunctions(unittest.TestCase):
         os.remove(test_file)
         os.remove(output_file)
     
+    def test_process_shrid_bounding_boxes_output_file(self):
+        # Polygon arrays passed in directly, results written to the requested path
+        test_file = "test_polygons_output.csv"
+        output_file = "test_bounding_boxes_output.csv"
+        self.sample_df.to_csv(test_file, index=False)
+        coords, offsets = parse_coordinates(self.sample_df["polygon_coordinates"])
+
+        self.assertEqual(process_shrid_bounding_boxes(test_file, output_file, polygon_arrays=(coords, offsets)),
+                         output_file)
+        output_df = pd.read_csv(output_file)
+        self.assertEqual(list(output_df["min_lat"]), [0, 1])
+        self.assertEqual(list(output_df["max_lon"]), [2, 3])
+        self.assertEqual(list(output_df["centroid_x"]), [1, 2])
+        self.assertEqual(list(output_df["centroid_y"]), [1, 2])
+
+        os.remove(test_file)
+        os.remove(output_file)
+
     def test_parse_polygon(self):
         # Test the conversion of string to shapely polygon
         polygon_string = "[(0,0), (0,2), (2,2), (2,0)]"
@@ -0,0 +1,197 @@
+import unittest
+import functools
+import os
+import tempfile
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+import contextily as ctx
+import mercantile
+import numpy as np
+import pandas as pd
+import requests
+from PIL import Image
+from src.MOSAIKS_feature import tiles
+from src.MOSAIKS_feature.analysis.img_generation_heatmap import save_shrid_images
+
+# Two neighbouring urban shrids, about 1 km across
+SHRIDS = pd.DataFrame({
+    "shrid2": ["11-24-476-03961-529712", "11-24-476-03961-529713"],
+    "polygon_coordinates": [
+        "[(77.590, 12.970), (77.600, 12.970), (77.600, 12.980), (77.590, 12.980)]",
+        "[(77.598, 12.975), (77.608, 12.975), (77.608, 12.985), (77.598, 12.985)]",
+    ],
+})
+BOUNDS = [(77.590, 12.970, 77.600, 12.980), (77.598, 12.975, 77.608, 12.985)]
+ZOOM = 14
+
+
+def fixture_tile(z, x, y, size=64):
+    """A small PNG tile whose colour encodes its position."""
+    image = Image.new("RGB", (size, size), (x % 256, y % 256, z * 10))
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def write_fixture_tiles(root, zoom):
+    """Write the fixture tiles around SHRIDS as {z}/{x}/{y}.png."""
+    for tile in tiles.tiles_for_bounds(BOUNDS, zoom, margin=0.5):
+        os.makedirs(os.path.join(root, str(tile.z), str(tile.x)), exist_ok=True)
+        with open(os.path.join(root, str(tile.z), str(tile.x), f"{tile.y}.png"), "wb") as f:
+            f.write(fixture_tile(tile.z, tile.x, tile.y))
+
+
+class CountingSource:
+    """Tile source counting its calls."""
+
+    name = "counting"
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, z, x, y):
+        self.calls.append((z, x, y))
+        return fixture_tile(z, x, y)
+
+
+class TestTileCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp.name, "cache")
+        self.tile_bytes = len(fixture_tile(10, 1, 1))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_hits_persist_across_instances(self):
+        source = CountingSource()
+        cache = tiles.TileCache(self.cache_dir, source)
+        self.assertEqual(cache.get(10, 1, 2), fixture_tile(10, 1, 2))
+        cache.get(10, 1, 2)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        reopened = tiles.TileCache(self.cache_dir, source)
+        self.assertIn((10, 1, 2), reopened)
+        self.assertEqual(reopened.get(10, 1, 2), fixture_tile(10, 1, 2))
+        self.assertListEqual(source.calls, [(10, 1, 2)])
+
+    def test_least_recently_used_tile_is_evicted(self):
+        cache = tiles.TileCache(self.cache_dir, CountingSource(), max_bytes=int(2.5 * self.tile_bytes))
+        cache.get(10, 1, 1)
+        cache.get(10, 2, 2)
+        cache.get(10, 1, 1)
+        cache.get(10, 3, 3)
+        self.assertIn((10, 1, 1), cache)
+        self.assertNotIn((10, 2, 2), cache)
+        self.assertIn((10, 3, 3), cache)
+        self.assertLessEqual(cache.size, cache.max_bytes)
+        self.assertFalse(os.path.exists(cache._path(10, 2, 2)))
+
+    def test_recency_survives_reopening(self):
+        cache = tiles.TileCache(self.cache_dir, CountingSource())
+        for x in range(3):
+            cache.get(10, x, 0)
+        # Tile 0 was used last in an earlier run
+        for x, used in enumerate([300, 100, 200]):
+            os.utime(cache._path(10, x, 0), (used, used))
+        reopened = tiles.TileCache(self.cache_dir, CountingSource(), max_bytes=int(2.5 * self.tile_bytes))
+        reopened.get(10, 5, 0)
+        self.assertNotIn((10, 1, 0), reopened)
+        self.assertNotIn((10, 2, 0), reopened)
+        self.assertIn((10, 0, 0), reopened)
+
+    def test_prefetch_fetches_the_union_once(self):
+        source = CountingSource()
+        cache = tiles.TileCache(self.cache_dir, source)
+        needed = tiles.tiles_for_bounds(BOUNDS, ZOOM)
+        self.assertEqual(cache.prefetch(needed + needed[:1]), len(needed))
+        self.assertEqual(cache.prefetch(needed), 0)
+        self.assertEqual(len(source.calls), len(needed))
+        self.assertEqual(len(set(source.calls)), len(needed))
+
+    def test_warp_to_lonlat(self):
+        # Each source row holds its own index, so the warped value is the source row sampled
+        image = np.repeat(np.arange(512, dtype=float)[:, None], 3, axis=1)
+        left, bottom = mercantile.xy(77.0, 12.0)
+        right, top = mercantile.xy(78.0, 13.0)
+        extent = (left, right, bottom, top)
+        warped, (west, east, south, north) = tiles.warp_to_lonlat(image, extent)
+        np.testing.assert_allclose([west, east, south, north], [77.0, 78.0, 12.0, 13.0])
+        for row in [0, 100, 300, 511]:
+            lat = north - (row + 0.5) * (north - south) / 512
+            expected = (top - mercantile.xy(77.5, lat)[1]) / (top - bottom) * 512 - 0.5
+            np.testing.assert_allclose(warped[row], np.clip(expected, 0, 511), atol=1e-6)
+        self.assertEqual(tiles.warp_to_lonlat(image.astype(np.uint8), extent)[0].dtype, np.uint8)
+
+    def test_directory_source(self):
+        write_fixture_tiles(os.path.join(self.tmp.name, "fixtures"), ZOOM)
+        source = tiles.DirectoryTileSource(os.path.join(self.tmp.name, "fixtures"))
+        tile = tiles.tiles_for_bounds(BOUNDS[:1], ZOOM)[0]
+        self.assertEqual(source(tile.z, tile.x, tile.y), fixture_tile(tile.z, tile.x, tile.y))
+        with self.assertRaises(FileNotFoundError):
+            source(ZOOM, 0, 0)
+
+
+class TestUrlTileSource(unittest.TestCase):
+
+    def setUp(self):
+        # A local stand-in tile server serving fixture tiles
+        self.tmp = tempfile.TemporaryDirectory()
+        write_fixture_tiles(self.tmp.name, ZOOM)
+        handler = functools.partial(SimpleHTTPRequestHandler, directory=self.tmp.name)
+        handler.log_message = lambda *args: None
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/{{z}}/{{x}}/{{y}}.png"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def test_fetches_and_mosaics_like_contextily(self):
+        source = tiles.UrlTileSource(self.url, max_retries=0)
+        cache = tiles.TileCache(os.path.join(self.tmp.name, "cache"), source)
+        west, south, east, north = BOUNDS[0]
+        image, extent = cache.image(west, south, east, north, ZOOM)
+        left, bottom = mercantile.xy(west, south)
+        right, top = mercantile.xy(east, north)
+        expected, expected_extent = ctx.bounds2img(left, bottom, right, top, zoom=ZOOM, source=self.url,
+                                                   use_cache=False)
+        np.testing.assert_array_equal(image, expected)
+        np.testing.assert_allclose(extent, expected_extent)
+
+    def test_missing_tile_raises(self):
+        with self.assertRaises(requests.HTTPError):
+            tiles.UrlTileSource(self.url, max_retries=0)(ZOOM, 0, 0)
+
+
+class TestSaveShridImages(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        write_fixture_tiles(os.path.join(self.tmp.name, "fixtures"), ZOOM)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_images_from_cached_fixture_tiles(self):
+        source = tiles.DirectoryTileSource(os.path.join(self.tmp.name, "fixtures"))
+        cache_dir = os.path.join(self.tmp.name, "cache")
+        for run in range(2):
+            output_dir = os.path.join(self.tmp.name, f"images_{run}")
+            save_shrid_images(SHRIDS.copy(), output_dir, zoom_level=ZOOM, tile_cache=cache_dir, tile_source=source)
+            self.assertListEqual(sorted(os.listdir(output_dir)),
+                                 ["shrid_11_24_476_03961_529712.png", "shrid_11_24_476_03961_529713.png"])
+        # The second run found every tile in the cache
+        self.assertEqual(tiles.TileCache(cache_dir, source).prefetch(tiles.tiles_for_bounds(BOUNDS, ZOOM)), 0)
+
+    def test_tile_source_needs_cache(self):
+        with self.assertRaises(ValueError):
+            save_shrid_images(SHRIDS.copy(), self.tmp.name, tile_source=tiles.DirectoryTileSource(self.tmp.name))
+
+
+if __name__ == '__main__':
+    unittest.main()
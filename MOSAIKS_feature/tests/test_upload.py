@@ -0,0 +1,77 @@
+import unittest
+import os
+import tempfile
+import pandas as pd
+from src.MOSAIKS_feature import lattice
+from src.MOSAIKS_feature.grid import generate_grid_cells
+from src.MOSAIKS_feature.upload import pack_shrids, plan_uploads
+from tests.helpers import overlapping_shrids
+
+
+class TestPackShrids(unittest.TestCase):
+
+    def test_next_fit(self):
+        self.assertListEqual(pack_shrids([5, 5, 5, 3, 0, 10], 10).tolist(), [0, 0, 1, 1, 1, 2])
+
+    def test_oversized_shrid_spans_files(self):
+        # 25 points take files 1-3, leaving room for 5 more in file 3
+        self.assertListEqual(pack_shrids([5, 25, 3, 10], 10).tolist(), [0, 1, 3, 4])
+
+
+class TestPlanUploads(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.prefix = os.path.join(self.tmp.name, "file_coordinates")
+        self.mapping_file = os.path.join(self.tmp.name, "point_shrids.csv")
+        self.data = overlapping_shrids()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def plan(self, chunk_size):
+        return plan_uploads(self.data, inside_polygon=False, chunk_size=chunk_size,
+                            prefix=self.prefix, mapping_file=self.mapping_file)
+
+    def test_points_uploaded_once(self):
+        report = self.plan(chunk_size=300)
+        uploads = pd.concat([pd.read_csv(f).assign(file=i + 1) for i, f in enumerate(report["files"])])
+        self.assertFalse(uploads.duplicated(["Lon", "Lat"]).any())
+        self.assertTrue((uploads.groupby("file").size() <= 300).all())
+        self.assertEqual(len(uploads), report["unique_points"])
+        self.assertGreater(report["saved_points"], 0)
+        self.assertEqual(report["points"] - report["saved_points"], report["unique_points"])
+
+    def test_mapping_covers_every_shrid_point(self):
+        report = self.plan(chunk_size=300)
+        positions, rows, cols = generate_grid_cells(self.data, inside_polygon=False)
+        mapping = pd.read_csv(self.mapping_file)
+        self.assertEqual(len(mapping), report["points"])
+        expected = set(zip(self.data["shrid2"].to_numpy()[positions], lattice.pack(rows, cols)))
+        actual = set(zip(mapping["shrid2"], lattice.pack(lattice.to_index(mapping["Lat"]), lattice.to_index(mapping["Lon"]))))
+        self.assertSetEqual(actual, expected)
+
+        # Every point is listed with the upload file that actually holds it
+        uploads = pd.concat([pd.read_csv(f).assign(file=i + 1) for i, f in enumerate(report["files"])])
+        joined = mapping.merge(uploads, on=["Lon", "Lat"], suffixes=("", "_upload"))
+        self.assertEqual(len(joined), len(mapping))
+        self.assertTrue((joined["file"] == joined["file_upload"]).all())
+
+    def test_shrids_not_split(self):
+        report = self.plan(chunk_size=300)
+        self.assertEqual(report["split_shrids"], 0)
+        mapping = pd.read_csv(self.mapping_file)
+
+        # The points a shrid adds are owned by it alone and all land in one file
+        first_owner = mapping.drop_duplicates(["Lon", "Lat"])
+        self.assertTrue((first_owner.groupby("shrid2")["file"].nunique() == 1).all())
+
+    def test_oversized_shrid(self):
+        report = self.plan(chunk_size=50)
+        self.assertGreater(report["split_shrids"], 0)
+        for f in report["files"]:
+            self.assertLessEqual(len(pd.read_csv(f)), 50)
+
+
+if __name__ == "__main__":
+    unittest.main()
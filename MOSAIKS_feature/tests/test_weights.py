@@ -0,0 +1,62 @@
+import unittest
+import os
+import tempfile
+import numpy as np
+import shapely
+from shapely.geometry import Polygon, box
+from src.MOSAIKS_feature import geometry, lattice, weights
+from tests.helpers import wiggly_polygon
+
+
+class TestAreaWeights(unittest.TestCase):
+
+    def test_fractions_of_square(self):
+        # Covers cell (2001, 7801) fully and half of each neighbouring cell in each direction
+        square = box(78.005, 20.005, 78.025, 20.025)
+        indptr, cells, values = weights.area_weights([square])
+        rows, cols = lattice.unpack(cells)
+        self.assertListEqual(indptr.tolist(), [0, 9])
+        expected = np.where(rows == 2001, 1.0, 0.5) * np.where(cols == 7801, 1.0, 0.5)
+        np.testing.assert_allclose(values, expected)
+        self.assertAlmostEqual(values.sum() * weights.CELL_AREA, square.area)
+
+    def test_weights_sum_to_area(self):
+        polygons = [wiggly_polygon(500, seed=seed, cx=78.0 + 0.3 * seed) for seed in range(3)]
+        polygons.append(Polygon([(80.0, 20.0), (80.05, 20.05), (80.0, 20.05), (80.05, 20.0)]))  # bowtie
+        indptr, cells, values = weights.area_weights(polygons, batch_cells=500)
+        per_shrid = np.add.reduceat(values, indptr[:-1])
+        expected = shapely.area(shapely.make_valid(np.array(polygons, dtype=object))) / weights.CELL_AREA
+        self.assertTrue(np.allclose(per_shrid, expected))
+        self.assertTrue(((values > 0) & (values <= 1)).all())
+        for i in range(len(polygons)):
+            shrid_cells = cells[indptr[i]:indptr[i + 1]]
+            self.assertTrue((np.diff(shrid_cells) > 0).all())
+
+    def test_batches_do_not_change_result(self):
+        polygons = [wiggly_polygon(200, seed=seed, cx=78.0 + 0.3 * seed) for seed in range(4)]
+        expected = weights.area_weights(polygons)
+        for result, wanted in zip(weights.area_weights(polygons, batch_cells=100), expected):
+            np.testing.assert_array_equal(result, wanted)
+
+    def test_cache(self):
+        polygons = [wiggly_polygon(100), wiggly_polygon(100, cx=79.0)]
+        coords, offsets = geometry.parse_coordinates([str(list(p.exterior.coords)) for p in polygons])
+        with tempfile.TemporaryDirectory() as cache_dir:
+            built = weights.load_area_weights(coords, offsets, cache_dir)
+            self.assertEqual(len([n for n in os.listdir(cache_dir) if ".weights_" in n]), 3)
+            cached = weights.load_area_weights(coords, offsets, cache_dir)
+            for a, b in zip(built, cached):
+                np.testing.assert_array_equal(a, b)
+
+
+class TestMatrix(unittest.TestCase):
+
+    def test_matrix(self):
+        # Two shrids sharing cell 5; cell 9 belongs to none
+        area_weights = weights.AreaWeights(np.array([0, 2, 4]), np.array([3, 5, 5, 7]), np.array([1.0, 0.5, 0.25, 1.0]))
+        matrix = area_weights.matrix(np.array([5, 9, 3, 5])).toarray()
+        np.testing.assert_array_equal(matrix, [[0.5, 0, 1.0, 0.5], [0.25, 0, 0, 0.25]])
+
+
+if __name__ == "__main__":
+    unittest.main()
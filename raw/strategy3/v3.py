@@ -1,6 +1,7 @@
 import pandas as pd
 import numpy as np
-from shapely.geometry import Polygon, Point
+import shapely
+from shapely.geometry import Polygon
 
 def createPolygon(coordinates):
     coordinates = eval(coordinates)
@@ -35,17 +36,14 @@ for i, row in file.iterrows():
     lons = x_grid.flatten()
     lats = y_grid.flatten()
 
-    # Validate coordinates using the point-in-polygon test
-    valid_lons = []
-    valid_lats = []
-    for lon, lat in zip(lons, lats):
-        point = Point(lon, lat)  # Create a Shapely Point object
-        if polygon.contains(point):  # Check if the point is inside the polygon
-            valid_lons.append(lon)
-            valid_lats.append(lat)
+    # Validate all coordinates against the prepared polygon in one call
+    shapely.prepare(polygon)
+    inside = shapely.contains_xy(polygon, lons, lats)
+    valid_lons = lons[inside]
+    valid_lats = lats[inside]
 
     # If valid coordinates exist, append them to the lists
-    if valid_lons and valid_lats:
+    if len(valid_lons) > 0 and len(valid_lats) > 0:
         shrid_id = np.full(len(valid_lons), row["shrid2"])
         id_count = np.full(len(valid_lons), row["Unnamed: 0"])
 